@@ -1,32 +1,53 @@
 # backend/core/auditoria_utils.py
-# backend/core/auditoria_utils.py
 import json
-from core.db.connection import get_connection
+from datetime import datetime, timezone
+
+from core.db.sesion import conexion_unidad, al_confirmar
+from core.services.auditoria_async import AUDITORIA_ASYNC, encolar_auditoria
+from core.services.tiempo_real import publicar_evento
 
 def registrar_auditoria_global(id_usuario, entidad, id_entidad, accion, datos_previos=None, datos_nuevos=None):
     """
-    Registra un evento en la auditoría usando CURRENT_TIMESTAMP.
-    Seguro, liviano y compatible con el pool de conexiones.
+    Registra un evento en la auditoría con la hora en que ocurrió.
+    Por defecto la fila se encola y la escribe en lote el hilo de
+    core/services/auditoria_async.py; dentro de una unidad de trabajo se
+    encola solo si la transacción se confirma.
+    Con AUDITORIA_ASYNC=0 se inserta en la misma transacción, como antes.
     """
     if not id_usuario:
         return
 
     try:
-        conn = get_connection()
-        if conn is None:
-            print("❌ No se pudo obtener conexión para auditoría")
+        val_ant = json.dumps(datos_previos, default=str) if datos_previos else None
+        val_nue = json.dumps(datos_nuevos, default=str) if datos_nuevos else None
+
+        # Aviso al dashboard de administración (sin los datos completos)
+        publicar_evento("auditoria", {
+            "id_usuario": id_usuario, "entidad": entidad, "id_entidad": id_entidad,
+            "accion": accion, "fecha_hora": datetime.now(timezone.utc)
+        })
+
+        if AUDITORIA_ASYNC:
+            fila = {
+                "id_usuario": id_usuario,
+                "entidad": entidad,
+                "id_entidad": id_entidad,
+                "accion": accion,
+                "datos_previos": val_ant,
+                "datos_nuevos": val_nue,
+                # Hora del evento, no la de escritura del lote
+                "fecha_hora": datetime.now(timezone.utc),
+            }
+            al_confirmar(lambda: encolar_auditoria(fila))
             return
 
-        with conn:
+        with conexion_unidad() as conn:
             with conn.cursor() as cur:
                 query = """
                     INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
                     VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
                 """
 
-                val_ant = json.dumps(datos_previos, default=str) if datos_previos else None
-                val_nue = json.dumps(datos_nuevos, default=str) if datos_nuevos else None
-
                 cur.execute(query, (
                     id_usuario, entidad, id_entidad, accion,
                     val_ant, val_nue
@@ -34,4 +55,3 @@ def registrar_auditoria_global(id_usuario, entidad, id_entidad, accion, datos_pr
 
     except Exception as e:
         print(f"❌ Error guardando auditoría: {e}")
-
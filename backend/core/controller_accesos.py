@@ -1,102 +1,195 @@
 # backend/core/controller_accesos.py
 
+import base64
 import json
-from core.db.connection import get_connection
+import os
+from datetime import date, datetime, timedelta
+
+from core.db.connection import conexion
 from models.acceso import (
     verificar_vehiculo_dentro, 
     registrar_salida_db, 
-    registrar_entrada_db
+    registrar_entrada_db,
+    AccesoDesactualizadoError
 )
-from ocr.detector import detectar_placa 
+from core.services.ocupacion_patio import obtener_indice_patio, indice_disponible
+from core.services.registro_placas import normalizar_placa, RegistroPlacas, placa_registrada_agregada
+from core.services.coincidencia_placas import buscar_placa_similar
+from ocr.trabajadores import reconocer_placa, reconocer_detalle, ColaOCRLlenaError, TiempoOCRAgotadoError
+from models.sesion_validacion import crear_sesion, obtener_sesion, guardar_sesion, eliminar_sesion
+from ocr.detector import es_placa_valida
 from core.auditoria_utils import registrar_auditoria_global
-from core.controller_calendario import hay_evento_activo_controller
+from core.controller_calendario import eventos_activos_controller
 from models.vehiculo import registrar_vehiculo_invitado_db
 
 
 # ==========================================================
 # 1. FUNCIÓN PARA OBTENER EL HISTORIAL CON FILTROS
 # ==========================================================
-def obtener_historial_accesos(filtros=None):
+# Paginación por cursor (keyset) sobre (fecha_hora, id_acceso): cada página
+# continúa donde terminó la anterior usando el índice, sin OFFSET.
+HISTORIAL_LIMITE_DEFECTO = int(os.getenv("HISTORIAL_LIMITE_DEFECTO", "50"))
+HISTORIAL_LIMITE_MAX = int(os.getenv("HISTORIAL_LIMITE_MAX", "500"))
+
+
+def codificar_cursor(fecha_hora, id_fila):
+    """Cursor opaco (fecha_hora, id) para paginación keyset; lo usa también la auditoría."""
+    return base64.urlsafe_b64encode(f"{fecha_hora.isoformat()}|{id_fila}".encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    try:
+        fecha, id_fila = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), int(id_fila)
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def limite_rango_fecha(valor, es_hasta=False):
     """
-    Obtiene el historial filtrado por placa, fechas y tipo de vehículo.
+    'YYYY-MM-DD' o fecha-hora ISO -> límite de un rango semiabierto
+    [desde, hasta). Un 'hasta' de solo fecha incluye ese día completo.
+    """
+    try:
+        if len(valor) == 10:
+            dia = date.fromisoformat(valor)
+            return datetime.combine(dia + timedelta(days=1) if es_hasta else dia, datetime.min.time())
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f"Fecha inválida: {valor}")
+
+
+def _filtros_historial(filtros):
+    """WHERE (sobre columnas sin funciones, para que usen índices) y sus parámetros."""
+    condiciones = []
+    params = []
+
+    # 1. Filtro por Placa (búsqueda parcial sobre la placa normalizada, que no
+    #    tiene % ni _; índice trigram en vehiculo.placa_norm)
+    if filtros.get('placa'):
+        condiciones.append("v.placa_norm LIKE %s")
+        params.append(f"%{normalizar_placa(filtros['placa'])}%")
+
+    # 2. Filtro por Tipo de Vehículo (exacto)
+    if filtros.get('tipo'):
+        condiciones.append("v.tipo = %s")
+        params.append(filtros['tipo'])
+
+    # 3. Filtro Desde (incluido)
+    if filtros.get('desde'):
+        condiciones.append("a.fecha_hora >= %s")
+        params.append(limite_rango_fecha(filtros['desde']))
+
+    # 4. Filtro Hasta (excluido)
+    if filtros.get('hasta'):
+        condiciones.append("a.fecha_hora < %s")
+        params.append(limite_rango_fecha(filtros['hasta'], es_hasta=True))
+
+    return condiciones, params
+
+
+def obtener_historial_accesos(filtros=None, limite=None, cursor=None, total=None):
+    """
+    Obtiene una página del historial filtrado por placa, fechas y tipo de vehículo,
+    del más reciente al más antiguo.
+
+    `cursor` es el 'siguiente_cursor' de la página anterior.
+    `total`: None (no se cuenta), 'exacto' (COUNT) o 'estimado' (estimación
+    del planificador, barata con tablas grandes).
+
+    Retorna {"datos", "limite", "siguiente_cursor", "hay_mas", "total"}.
+    Lanza ValueError si algún parámetro es inválido.
     """
     if filtros is None:
         filtros = {}
+    limite = min(max(int(limite or HISTORIAL_LIMITE_DEFECTO), 1), HISTORIAL_LIMITE_MAX)
+    if total not in (None, "", "exacto", "estimado"):
+        raise ValueError("total debe ser 'exacto' o 'estimado'")
 
-    try:
-        conn = get_connection()
-        cur = conn.cursor()
-        
-        # Consulta Base: Unimos con vehiculo para sacar el tipo y la placa
-        sql = """
-            SELECT 
-                a.id_acceso,
-                v.placa,
-                TO_CHAR(a.fecha_hora, 'HH24:MI:SS') as entrada,
-                TO_CHAR(a.hora_salida, 'HH24:MI:SS') as salida,
-                TO_CHAR(a.fecha_hora, 'YYYY-MM-DD') as fecha,
-                a.resultado,
-                v.tipo 
-            FROM acceso a
-            JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
-            WHERE 1=1
-        """
-        
-        params = []
+    condiciones, params = _filtros_historial(filtros)
+    where_filtros = "".join(f" AND {c}" for c in condiciones)
 
-        # --- FILTROS DINÁMICOS ---
-        
-        # 1. Filtro por Placa (búsqueda parcial)
-        if filtros.get('placa'):
-            sql += " AND v.placa ILIKE %s"
-            params.append(f"%{filtros['placa']}%")
-        
-        # 2. Filtro por Tipo de Vehículo (exacto)
-        if filtros.get('tipo'):
-            sql += " AND v.tipo = %s"
-            params.append(filtros['tipo'])
-
-        # 3. Filtro Desde (Fecha)
-        if filtros.get('desde'):
-            sql += " AND DATE(a.fecha_hora) >= %s"
-            params.append(filtros['desde'])
-
-        # 4. Filtro Hasta (Fecha)
-        if filtros.get('hasta'):
-            sql += " AND DATE(a.fecha_hora) <= %s"
-            params.append(filtros['hasta'])
-
-        # Ordenar descendente (más reciente primero)
-        sql += " ORDER BY a.fecha_hora DESC"
-
-        cur.execute(sql, tuple(params))
-        data = cur.fetchall()
-        cur.close()
-        conn.close()
-
-        # Formateamos para JSON
-        historial = []
-        for row in data:
-            historial.append({
-                "id": row[0],
-                "placa": row[1],
-                "entrada": row[2],
-                "salida": row[3] if row[3] else "--",
-                "fecha": row[4],
-                "estado": row[5],
-                "tipo": row[6]
-            })
-        
-        return historial
+    condiciones_pagina = list(condiciones)
+    params_pagina = list(params)
+    if cursor:
+        condiciones_pagina.append("(a.fecha_hora, a.id_acceso) < (%s, %s)")
+        params_pagina.extend(decodificar_cursor(cursor))
+    where_pagina = "".join(f" AND {c}" for c in condiciones_pagina)
+
+    desde_sql = """
+        FROM acceso a
+        JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+        WHERE 1=1
+    """
 
+    try:
+        with conexion() as conn:
+            with conn.cursor() as cur:
+                # Consulta Base: Unimos con vehiculo para sacar el tipo y la placa
+                cur.execute(f"""
+                    SELECT
+                        a.id_acceso,
+                        v.placa,
+                        TO_CHAR(a.fecha_hora, 'HH24:MI:SS') as entrada,
+                        TO_CHAR(a.hora_salida, 'HH24:MI:SS') as salida,
+                        TO_CHAR(a.fecha_hora, 'YYYY-MM-DD') as fecha,
+                        a.resultado,
+                        v.tipo,
+                        a.fecha_hora
+                    {desde_sql} {where_pagina}
+                    ORDER BY a.fecha_hora DESC, a.id_acceso DESC
+                    LIMIT %s
+                """, tuple(params_pagina) + (limite + 1,))
+                data = cur.fetchall()
+
+                cantidad = None
+                if total == "exacto":
+                    cur.execute(f"SELECT COUNT(*) {desde_sql} {where_filtros}", tuple(params))
+                    cantidad = cur.fetchone()[0]
+                elif total == "estimado":
+                    cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 {desde_sql} {where_filtros}", tuple(params))
+                    plan = cur.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    cantidad = int(plan[0]["Plan"]["Plan Rows"])
     except Exception as e:
         print(f"❌ Error obteniendo historial filtrado: {e}")
-        return []
+        raise
+
+    hay_mas = len(data) > limite
+    data = data[:limite]
+
+    # Formateamos para JSON
+    historial = []
+    for row in data:
+        historial.append({
+            "id": row[0],
+            "placa": row[1],
+            "entrada": row[2],
+            "salida": row[3] if row[3] else "--",
+            "fecha": row[4],
+            "estado": row[5],
+            "tipo": row[6]
+        })
+
+    return {
+        "datos": historial,
+        "limite": limite,
+        "siguiente_cursor": codificar_cursor(data[-1][7], data[-1][0]) if hay_mas else None,
+        "hay_mas": hay_mas,
+        "total": cantidad,
+        "total_modo": total or None
+    }
 
 # ==========================================================
 # 2. FUNCIÓN PARA PROCESAR VALIDACIÓN (OCR + LÓGICA + AUDITORÍA)
 # ==========================================================
+# Los modelos de acceso, vehículo y auditoría comparten la unidad de trabajo
+# de la petición (ver core/db/sesion.py): una conexión y un solo commit.
 def procesar_validacion_acceso(data_request, vigilante_id):
+    """
+    Formato clásico: cuerpo JSON con 'image_base64' y 'tipo_acceso'.
+    """
     try:
         # 1. Decodificar
         data = json.loads(data_request)
@@ -106,63 +199,298 @@ def procesar_validacion_acceso(data_request, vigilante_id):
         if not imagen_b64:
             return {"error": "No hay imagen"}, 400
 
-        # 2. OCR
-        placa_detectada = detectar_placa(imagen_b64) 
-        if not placa_detectada:
-            return {"resultado": "Denegado", "datos": {"placa": "No detectada", "motivo": "Imagen ilegible"}}, 200
+        return _validar_imagen(imagen_b64, tipo_acceso, vigilante_id)
+
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return {"error": str(e)}, 500
+
+
+def procesar_validacion_binaria(imagen, tipo_acceso, vigilante_id):
+    """
+    Frame enviado como bytes (image/jpeg, image/png o multipart).
+    Evita el base64: los bytes llegan tal cual a cv2.imdecode.
+    """
+    try:
+        if not imagen:
+            return {"error": "No hay imagen"}, 400
+        return _validar_imagen(imagen, tipo_acceso, vigilante_id)
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return {"error": str(e)}, 500
+
+
+def _validar_imagen(imagen, tipo_acceso, vigilante_id):
+    # 2. OCR (en el pool de procesos, con plazo)
+    try:
+        placa_detectada = reconocer_placa(imagen)
+    except ColaOCRLlenaError:
+        return {"error": "Servicio OCR saturado, intente de nuevo"}, 503
+    except TiempoOCRAgotadoError:
+        return {"resultado": "Denegado", "datos": {"placa": "No detectada", "motivo": "Tiempo de OCR agotado"}}, 200
+    if not placa_detectada:
+        return {"resultado": "Denegado", "datos": {"placa": "No detectada", "motivo": "Imagen ilegible"}}, 200
+
+    print(f"📡 Procesando: Placa {placa_detectada} | Tipo: {tipo_acceso}")
+
+    return decidir_acceso(placa_detectada, tipo_acceso, vigilante_id)
+
+
+def decidir_acceso(placa_detectada, tipo_acceso, vigilante_id):
+    """
+    Decide entrada/salida para una placa ya leída y registra el movimiento.
+    Si el índice del patio estaba desactualizado (otro proceso movió la
+    placa), se relee la placa de la BD y se decide una vez más.
+    """
+    try:
+        return _decidir_acceso(placa_detectada, tipo_acceso, vigilante_id)
+    except AccesoDesactualizadoError as e:
+        print(f"🔄 Estado de {placa_detectada} desactualizado: {e}")
+        if indice_disponible():
+            obtener_indice_patio().resincronizar(placa=placa_detectada)
+        return _decidir_acceso(placa_detectada, tipo_acceso, vigilante_id)
+
+
+def _buscar_coincidencia(placa_detectada):
+    """Placa registrada parecida (error OCR); None si no hay o si falla el índice."""
+    try:
+        return buscar_placa_similar(placa_detectada)
+    except Exception as e:
+        print(f"❌ Error buscando placas similares: {e}")
+        return None
 
-        print(f"📡 Procesando: Placa {placa_detectada} | Tipo: {tipo_acceso}")
 
-        # 3. Lógica de Validación
-        id_acceso_pendiente = verificar_vehiculo_dentro(placa_detectada)
+def _sugerencias(coincidencia):
+    """Placas parecidas que el vigilante debe confirmar (no se usan solas)."""
+    return [c["placa"] for c in coincidencia["candidatos"]] if coincidencia else []
 
-        if tipo_acceso == 'salida':
-            # --- SALIDA ---
-            if not id_acceso_pendiente:
-                return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "El vehículo NO tiene entrada."}}, 200
+
+def _salida_por_coincidencia(placa_detectada, coincidencia, vigilante_id):
+    """
+    Salida de una lectura que no tiene entrada: si difiere solo en confusiones
+    OCR de una placa registrada que sí está dentro, la salida es de esa placa.
+    Entre varias así decide la única que esté en el patio. None si no hay
+    ninguna que aceptar sin confirmar.
+    """
+    dentro = [(c, verificar_vehiculo_dentro(c["placa"])) for c in coincidencia["candidatos"] if c["confusion"]]
+    dentro = [(c, id_acceso) for c, id_acceso in dentro if id_acceso]
+    if len(dentro) != 1:
+        return None
+    candidato, id_acceso = dentro[0]
+    placa = candidato["placa"]
+    try:
+        if not registrar_salida_db(id_acceso):
+            return {"error": "Error DB"}, 500
+    except AccesoDesactualizadoError:
+        # decidir_acceso solo resincroniza la placa leída
+        if indice_disponible():
+            obtener_indice_patio().resincronizar(placa=placa)
+        raise
+    registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=id_acceso, accion="SALIDA_VEHICULO", datos_nuevos={"placa": placa, "placa_leida": placa_detectada, "distancia": candidato["distancia"], "resultado": "Salida Exitosa"})
+    return {"resultado": "Autorizado", "datos": {"placa": placa, "placa_leida": placa_detectada, "propietario": "Salida Exitosa", "coincidencia": coincidencia}}, 200
+
+
+def _entrada_por_coincidencia(placa_detectada, coincidencia, vigilante_id):
+    """Entrada con la placa registrada más parecida; None si ya no está registrada."""
+    placa = coincidencia["placa"]
+    if verificar_vehiculo_dentro(placa):
+        return {"resultado": "Denegado", "datos": {"placa": placa, "placa_leida": placa_detectada, "motivo": "El vehículo YA está dentro.", "coincidencia": coincidencia}}, 200
+    try:
+        res = registrar_entrada_db(placa, vigilante_id)
+    except AccesoDesactualizadoError:
+        # decidir_acceso solo resincroniza la placa leída
+        if indice_disponible():
+            obtener_indice_patio().resincronizar(placa=placa)
+        raise
+    if res['status'] != 'ok':
+        return None
+    registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=res.get('id_acceso', 0), accion="ENTRADA_VEHICULO", datos_nuevos={"placa": placa, "placa_leida": placa_detectada, "distancia": coincidencia["distancia"], "resultado": "Entrada Exitosa"})
+    return {"resultado": "Autorizado", "datos": {"placa": placa, "placa_leida": placa_detectada, "propietario": "Entrada Registrada", "coincidencia": coincidencia}}, 200
+
+
+def _entrada_confirmada_en_bd(placa_detectada, vigilante_id):
+    """
+    El registro de placas puede estar atrasado (vehículo dado de alta en otro
+    worker cuyo aviso aún no llega): antes de escribir por un camino que
+    supone que la placa no existe, se confirma en la BD. Si sí existe, se
+    corrige el filtro y se registra la entrada normal; None si no existe.
+    """
+    if RegistroPlacas.consultar_bd(placa_detectada) is None:
+        return None
+    placa_registrada_agregada(placa_detectada)
+    res = registrar_entrada_db(placa_detectada, vigilante_id)
+    if res['status'] != 'ok':
+        return {"error": "Error DB"}, 500
+    registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=res.get('id_acceso', 0), accion="ENTRADA_VEHICULO", datos_nuevos={"placa": placa_detectada, "resultado": "Entrada Exitosa"})
+    return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Entrada Registrada"}}, 200
+
+
+def _decidir_acceso(placa_detectada, tipo_acceso, vigilante_id):
+    # 3. Lógica de Validación
+    id_acceso_pendiente = verificar_vehiculo_dentro(placa_detectada)
+
+    if tipo_acceso == 'salida':
+        # --- SALIDA ---
+        if not id_acceso_pendiente:
+            # ¿Lectura con error OCR de un vehículo que sí está dentro?
+            coincidencia = _buscar_coincidencia(placa_detectada)
+            if coincidencia:
+                respuesta = _salida_por_coincidencia(placa_detectada, coincidencia, vigilante_id)
+                if respuesta:
+                    return respuesta
+                return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "El vehículo NO tiene entrada; confirme si es una de las placas sugeridas.", "sugerencias": _sugerencias(coincidencia), "coincidencia": coincidencia}}, 200
+            return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "El vehículo NO tiene entrada."}}, 200
+        else:
+            if registrar_salida_db(id_acceso_pendiente):
+                # Auditoría Salida
+                registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=id_acceso_pendiente, accion="SALIDA_VEHICULO", datos_nuevos={"placa": placa_detectada, "resultado": "Salida Exitosa"})
+                return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Salida Exitosa"}}, 200
             else:
-                if registrar_salida_db(id_acceso_pendiente):
-                    # Auditoría Salida
-                    registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=id_acceso_pendiente, accion="SALIDA_VEHICULO", datos_nuevos={"placa": placa_detectada, "resultado": "Salida Exitosa"})
-                    return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Salida Exitosa"}}, 200
-                else:
-                    return {"error": "Error DB"}, 500
+                return {"error": "Error DB"}, 500
+    
+    else: 
+        # --- ENTRADA ---
+        if id_acceso_pendiente:
+            return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "El vehículo YA está dentro."}}, 200
         
-        else: 
-            # --- ENTRADA ---
-            if id_acceso_pendiente:
-                return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "El vehículo YA está dentro."}}, 200
+        else:
+            # INTENTO 1: Registrar entrada normal
+            res = registrar_entrada_db(placa_detectada, vigilante_id)
+            
+            if res['status'] == 'ok':
+                # Éxito normal (Vehículo registrado)
+                registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=res.get('id_acceso', 0), accion="ENTRADA_VEHICULO", datos_nuevos={"placa": placa_detectada, "resultado": "Entrada Exitosa"})
+                return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Entrada Registrada"}}, 200
             
             else:
-                # INTENTO 1: Registrar entrada normal
-                res = registrar_entrada_db(placa_detectada, vigilante_id)
-                
-                if res['status'] == 'ok':
-                    # Éxito normal (Vehículo registrado)
-                    registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=0, accion="ENTRADA_VEHICULO", datos_nuevos={"placa": placa_detectada, "resultado": "Entrada Exitosa"})
-                    return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "Entrada Registrada"}}, 200
+                # FALLÓ: El vehículo no existe (según el registro de placas).
+                # Antes de tratarlo como invitado: ¿es una lectura con error
+                # OCR (0/O, 8/B, 1/I...) de una placa registrada? Solo se
+                # acepta sola si difiere únicamente en esas confusiones; si
+                # no, el vigilante confirma la sugerencia (no se crea invitado).
+                coincidencia = _buscar_coincidencia(placa_detectada)
+                eventos = eventos_activos_controller()
+
+                # Los caminos que escriben (coincidencia, invitado) no se
+                # fían de un negativo del filtro; una negación pura sí
+                if (coincidencia and coincidencia["automatica"]) or eventos:
+                    respuesta = _entrada_confirmada_en_bd(placa_detectada, vigilante_id)
+                    if respuesta:
+                        return respuesta
+
+                if coincidencia and coincidencia["automatica"]:
+                    respuesta = _entrada_por_coincidencia(placa_detectada, coincidencia, vigilante_id)
+                    if respuesta:
+                        return respuesta
+                elif coincidencia:
+                    return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "Placa no registrada; confirme si es una de las placas sugeridas.", "sugerencias": _sugerencias(coincidencia), "coincidencia": coincidencia}}, 200
+
+                # --- NUEVA LÓGICA: EVENTOS / INVITADOS ---
                 
-                else:
-                    # FALLÓ: El vehículo no existe.
-                    # --- NUEVA LÓGICA: EVENTOS / INVITADOS ---
+                # Verificamos si hay evento activo (el más reciente queda asociado a la entrada)
+                if eventos:
+                    evento = {"id_evento": eventos[0]["id_evento"], "titulo": eventos[0]["titulo"]}
+                    print(f"🎉 Evento activo detectado ({evento['titulo']}). Registrando invitado: {placa_detectada}")
                     
-                    # Verificamos si hay evento activo
-                    if hay_evento_activo_controller():
-                        print(f"🎉 Evento activo detectado. Registrando invitado: {placa_detectada}")
+                    # Creamos el vehículo temporalmente
+                    if registrar_vehiculo_invitado_db(placa_detectada):
                         
-                        # Creamos el vehículo temporalmente
-                        if registrar_vehiculo_invitado_db(placa_detectada):
-                            
-                            # Intentamos registrar la entrada de nuevo
-                            res_invitado = registrar_entrada_db(placa_detectada, vigilante_id)
-                            
-                            if res_invitado['status'] == 'ok':
-                                registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=0, accion="ENTRADA_INVITADO", datos_nuevos={"placa": placa_detectada, "evento": "Acceso por Evento"})
-                                return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "INVITADO (Evento Activo)"}}, 200
-                    
-                    # Si no hay evento o falló el registro invitado, denegamos normal
-                    return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "Vehículo no registrado y sin eventos activos"}}, 200
+                        # Intentamos registrar la entrada de nuevo
+                        res_invitado = registrar_entrada_db(placa_detectada, vigilante_id)
+                        
+                        if res_invitado['status'] == 'ok':
+                            registrar_auditoria_global(id_usuario=vigilante_id, entidad="ACCESO", id_entidad=res_invitado.get('id_acceso', 0), accion="ENTRADA_INVITADO", datos_nuevos={"placa": placa_detectada, "evento": "Acceso por Evento", "id_evento": evento["id_evento"], "titulo_evento": evento["titulo"]})
+                            return {"resultado": "Autorizado", "datos": {"placa": placa_detectada, "propietario": "INVITADO (Evento Activo)", "evento": evento}}, 200
+                
+                # Si no hay evento o falló el registro invitado, denegamos normal
+                return {"resultado": "Denegado", "datos": {"placa": placa_detectada, "motivo": "Vehículo no registrado y sin eventos activos"}}, 200
+
+
+# ==========================================================
+# 3. VALIDACIÓN POR RÁFAGA DE FRAMES (CONSENSO TEMPORAL)
+# ==========================================================
+# La portería abre una sesión, envía frames uno a uno y recibe una sola
+# decisión en cuanto las lecturas coinciden lo suficiente (ver ocr/consenso.py).
+def iniciar_validacion_rafaga(tipo_acceso, vigilante_id):
+    sesion = crear_sesion(tipo_acceso, vigilante_id)
+    return {
+        "id_sesion": sesion.id,
+        "tipo_acceso": tipo_acceso,
+        "umbral": sesion.umbral,
+        "max_frames": sesion.max_frames
+    }, 201
+
+
+def agregar_frame_rafaga(id_sesion, imagen):
+    sesion = obtener_sesion(id_sesion)
+    if sesion is None:
+        return {"error": "Sesión de validación no encontrada o vencida"}, 404
+    # Ya decidida: los frames que sigan llegando no cuestan OCR
+    if sesion.decision is not None:
+        return sesion.decision
+    if not imagen:
+        return {"error": "No hay imagen"}, 400
+
+    try:
+        try:
+            # Sin caché: un acierto repetiría la misma lectura y votaría
+            # varias veces por ella, fabricando un consenso que no existe
+            detalle = reconocer_detalle(imagen, usar_cache=False)
+        except ColaOCRLlenaError:
+            return {"error": "Servicio OCR saturado, intente de nuevo"}, 503
+        except TiempoOCRAgotadoError:
+            detalle = {"placa": None}
+
+        # El OCR corre sin bloquear; el voto y la decisión, con la fila tomada
+        sesion = obtener_sesion(id_sesion, bloquear=True)
+        if sesion is None:
+            return {"error": "Sesión de validación no encontrada o vencida"}, 404
+        if sesion.decision is not None:
+            return sesion.decision
+        sesion.agregar_lectura(detalle.get("placa"), detalle.get("confianza"))
+        resumen = sesion.consenso()
+        if not sesion.listo_para_decidir(resumen):
+            guardar_sesion(sesion)
+            return {"estado": "en_curso", "consenso": resumen}, 200
+        respuesta = _decidir_rafaga(sesion, resumen)
+        guardar_sesion(sesion)
+        return respuesta
 
     except Exception as e:
         print(f"❌ Error: {e}")
         return {"error": str(e)}, 500
+
+
+def cerrar_validacion_rafaga(id_sesion):
+    """
+    Fuerza la decisión con las lecturas acumuladas y libera la sesión. El
+    borrado va en la misma transacción: si la decisión falla (500) la
+    sesión sigue ahí y el cierre se puede reintentar.
+    """
+    try:
+        sesion = obtener_sesion(id_sesion, bloquear=True)
+        if sesion is None:
+            return {"error": "Sesión de validación no encontrada o vencida"}, 404
+        respuesta = sesion.decision or _decidir_rafaga(sesion, sesion.consenso())
+        eliminar_sesion(id_sesion)
+        return respuesta
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        return {"error": str(e)}, 500
+
+
+def _decidir_rafaga(sesion, resumen):
+    # Se llama con la fila de la sesión bloqueada: una sola decisión por sesión
+    if es_placa_valida(resumen["placa"]):
+        print(f"📡 Consenso: Placa {resumen['placa']} ({resumen['confianza']}) | Tipo: {sesion.tipo_acceso}")
+        respuesta, status = decidir_acceso(resumen["placa"], sesion.tipo_acceso, sesion.vigilante_id)
+    else:
+        respuesta, status = {"resultado": "Denegado", "datos": {"placa": "No detectada", "motivo": "Imagen ilegible"}}, 200
+
+    respuesta = {**respuesta, "estado": "decidido", "consenso": resumen}
+    # Los errores de BD no se memorizan: el siguiente frame vuelve a intentarlo.
+    # La decisión se guarda con guardar_sesion en la misma transacción que el
+    # acceso: si esta se revierte, tampoco queda memorizada
+    if status < 500:
+        sesion.decision = (respuesta, status)
+    return respuesta, status
@@ -1,6 +1,8 @@
 from core.db.connection import get_connection
 from psycopg2.extras import RealDictCursor
 from core.auditoria_utils import registrar_auditoria_global
+from core.services.contadores import contador_sumar
+from core.services.tiempo_real import publicar_evento
 
 def obtener_alertas_controller():
     """
@@ -70,7 +72,11 @@ def eliminar_alerta_controller(id_alerta, vigilante_id=None):
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM alerta WHERE id_alerta = %s", (id_alerta,))
+        borradas = cursor.rowcount
         conn.commit()
+        contador_sumar("alertas", -borradas)
+        if borradas:
+            publicar_evento("alerta", {"movimiento": "resuelta", "id_alerta": id_alerta})
         
         # Auditoría opcional
         if vigilante_id:
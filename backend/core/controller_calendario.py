@@ -1,7 +1,9 @@
 # backend/core/controller_calendario.py
 from core.db.connection import get_connection
+from core.db.sesion import conexion_unidad
 from psycopg2.extras import RealDictCursor
 from core.auditoria_utils import registrar_auditoria_global
+from core.services.eventos_activos import EVENTOS_INDICE_ACTIVO, obtener_indice_eventos, invalidar_eventos
 
 def obtener_eventos_controller():
     conn = None
@@ -31,19 +33,46 @@ def obtener_eventos_controller():
         if conn: conn.close()
 
 def hay_evento_activo_controller():
-    conn = None
+    if EVENTOS_INDICE_ACTIVO:
+        try:
+            return obtener_indice_eventos().hay_evento_en()
+        except Exception as e:
+            print(f"Error consultando índice de eventos: {e}")
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        query = "SELECT COUNT(*) FROM evento WHERE NOW() BETWEEN fecha_inicio AND fecha_fin"
-        cur.execute(query)
-        cantidad = cur.fetchone()[0]
+        # Reutiliza la conexión de la unidad de trabajo si la validación la abrió
+        with conexion_unidad() as conn:
+            cur = conn.cursor()
+            query = "SELECT COUNT(*) FROM evento WHERE NOW() BETWEEN fecha_inicio AND fecha_fin"
+            cur.execute(query)
+            cantidad = cur.fetchone()[0]
+            cur.close()
         return cantidad > 0
     except Exception as e:
         print(f"Error verificando eventos activos: {e}")
         return False
-    finally:
-        if conn: conn.close()
+
+def eventos_activos_controller():
+    """Eventos activos ahora (más reciente primero), para asociarlos a la entrada de invitados."""
+    if EVENTOS_INDICE_ACTIVO:
+        try:
+            return obtener_indice_eventos().eventos_en()
+        except Exception as e:
+            print(f"Error consultando índice de eventos: {e}")
+    try:
+        with conexion_unidad() as conn:
+            cur = conn.cursor(cursor_factory=RealDictCursor)
+            cur.execute("""
+                SELECT id_evento, titulo, categoria, ubicacion, verificado, fecha_inicio, fecha_fin
+                FROM evento
+                WHERE NOW() BETWEEN fecha_inicio AND fecha_fin
+                ORDER BY fecha_inicio DESC
+            """)
+            eventos = cur.fetchall()
+            cur.close()
+        return [dict(e) for e in eventos]
+    except Exception as e:
+        print(f"Error verificando eventos activos: {e}")
+        return []
 
 def crear_evento_controller(data, usuario_actual):
     conn = None
@@ -67,6 +96,7 @@ def crear_evento_controller(data, usuario_actual):
         ))
         id_nuevo = cursor.fetchone()[0]
         conn.commit()
+        invalidar_eventos()
         registrar_auditoria_global(
             id_usuario=id_creador,
             entidad="EVENTO",
@@ -107,6 +137,7 @@ def actualizar_evento_controller(id_evento, data, usuario_actual=None):
             id_evento
         ))
         conn.commit()
+        invalidar_eventos()
 
         # Auditoría
         if usuario_actual and evento_anterior:
@@ -144,6 +175,7 @@ def eliminar_evento_controller(id_evento, usuario_actual):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM evento WHERE id_evento = %s", (id_evento,))
         conn.commit()
+        invalidar_eventos()
 
         for campo in ['fecha_inicio','fecha_fin']:
             if evento_anterior.get(campo):
@@ -173,6 +205,7 @@ def verificar_evento_controller(id_evento, estado_verificacion, usuario_actual=N
         query = "UPDATE evento SET verificado = %s WHERE id_evento = %s"
         cursor.execute(query, (estado_verificacion, id_evento))
         conn.commit()
+        invalidar_eventos()
 
         # Auditoría
         if usuario_actual:
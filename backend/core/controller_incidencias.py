@@ -2,8 +2,15 @@ from core.db.connection import get_connection
 from psycopg2.extras import RealDictCursor
 from datetime import date
 from core.auditoria_utils import registrar_auditoria_global
+from core.services.ocupacion_patio import obtener_indice_patio, indice_disponible
+from core.services.contadores import contador_sumar
+from core.services.tiempo_real import publicar_evento
 
 def obtener_vehiculos_en_patio():
+    # Con el índice del patio cargado, el listado sale de memoria
+    if indice_disponible():
+        return obtener_indice_patio().listar()
+
     conn = None
     try:
         conn = get_connection()
@@ -62,6 +69,12 @@ def _insertar_alerta(data, id_vigilante, id_acceso):
         ))
         id_nueva_alerta = cursor.fetchone()[0]
         conn.commit()
+        contador_sumar("alertas")
+        publicar_evento("alerta", {
+            "movimiento": "creada", "id_alerta": id_nueva_alerta, "tipo": data.get('tipo'),
+            "severidad": data.get('severidad'), "detalle": data.get('detalle'),
+            "id_acceso": id_acceso, "id_vigilante": id_vigilante
+        })
 
         # Auditoría
         registrar_auditoria_global(
@@ -1,50 +1,30 @@
 # backend/core/controller_personas.py
 # Lógica de negocio para el CRUD de Personas y Auditoría (Alineado con bd_carros.sql)
 
-import json
 # CORREGIDO: Importación del modelo con la ruta completa
 from models.persona import Persona 
 from core.db.connection import get_connection
 # CORREGIDO: Importación de Psycopg2 para cursores de diccionario
 from psycopg2.extras import RealDictCursor
 from core.auditoria_utils import registrar_auditoria_global
+from core.services.registro_placas import invalidar_registro
 # --- Función de Auditoría (Corregida para bd_carros.sql) ---
 
 def _registrar_auditoria(id_vigilante, entidad, id_entidad, accion, datos_previos=None, datos_nuevos=None):
     """
     Función helper para insertar un registro de auditoría.
+    Pasa por registrar_auditoria_global (escritura por lotes en segundo plano).
     """
-    conn = None
-    cursor = None
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # --- CAMBIO CLAVE AQUÍ ---
-        # La columna ahora se llama 'id_usuario' en la BD
-        query = """
-        INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        # -------------------------
-        
-        val_ant_str = json.dumps(datos_previos, default=str) if datos_previos else None
-        val_nue_str = json.dumps(datos_nuevos, default=str) if datos_nuevos else None
-        
-        # Pasamos el 'id_vigilante' (que es el id_audit/nu) a la columna 'id_usuario'
-        cursor.execute(query, (id_vigilante, entidad, id_entidad, accion, val_ant_str, val_nue_str))
-        conn.commit()
-        print(f"[Auditoria] Registro creado: {accion} en {entidad} (ID: {id_entidad}) por usuario {id_vigilante}")
-        
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        print(f"Error al registrar auditoría: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+    # Pasamos el 'id_vigilante' (que es el id_audit/nu) a la columna 'id_usuario'
+    registrar_auditoria_global(
+        id_usuario=id_vigilante,
+        entidad=entidad,
+        id_entidad=id_entidad,
+        accion=accion,
+        datos_previos=datos_previos,
+        datos_nuevos=datos_nuevos
+    )
+    print(f"[Auditoria] Registro encolado: {accion} en {entidad} (ID: {id_entidad}) por usuario {id_vigilante}")
 # --- Funciones del CRUD de Personas (Corregido) ---
 
 def obtener_personas_controller():
@@ -185,6 +165,8 @@ def actualizar_persona_controller(id_persona, data, usuario_actual):
         ))
         
         conn.commit()
+        # El nombre del propietario viaja en el registro de placas
+        invalidar_registro(id_persona=id_persona)
 
         # 4. Registrar Auditoría
         _registrar_auditoria(
@@ -234,6 +216,7 @@ def desactivar_persona_controller(id_persona, usuario_actual):
         cursor = conn.cursor()
         cursor.execute("UPDATE persona SET estado = 0 WHERE id_persona = %s", (id_persona,))
         conn.commit()
+        invalidar_registro(id_persona=id_persona)
 
         # 3. Registrar Auditoría
         persona_actualizada = persona_anterior.to_dict()
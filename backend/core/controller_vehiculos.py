@@ -11,6 +11,10 @@ from psycopg2.extras import RealDictCursor
 # Importamos la función de auditoría
 from core.controller_personas import _registrar_auditoria
 from core.auditoria_utils import registrar_auditoria_global
+from core.services.ocupacion_patio import resincronizar_vehiculo
+from core.services.registro_placas import placa_registrada_agregada, invalidar_registro
+from core.services.contadores import contador_sumar
+from core.services.coincidencia_placas import invalidar_coincidencias
 
 # ==========================================================
 # OBTENER VEHÍCULOS
@@ -86,12 +90,13 @@ def crear_vehiculo_controller(data, usuario_actual):
             raise ValueError(f"La Persona (propietario) con ID {nuevo_vehiculo.id_persona} no existe o está inactiva.")
             
         query = """
-        INSERT INTO vehiculo (placa, tipo, color, id_persona)
-        VALUES (%s, %s, %s, %s)
+        INSERT INTO vehiculo (placa, placa_norm, tipo, color, id_persona)
+        VALUES (%s, %s, %s, %s, %s)
         RETURNING id_vehiculo
         """
         cursor.execute(query, (
             nuevo_vehiculo.placa,
+            nuevo_vehiculo.placa_norm,
             nuevo_vehiculo.tipo,
             nuevo_vehiculo.color,
             nuevo_vehiculo.id_persona
@@ -99,6 +104,9 @@ def crear_vehiculo_controller(data, usuario_actual):
         
         id_vehiculo_nuevo = cursor.fetchone()[0]
         conn.commit()
+        placa_registrada_agregada(nuevo_vehiculo.placa)
+        invalidar_coincidencias()
+        contador_sumar("vehiculos")
         
         # Registrar auditoría
         nuevo_vehiculo.id_vehiculo = id_vehiculo_nuevo
@@ -162,6 +170,7 @@ def actualizar_vehiculo_controller(id_vehiculo, data, usuario_actual):
         query = """
         UPDATE vehiculo SET
             placa = %s,
+            placa_norm = %s,
             tipo = %s,
             color = %s,
             id_persona = %s
@@ -169,6 +178,7 @@ def actualizar_vehiculo_controller(id_vehiculo, data, usuario_actual):
         """
         cursor.execute(query, (
             vehiculo_actualizado.placa,
+            vehiculo_actualizado.placa_norm,
             vehiculo_actualizado.tipo,
             vehiculo_actualizado.color,
             vehiculo_actualizado.id_persona,
@@ -186,6 +196,11 @@ def actualizar_vehiculo_controller(id_vehiculo, data, usuario_actual):
             datos_previos=vehiculo_anterior.to_dict(),
             datos_nuevos=vehiculo_actualizado.to_dict()
         )
+        # La placa, tipo, color o dueño pudieron cambiar con el vehículo dentro
+        invalidar_registro(placa=vehiculo_anterior.placa, id_vehiculo=id_vehiculo)
+        placa_registrada_agregada(vehiculo_actualizado.placa)
+        invalidar_coincidencias()
+        resincronizar_vehiculo(id_vehiculo)
         return True
 
     except Exception as e:
@@ -223,7 +238,9 @@ def eliminar_vehiculo_controller(id_vehiculo, usuario_actual):
         # Ejecutar borrado real
         cursor = conn.cursor()
         cursor.execute("DELETE FROM vehiculo WHERE id_vehiculo = %s", (id_vehiculo,))
+        borrados = cursor.rowcount
         conn.commit()
+        contador_sumar("vehiculos", -borrados)
 
         # Registrar auditoría
         _registrar_auditoria(
@@ -234,6 +251,9 @@ def eliminar_vehiculo_controller(id_vehiculo, usuario_actual):
             datos_previos=vehiculo_anterior.to_dict(),
             datos_nuevos=None
         )
+        invalidar_registro(placa=vehiculo_anterior.placa, id_vehiculo=id_vehiculo)
+        invalidar_coincidencias()
+        resincronizar_vehiculo(id_vehiculo)
         return True
     except Exception as e:
         if conn: conn.rollback()
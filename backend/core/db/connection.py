@@ -1,31 +1,355 @@
-import psycopg2
 import os
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
 from dotenv import load_dotenv
 
 # Carga las variables del archivo .env en el entorno
 load_dotenv()
 
+# ===========================================================
+# Configuración del pool (variables de entorno)
+# ===========================================================
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Tiempo máximo (segundos) que un llamador espera por una conexión libre
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Una conexión que lleva más de N segundos ociosa se valida con SELECT 1 al prestarla
+DB_POOL_HEALTHCHECK_SEGUNDOS = float(os.getenv("DB_POOL_HEALTHCHECK_SEGUNDOS", "30"))
+DB_ZONA_HORARIA = os.getenv("DB_ZONA_HORARIA", "America/Bogota")
+
+
+class PoolAgotadoError(Exception):
+    """No se consiguió una conexión libre dentro del tiempo de espera."""
+
+
+def identidad_proceso():
+    """
+    application_name de las conexiones de este proceso ('smartcar:<host>:<pid>').
+    Los triggers de la migración 006 lo incluyen en cada notificación, así el
+    bus de cambios (core/services/bus_cambios.py) ignora lo que hizo el mismo proceso.
+    """
+    # Postgres recorta application_name a 63 caracteres
+    return f"smartcar:{socket.gethostname()[:40]}:{os.getpid()}"
+
+
+def _crear_conexion_fisica():
+    # Llama a las variables de entorno para la conexión
+    conn = psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        database=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        port=os.getenv("DB_PORT"),
+        client_encoding='UTF8',
+        application_name=identidad_proceso()
+    )
+
+    # --- CORRECCIÓN DE HORA ---
+    # Forzamos la sesión a la hora de Colombia una sola vez por conexión física;
+    # el SET queda confirmado y sobrevive a los rollback posteriores.
+    cur = conn.cursor()
+    cur.execute("SET TIME ZONE %s;", (DB_ZONA_HORARIA,))
+    cur.close()
+    conn.commit()
+    # --------------------------
+
+    return conn
+
+
+def conexion_dedicada():
+    """
+    Conexión física fuera del pool, en autocommit. Para un hilo que la ocupa
+    todo el tiempo (LISTEN del bus de cambios); quien la pide la cierra.
+    """
+    conn = _crear_conexion_fisica()
+    conn.autocommit = True
+    return conn
+
+
+class ConexionPool:
+    """
+    Envoltura de una conexión psycopg2 prestada por el pool.
+    Se comporta como la conexión original, pero close() la devuelve al pool
+    en lugar de cerrarla, así el código existente no necesita cambios.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._devuelta = False
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+    # `with conn:` delimita una transacción igual que en psycopg2
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    @property
+    def conexion_fisica(self):
+        return self._conn
+
+    @property
+    def closed(self):
+        return self._devuelta or self._conn.closed
+
+    def close(self):
+        if self._devuelta:
+            return
+        self._devuelta = True
+        self._pool.devolver(self._conn)
+
+    def __del__(self):
+        # Red de seguridad: si alguien olvida cerrar, la conexión vuelve al pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones thread-safe con tamaño mínimo/máximo, espera acotada,
+    validación al préstamo y métricas de uso.
+    """
+
+    def __init__(self, minimo=DB_POOL_MIN, maximo=DB_POOL_MAX, timeout=DB_POOL_TIMEOUT,
+                 healthcheck_segundos=DB_POOL_HEALTHCHECK_SEGUNDOS):
+        if maximo < 1 or minimo < 0 or minimo > maximo:
+            raise ValueError("Configuración de pool inválida (min/max)")
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.healthcheck_segundos = healthcheck_segundos
+
+        self._cond = threading.Condition()
+        self._libres = deque()      # (conexion, momento en que se devolvió)
+        self._en_uso = set()        # id() de las conexiones prestadas
+        self._total = 0             # conexiones físicas abiertas o en apertura
+        self._cerrado = False
+
+        # Métricas
+        self._prestamos = 0
+        self._esperas = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+        self._agotados = 0
+        self._descartadas = 0
+
+        for _ in range(minimo):
+            try:
+                conn = _crear_conexion_fisica()
+            except Exception as e:
+                print(f"❌ Error creando conexión inicial del pool: {e}")
+                break
+            self._libres.append((conn, time.monotonic()))
+            self._total += 1
+
+    # -------------------------------------------------------
+    def obtener(self, timeout=None):
+        """Presta una conexión; espera como máximo `timeout` segundos."""
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        tuvo_que_esperar = False
+
+        while True:
+            conn = None
+            crear = False
+            with self._cond:
+                while True:
+                    if self._cerrado:
+                        raise PoolAgotadoError("El pool de conexiones está cerrado")
+                    if self._libres:
+                        conn, devuelta_en = self._libres.pop()
+                        break
+                    if self._total < self.maximo:
+                        self._total += 1
+                        crear = True
+                        break
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._agotados += 1
+                        raise PoolAgotadoError(
+                            f"Sin conexiones libres tras {timeout:.1f}s (máximo {self.maximo})"
+                        )
+                    tuvo_que_esperar = True
+                    self._cond.wait(restante)
+
+            if crear:
+                try:
+                    conn = _crear_conexion_fisica()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._esta_sana(conn, devuelta_en):
+                self._descartar(conn)
+                continue
+
+            espera = time.monotonic() - inicio
+            with self._cond:
+                self._en_uso.add(id(conn))
+                self._prestamos += 1
+                self._espera_total += espera
+                if tuvo_que_esperar:
+                    self._esperas += 1
+                if espera > self._espera_max:
+                    self._espera_max = espera
+            return ConexionPool(self, conn)
+
+    def devolver(self, conn):
+        """Recibe una conexión prestada; la limpia y la deja disponible."""
+        with self._cond:
+            if id(conn) not in self._en_uso:
+                return
+            self._en_uso.discard(id(conn))
+
+        sana = not conn.closed
+        if sana:
+            try:
+                estado = conn.info.transaction_status
+                if estado == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    sana = False
+                elif estado != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                sana = False
+
+        if not sana or self._cerrado:
+            self._descartar(conn)
+            return
+
+        with self._cond:
+            self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _esta_sana(self, conn, devuelta_en):
+        if conn.closed:
+            return False
+        if time.monotonic() - devuelta_en < self.healthcheck_segundos:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._descartadas += 1
+            self._cond.notify()
+
+    def cerrar(self):
+        with self._cond:
+            self._cerrado = True
+            libres = list(self._libres)
+            self._libres.clear()
+            self._total -= len(libres)
+            self._cond.notify_all()
+        for conn, _ in libres:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "abiertas": self._total,
+                "en_uso": len(self._en_uso),
+                "libres": len(self._libres),
+                "prestamos": self._prestamos,
+                "prestamos_con_espera": self._esperas,
+                "espera_promedio_ms": round(self._espera_total / self._prestamos * 1000, 3) if self._prestamos else 0.0,
+                "espera_max_ms": round(self._espera_max * 1000, 3),
+                "agotados": self._agotados,
+                "descartadas": self._descartadas,
+            }
+
+
+# ===========================================================
+# Pool global del proceso
+# ===========================================================
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """
+    Devuelve el pool del proceso actual, creándolo al primer uso.
+    Se recrea si detecta un fork (cada worker de gunicorn tiene el suyo).
+    """
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = PoolConexiones()
+                _pool_pid = pid
+    return _pool
+
+
+def estadisticas_pool():
+    if _pool is None or _pool_pid != os.getpid():
+        return {"abiertas": 0, "en_uso": 0, "libres": 0, "prestamos": 0}
+    return _pool.estadisticas()
+
+
 def get_connection():
+    """
+    Presta una conexión del pool. Compatible con el código existente:
+    llamar a conn.close() la devuelve al pool.
+    """
     try:
-        # Llama a las variables de entorno para la conexión
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            database=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            port=os.getenv("DB_PORT"),
-            client_encoding='UTF8'
-        )
-        
-        # --- CORRECCIÓN DE HORA ---
-        # Forzamos la sesión a la hora de Colombia inmediatamente al conectar
-        cur = conn.cursor()
-        cur.execute("SET TIME ZONE 'America/Bogota';")
-        cur.close()
-        conn.commit()
-        # --------------------------
-        
-        return conn
+        return obtener_pool().obtener()
     except Exception as e:
         print(f"❌ Error crítico conectando a la BD: {e}")
-        return None
\ No newline at end of file
+        return None
+
+
+@contextmanager
+def conexion(timeout=None):
+    """
+    Context manager para el código nuevo:
+
+        with conexion() as conn:
+            ...
+
+    Confirma al salir sin errores, hace rollback si hay excepción
+    y siempre devuelve la conexión al pool.
+    """
+    conn = obtener_pool().obtener(timeout)
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        conn.close()
@@ -0,0 +1,177 @@
+# backend/core/db/sesion.py
+# Unidad de trabajo por petición: una conexión y una transacción compartidas
+# por todos los modelos que participan en la misma petición Flask.
+
+import itertools
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_app_context, jsonify
+
+from core.db.connection import conexion, obtener_pool
+
+
+class SesionBD:
+    """
+    Conexión prestada del pool que vive durante toda la petición.
+    Los modelos la usan a través de conexion_unidad(); se confirma una sola vez
+    al terminar la petición con finalizar().
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._contador_sp = itertools.count(1)
+        self._al_confirmar = []
+        self.fallida = False
+
+    @property
+    def conexion(self):
+        # La conexión se pide al primer uso, no al crear la sesión
+        if self._conn is None:
+            self._conn = obtener_pool().obtener()
+        return self._conn
+
+    def al_confirmar(self, funcion):
+        """Registra una función que se ejecuta solo si la transacción se confirma."""
+        self._al_confirmar.append(funcion)
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Aísla una operación dentro de la transacción: si falla, solo se
+        deshace esa operación y la unidad de trabajo puede continuar.
+        """
+        conn = self.conexion
+        nombre = f"sp_{next(self._contador_sp)}"
+        cur = conn.cursor()
+        cur.execute(f"SAVEPOINT {nombre}")
+        try:
+            yield conn
+        except Exception:
+            try:
+                cur.execute(f"ROLLBACK TO SAVEPOINT {nombre}")
+            except Exception:
+                # La conexión quedó inutilizable: la unidad entera se deshace
+                self.fallida = True
+            raise
+        else:
+            cur.execute(f"RELEASE SAVEPOINT {nombre}")
+        finally:
+            cur.close()
+
+    def finalizar(self, exito=True):
+        """Confirma (o deshace) la transacción y devuelve la conexión al pool."""
+        conn, self._conn = self._conn, None
+        callbacks, self._al_confirmar = self._al_confirmar, []
+        if conn is None:
+            confirmada = exito and not self.fallida
+        else:
+            confirmada = False
+            try:
+                if exito and not self.fallida:
+                    conn.commit()
+                    confirmada = True
+                else:
+                    conn.rollback()
+            except Exception as e:
+                print(f"❌ Error finalizando la unidad de trabajo: {e}")
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            finally:
+                conn.close()
+
+        if confirmada:
+            for funcion in callbacks:
+                try:
+                    funcion()
+                except Exception as e:
+                    print(f"❌ Error en callback post-commit: {e}")
+        return confirmada
+
+
+# ===========================================================
+# Integración con Flask (g)
+# ===========================================================
+def sesion_actual():
+    """Sesión activa de la petición en curso, o None fuera de una unidad de trabajo."""
+    if not has_app_context():
+        return None
+    return g.get("sesion_bd")
+
+
+def iniciar_sesion():
+    sesion = sesion_actual()
+    if sesion is None:
+        sesion = SesionBD()
+        g.sesion_bd = sesion
+    return sesion
+
+
+def cerrar_sesion(exito=True):
+    if not has_app_context():
+        return False
+    sesion = g.pop("sesion_bd", None)
+    if sesion is None:
+        return False
+    return sesion.finalizar(exito)
+
+
+def unidad_de_trabajo(f):
+    """
+    Decorador de rutas: toda la petición usa una sola conexión y se confirma
+    una sola vez al final. Las respuestas con status >= 500 hacen rollback.
+    Si el commit falla, la respuesta de la ruta (que anunciaba éxito) se
+    reemplaza por un 500: nada de lo que decía quedó guardado.
+    """
+    @wraps(f)
+    def envoltura(*args, **kwargs):
+        iniciar_sesion()
+        try:
+            respuesta = f(*args, **kwargs)
+        except Exception:
+            cerrar_sesion(exito=False)
+            raise
+        status = respuesta[1] if isinstance(respuesta, tuple) and len(respuesta) > 1 else 200
+        exito = isinstance(status, int) and status < 500
+        if not cerrar_sesion(exito=exito) and exito:
+            return jsonify({"error": "No se pudieron guardar los cambios, intente de nuevo"}), 500
+        return respuesta
+    return envoltura
+
+
+def registrar_en_app(app):
+    """Red de seguridad: libera la sesión si la petición termina sin cerrarla."""
+    @app.teardown_appcontext
+    def _liberar_sesion_bd(exc):
+        cerrar_sesion(exito=False)
+
+
+@contextmanager
+def conexion_unidad():
+    """
+    Conexión para los modelos:
+      - dentro de una unidad de trabajo: la conexión compartida, aislada con
+        un savepoint y SIN commit (lo hace la unidad al final).
+      - fuera: una conexión del pool con commit/rollback propio.
+    """
+    sesion = sesion_actual()
+    if sesion is None:
+        with conexion() as conn:
+            yield conn
+    else:
+        with sesion.savepoint() as conn:
+            yield conn
+
+
+def al_confirmar(funcion):
+    """
+    Ejecuta `funcion` cuando los cambios sean definitivos: al commit de la
+    unidad de trabajo, o de inmediato si no hay unidad activa.
+    """
+    sesion = sesion_actual()
+    if sesion is None:
+        funcion()
+    else:
+        sesion.al_confirmar(funcion)
@@ -0,0 +1,242 @@
+# backend/core/exportaciones.py
+# Exportaciones de accesos (PDF / Excel) sin cargar todo en memoria.
+# Las filas se leen con un cursor con nombre (del lado del servidor) en lotes
+# de EXPORTACION_LOTE y se escriben directo al documento, que se arma en un
+# archivo temporal y se envía en trozos.
+#
+# Ni el .xlsx (un zip que openpyxl cierra en save()) ni el PDF se pueden
+# enviar antes de terminarlos, así que una exportación con más de
+# EXPORTACION_SINCRONA_MAX_FILAS filas no se arma en la petición: va por los
+# trabajos en segundo plano (core/services/trabajos_exportacion.py).
+#
+# Límite conocido: el canvas de reportlab conserva en memoria el contenido de
+# todas las páginas hasta save(); con páginas comprimidas el costo es pequeño
+# frente al de la lista de dicts anterior, pero no es constante como en Excel.
+
+import csv
+import os
+import tempfile
+import uuid
+
+from openpyxl import Workbook
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from core.db.connection import conexion
+from core.controller_accesos import limite_rango_fecha
+from core.services.registro_placas import normalizar_placa
+
+EXPORTACION_LOTE = int(os.getenv("EXPORTACION_LOTE", "2000"))
+# Más filas que esto pasan a trabajo en segundo plano (0 = siempre en la petición)
+EXPORTACION_SINCRONA_MAX_FILAS = int(os.getenv("EXPORTACION_SINCRONA_MAX_FILAS", "20000"))
+# Tamaño de cada trozo de la respuesta HTTP
+TAMANO_TROZO = 64 * 1024
+
+COLUMNAS = ["Placa", "Tipo", "Color", "Propietario", "Resultado"]
+
+
+def filtros_exportacion(args):
+    """desde / hasta / placa desde los query params (ValueError si una fecha es inválida)."""
+    filtros = {}
+    if args.get("desde"):
+        filtros["desde"] = limite_rango_fecha(args["desde"])
+    if args.get("hasta"):
+        filtros["hasta"] = limite_rango_fecha(args["hasta"], es_hasta=True)
+    if args.get("placa"):
+        filtros["placa"] = args["placa"]
+    return filtros
+
+
+# Columnas del reporte (PDF / Excel) y del CSV, que agrega id, fechas y salida
+CAMPOS_REPORTE = ("v.placa", "v.tipo", "v.color", "p.nombre AS propietario", "a.resultado")
+CAMPOS_CSV = ("a.id_acceso", "a.fecha_hora", "v.placa", "v.tipo", "v.color",
+              "p.nombre AS propietario", "a.resultado", "a.hora_salida")
+
+
+def condiciones_accesos(filtros):
+    """WHERE (y parámetros) de las exportaciones; 'id_min' / 'id_max' acotan por id_acceso."""
+    condiciones = []
+    params = []
+    if filtros.get("desde"):
+        condiciones.append("a.fecha_hora >= %s")
+        params.append(filtros["desde"])
+    if filtros.get("hasta"):
+        condiciones.append("a.fecha_hora < %s")
+        params.append(filtros["hasta"])
+    if filtros.get("placa"):
+        condiciones.append("v.placa_norm LIKE %s")
+        params.append(f"%{normalizar_placa(filtros['placa'])}%")
+    if filtros.get("id_min") is not None:
+        condiciones.append("a.id_acceso >= %s")
+        params.append(filtros["id_min"])
+    if filtros.get("id_max") is not None:
+        condiciones.append("a.id_acceso <= %s")
+        params.append(filtros["id_max"])
+    return "".join(f" AND {c}" for c in condiciones), params
+
+
+def iterar_accesos_detalle(filtros=None, tamano_lote=EXPORTACION_LOTE, campos=CAMPOS_REPORTE):
+    """
+    Genera las filas (por defecto placa, tipo, color, propietario, resultado)
+    en orden de id_acceso. La conexión queda tomada mientras se consume el generador.
+    """
+    where, params = condiciones_accesos(filtros or {})
+
+    with conexion() as conn:
+        # Cursor con nombre: Postgres entrega las filas por lotes de itersize
+        with conn.cursor(name=f"exportacion_{uuid.uuid4().hex}") as cur:
+            cur.itersize = tamano_lote
+            cur.execute(f"""
+                SELECT {", ".join(campos)}
+                FROM acceso a
+                JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+                JOIN persona p ON v.id_persona = p.id_persona
+                WHERE 1=1 {where}
+                ORDER BY a.id_acceso ASC
+            """, tuple(params))
+            for fila in cur:
+                yield fila
+
+
+def excede_exportacion_sincrona(filtros=None):
+    """True si la exportación tiene más filas de las que se arman dentro de la petición."""
+    if not EXPORTACION_SINCRONA_MAX_FILAS:
+        return False
+    where, params = condiciones_accesos(filtros or {})
+    with conexion() as conn:
+        with conn.cursor() as cur:
+            # Conteo acotado: lee a lo sumo límite + 1 filas
+            cur.execute(f"""
+                SELECT COUNT(*) FROM (
+                    SELECT 1
+                    FROM acceso a
+                    JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+                    WHERE 1=1 {where}
+                    LIMIT %s
+                ) t
+            """, (*params, EXPORTACION_SINCRONA_MAX_FILAS + 1))
+            return cur.fetchone()[0] > EXPORTACION_SINCRONA_MAX_FILAS
+
+
+def _enviar_y_borrar(ruta):
+    """Lee el archivo temporal en trozos para la respuesta y lo borra al final."""
+    try:
+        with open(ruta, "rb") as f:
+            while True:
+                trozo = f.read(TAMANO_TROZO)
+                if not trozo:
+                    break
+                yield trozo
+    finally:
+        os.remove(ruta)
+
+
+def _archivo_temporal(sufijo):
+    descriptor, ruta = tempfile.mkstemp(prefix="smartcar_", suffix=sufijo)
+    os.close(descriptor)
+    return ruta
+
+
+# ===========================================================
+# Excel (openpyxl en modo write_only: filas directo a disco)
+# ===========================================================
+def escribir_excel(ruta, filtros=None):
+    """Escribe el .xlsx en `ruta`; retorna el número de filas."""
+    filas = 0
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Vehículos")
+    ws.append(COLUMNAS)
+    for fila in iterar_accesos_detalle(filtros):
+        ws.append([valor or "" for valor in fila])
+        filas += 1
+    wb.save(ruta)
+    return filas
+
+
+def generar_excel(filtros=None):
+    """Arma el .xlsx en un temporal y devuelve un generador de bytes."""
+    ruta = _archivo_temporal(".xlsx")
+    try:
+        escribir_excel(ruta, filtros)
+    except Exception:
+        os.remove(ruta)
+        raise
+    return _enviar_y_borrar(ruta)
+
+
+# ===========================================================
+# PDF (reportlab, página a página)
+# ===========================================================
+def _encabezado_pdf(pdf, primera):
+    y = 750
+    if primera:
+        pdf.setTitle("Reporte de Vehículos - SmartCar")
+        pdf.setFont("Helvetica-Bold", 14)
+        pdf.drawString(200, 750, "REPORTE DE VEHÍCULOS REGISTRADOS")
+        y = 720
+    pdf.setFont("Helvetica", 11)
+    for x, titulo in zip((40, 120, 230, 340, 500), COLUMNAS):
+        pdf.drawString(x, y, titulo)
+    return y - 20
+
+
+def escribir_pdf(ruta, filtros=None):
+    """Escribe el PDF en `ruta`; retorna el número de filas."""
+    filas = 0
+    pdf = canvas.Canvas(ruta, pagesize=letter, pageCompression=1)
+    y = _encabezado_pdf(pdf, primera=True)
+    for fila in iterar_accesos_detalle(filtros):
+        for x, valor in zip((40, 120, 230, 340, 500), fila):
+            pdf.drawString(x, y, valor or "")
+        filas += 1
+        y -= 15
+        if y < 50:
+            pdf.showPage()
+            y = _encabezado_pdf(pdf, primera=False)
+    pdf.save()
+    return filas
+
+
+def generar_pdf(filtros=None):
+    """Arma el PDF en un temporal y devuelve un generador de bytes."""
+    ruta = _archivo_temporal(".pdf")
+    try:
+        escribir_pdf(ruta, filtros)
+    except Exception:
+        os.remove(ruta)
+        raise
+    return _enviar_y_borrar(ruta)
+
+
+# ===========================================================
+# CSV (admite agregar filas a un archivo existente)
+# ===========================================================
+def escribir_csv(archivo, filtros=None, encabezado=True, frontera_id=None):
+    """
+    Escribe en el archivo de texto abierto `archivo`. Retorna
+    (filas, bytes_prefijo, filas_prefijo): posición en bytes y filas escritas
+    antes de la primera fila con id_acceso >= frontera_id (o el total si no hay).
+    """
+    escritor = csv.writer(archivo)
+    if encabezado:
+        escritor.writerow(["id_acceso", "fecha_hora", "placa", "tipo", "color", "propietario", "resultado", "hora_salida"])
+    filas = 0
+    bytes_prefijo = None
+    filas_prefijo = None
+    for fila in iterar_accesos_detalle(filtros, campos=CAMPOS_CSV):
+        if bytes_prefijo is None and frontera_id is not None and fila[0] >= frontera_id:
+            archivo.flush()
+            bytes_prefijo = archivo.buffer.tell() if hasattr(archivo, "buffer") else archivo.tell()
+            filas_prefijo = filas
+        escritor.writerow([
+            fila[0],
+            fila[1].isoformat() if fila[1] else "",
+            fila[2], fila[3], fila[4] or "", fila[5], fila[6],
+            fila[7].isoformat() if fila[7] else "",
+        ])
+        filas += 1
+    archivo.flush()
+    if bytes_prefijo is None:
+        bytes_prefijo = archivo.buffer.tell() if hasattr(archivo, "buffer") else archivo.tell()
+        filas_prefijo = filas
+    return filas, bytes_prefijo, filas_prefijo
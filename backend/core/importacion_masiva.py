@@ -0,0 +1,315 @@
+# backend/core/importacion_masiva.py
+# Importación masiva de personas y sus vehículos (inicio de semestre).
+# Cada fila del archivo (CSV con encabezado o JSONL) describe una persona y,
+# opcionalmente, un vehículo suyo:
+#     doc_identidad, nombre, tipo_persona[, placa, tipo, color]
+# Una persona con varios vehículos va en varias filas con el mismo documento.
+#
+#   1. Se valida todo en memoria; las filas con errores quedan en el reporte
+#      y no se cargan.
+#   2. Las válidas entran con COPY a una tabla temporal (staging).
+#   3. Una placa que ya es de otra persona no se reasigna: esa fila sale del
+#      staging y vuelve al reporte con error. Luego dos upserts en SQL de
+#      conjunto: persona por doc_identidad y vehiculo por placa_norm
+#      (migración 007).
+#   4. Una sola fila de auditoría con el resumen del lote.
+# Todo en una transacción: o entra el lote válido completo o nada.
+#
+# Los triggers del bus de cambios se silencian durante el lote (migración
+# 008) y al final sale un único aviso "importacion".
+#
+# Desde la línea de comandos:
+#     python -m core.importacion_masiva archivo.csv --usuario 1 [--simular]
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from core.db.connection import conexion, identidad_proceso
+from core.auditoria_utils import registrar_auditoria_global
+from core.services.registro_placas import normalizar_placa, cargar_registro_placas
+from core.services.ocupacion_patio import cargar_indice_patio
+from core.services.coincidencia_placas import invalidar_coincidencias
+from core.services.contadores import contador_sumar
+
+IMPORTACION_MAX_FILAS = int(os.getenv("IMPORTACION_MAX_FILAS", "50000"))
+FORMATOS_IMPORTACION = ("csv", "jsonl")
+
+CAMPOS = ("doc_identidad", "nombre", "tipo_persona", "placa", "tipo", "color")
+# Largo máximo de cada columna según bd_carros.sql
+_LARGOS = {"doc_identidad": 20, "nombre": 100, "tipo_persona": 50, "placa": 10, "tipo": 50, "color": 30}
+_COLUMNAS_STAGING = ("fila", "doc_identidad", "nombre", "tipo_persona", "placa", "placa_norm", "tipo", "color")
+
+
+# ===========================================================
+# Lectura y validación (en memoria)
+# ===========================================================
+def leer_filas(texto, formato):
+    """[(numero_fila, dict)] desde el texto del archivo. ValueError si el formato no se puede leer."""
+    if formato not in FORMATOS_IMPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}")
+    filas = []
+    if formato == "csv":
+        lector = csv.DictReader(io.StringIO(texto.lstrip("\ufeff")))
+        if not lector.fieldnames or "doc_identidad" not in [c.strip() for c in lector.fieldnames]:
+            raise ValueError("El CSV debe tener encabezado con al menos doc_identidad")
+        # La fila 1 es el encabezado
+        for numero, fila in enumerate(lector, 2):
+            filas.append((numero, {(k or "").strip(): v for k, v in fila.items()}))
+    else:
+        for numero, linea in enumerate(texto.splitlines(), 1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError:
+                fila = None
+            filas.append((numero, fila if isinstance(fila, dict) else {"_invalida": True}))
+    if len(filas) > IMPORTACION_MAX_FILAS:
+        raise ValueError(f"El archivo supera IMPORTACION_MAX_FILAS ({IMPORTACION_MAX_FILAS})")
+    return filas
+
+
+def validar_filas(filas):
+    """
+    Retorna (validas, errores). Cada válida es un dict con los CAMPOS limpios
+    más 'fila' y 'placa_norm'; cada error es {"fila", "errores": [...]}.
+    Dentro del archivo, un documento repetido debe traer los mismos datos
+    y una placa no puede aparecer dos veces.
+    """
+    validas, errores = [], []
+    personas = {}
+    placas = {}
+    for numero, crudo in filas:
+        if crudo.get("_invalida"):
+            errores.append({"fila": numero, "errores": ["JSON inválido"]})
+            continue
+        fila = {c: str(crudo.get(c) if crudo.get(c) is not None else "").strip() for c in CAMPOS}
+        problemas = []
+        for campo in ("doc_identidad", "nombre", "tipo_persona"):
+            if not fila[campo]:
+                problemas.append(f"{campo} es obligatorio")
+        for campo, largo in _LARGOS.items():
+            if len(fila[campo]) > largo:
+                problemas.append(f"{campo} supera {largo} caracteres")
+
+        fila["placa"] = fila["placa"].upper()
+        fila["placa_norm"] = normalizar_placa(fila["placa"]) or None
+        if fila["placa"]:
+            if not fila["placa_norm"] or len(fila["placa_norm"]) < 5:
+                problemas.append("placa inválida")
+            if not fila["tipo"]:
+                problemas.append("tipo es obligatorio si hay placa")
+            elif fila["tipo"] == "Invitado":
+                problemas.append("tipo 'Invitado' es exclusivo de los eventos")
+        elif fila["tipo"] or fila["color"]:
+            problemas.append("tipo/color sin placa")
+
+        persona = (fila["nombre"], fila["tipo_persona"])
+        previa = personas.get(fila["doc_identidad"])
+        if fila["doc_identidad"] and previa and previa[0] != persona:
+            problemas.append(f"doc_identidad repetido con otros datos (fila {previa[1]})")
+        if fila["placa_norm"] and fila["placa_norm"] in placas:
+            problemas.append(f"placa repetida (fila {placas[fila['placa_norm']]})")
+
+        if problemas:
+            errores.append({"fila": numero, "errores": problemas})
+            continue
+        personas.setdefault(fila["doc_identidad"], (persona, numero))
+        if fila["placa_norm"]:
+            placas[fila["placa_norm"]] = numero
+        fila["fila"] = numero
+        validas.append(fila)
+    return validas, errores
+
+
+# ===========================================================
+# Carga (COPY + upsert de conjunto)
+# ===========================================================
+def _copiar_a_staging(cur, validas):
+    cur.execute("""
+        CREATE TEMP TABLE importacion_staging (
+            fila INTEGER NOT NULL,
+            doc_identidad VARCHAR(20) NOT NULL,
+            nombre VARCHAR(100) NOT NULL,
+            tipo_persona VARCHAR(50) NOT NULL,
+            placa VARCHAR(10),
+            placa_norm VARCHAR(10),
+            tipo VARCHAR(50),
+            color VARCHAR(30)
+        ) ON COMMIT DROP
+    """)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    for fila in validas:
+        # Vacío sin comillas = NULL en COPY csv
+        escritor.writerow([fila[c] if fila[c] not in ("", None) else None for c in _COLUMNAS_STAGING])
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY importacion_staging ({', '.join(_COLUMNAS_STAGING)}) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+
+def _upsert_personas(cur):
+    """(creadas, actualizadas); las que no cambian no se tocan."""
+    cur.execute("""
+        INSERT INTO persona (doc_identidad, nombre, tipo_persona, estado)
+        SELECT DISTINCT ON (doc_identidad) doc_identidad, nombre, tipo_persona, 1
+        FROM importacion_staging
+        ORDER BY doc_identidad, fila
+        ON CONFLICT (doc_identidad) DO UPDATE
+            SET nombre = EXCLUDED.nombre,
+                tipo_persona = EXCLUDED.tipo_persona,
+                estado = 1
+            WHERE (persona.nombre, persona.tipo_persona, persona.estado)
+                  IS DISTINCT FROM (EXCLUDED.nombre, EXCLUDED.tipo_persona, 1)
+        RETURNING (xmax = 0) AS creada
+    """)
+    resultado = [fila["creada"] for fila in cur.fetchall()]
+    return sum(resultado), len(resultado) - sum(resultado)
+
+
+def _rechazar_placas_ajenas(cur):
+    """Saca del staging (y reporta) las placas registradas a otra persona."""
+    cur.execute("""
+        DELETE FROM importacion_staging s
+        USING vehiculo v, persona p
+        WHERE v.placa_norm = s.placa_norm
+          AND p.id_persona = v.id_persona
+          AND p.doc_identidad <> s.doc_identidad
+        RETURNING s.fila, s.placa, p.doc_identidad AS doc_actual
+    """)
+    return [
+        {"fila": f["fila"], "errores": [f"placa {f['placa']} ya registrada a la persona {f['doc_actual']}"]}
+        for f in cur.fetchall()
+    ]
+
+
+def _upsert_vehiculos(cur):
+    """(creados, actualizados). Nunca cambia el dueño de una placa existente."""
+    cur.execute("""
+        INSERT INTO vehiculo (placa, placa_norm, tipo, color, id_persona)
+        SELECT s.placa, s.placa_norm, s.tipo, s.color, p.id_persona
+        FROM importacion_staging s
+        JOIN persona p ON p.doc_identidad = s.doc_identidad
+        WHERE s.placa_norm IS NOT NULL
+        ON CONFLICT (placa_norm) DO UPDATE
+            SET placa = EXCLUDED.placa,
+                tipo = EXCLUDED.tipo,
+                color = EXCLUDED.color
+            WHERE vehiculo.id_persona = EXCLUDED.id_persona
+              AND (vehiculo.placa, vehiculo.tipo, vehiculo.color)
+                  IS DISTINCT FROM (EXCLUDED.placa, EXCLUDED.tipo, EXCLUDED.color)
+        RETURNING (xmax = 0) AS creado
+    """)
+    resultado = [fila["creado"] for fila in cur.fetchall()]
+    return sum(resultado), len(resultado) - sum(resultado)
+
+
+def importar(texto, formato, id_usuario, simular=False, nombre_archivo=None):
+    """
+    Importa el archivo y retorna el reporte:
+    {"resumen": {...}, "errores": [{"fila", "errores"}], "rendimiento": {...}}.
+    Con simular=True valida y ejecuta todo pero revierte la transacción.
+    Lanza ValueError si el archivo no se puede leer.
+    """
+    inicio = time.perf_counter()
+    filas = leer_filas(texto, formato)
+    validas, errores = validar_filas(filas)
+    t_validacion = time.perf_counter()
+
+    resumen = {
+        "filas": len(filas), "validas": len(validas), "con_error": 0,
+        "personas_creadas": 0, "personas_actualizadas": 0,
+        "vehiculos_creados": 0, "vehiculos_actualizados": 0,
+        "simulado": simular,
+    }
+    t_copia = t_validacion
+    if validas:
+        with conexion() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute("SET LOCAL smartcar.notificar = 'off'")
+                _copiar_a_staging(cur, validas)
+                t_copia = time.perf_counter()
+                rechazadas = _rechazar_placas_ajenas(cur)
+                resumen["personas_creadas"], resumen["personas_actualizadas"] = _upsert_personas(cur)
+                resumen["vehiculos_creados"], resumen["vehiculos_actualizados"] = _upsert_vehiculos(cur)
+                if simular:
+                    conn.rollback()
+                else:
+                    # Un solo aviso para el bus de cambios (ver migración 008)
+                    cur.execute("SELECT pg_notify('smartcar_cambios', %s)", (json.dumps({
+                        "tabla": "importacion", "op": "INSERT", "origen": identidad_proceso(),
+                        "nueva": {k: v for k, v in resumen.items() if k.startswith(("personas_", "vehiculos_"))},
+                    }),))
+        errores.extend(rechazadas)
+        resumen["validas"] -= len(rechazadas)
+    fin = time.perf_counter()
+
+    errores.sort(key=lambda e: e["fila"])
+    resumen["con_error"] = len(errores)
+    if validas and not simular:
+        refrescar_caches(resumen)
+        registrar_auditoria_global(
+            id_usuario=id_usuario,
+            entidad="importacion",
+            id_entidad=0,
+            accion="IMPORTAR_LOTE",
+            datos_nuevos={"archivo": nombre_archivo, "formato": formato, **resumen,
+                          "filas_con_error": [e["fila"] for e in errores][:100]}
+        )
+
+    duracion = fin - inicio
+    return {
+        "resumen": resumen,
+        "errores": errores,
+        "rendimiento": {
+            "segundos": round(duracion, 3),
+            "validacion_segundos": round(t_validacion - inicio, 3),
+            "copia_segundos": round(t_copia - t_validacion, 3),
+            "upsert_segundos": round(fin - t_copia, 3),
+            "filas_por_segundo": round(len(filas) / duracion, 1) if duracion > 0 else None,
+        },
+    }
+
+
+def refrescar_caches(resumen):
+    """Una recarga por lote en lugar de un ajuste por fila (también desde el bus de cambios)."""
+    if not any(resumen.get(k) for k in ("personas_creadas", "personas_actualizadas",
+                                        "vehiculos_creados", "vehiculos_actualizados")):
+        return
+    cargar_registro_placas()
+    invalidar_coincidencias()
+    if resumen["personas_actualizadas"] or resumen["vehiculos_actualizados"]:
+        # Nombre del dueño, tipo o color de vehículos que pueden estar dentro
+        cargar_indice_patio()
+    if resumen["vehiculos_creados"]:
+        contador_sumar("vehiculos", resumen["vehiculos_creados"])
+
+
+def formato_por_nombre(nombre_archivo, formato=None):
+    """csv / jsonl desde el parámetro explícito o la extensión del archivo."""
+    if formato:
+        return formato.lower()
+    extension = os.path.splitext(nombre_archivo or "")[1].lower()
+    return "jsonl" if extension in (".jsonl", ".ndjson") else "csv"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importación masiva de personas y vehículos")
+    parser.add_argument("archivo", help="CSV con encabezado o JSONL")
+    parser.add_argument("--usuario", type=int, required=True, help="nu del usuario (tmusuarios) para la auditoría")
+    parser.add_argument("--formato", choices=FORMATOS_IMPORTACION, help="por defecto, según la extensión")
+    parser.add_argument("--simular", action="store_true", help="valida y revierte, no guarda nada")
+    args = parser.parse_args()
+    with open(args.archivo, encoding="utf-8") as archivo:
+        contenido = archivo.read()
+    reporte = importar(contenido, formato_por_nombre(args.archivo, args.formato), args.usuario,
+                       simular=args.simular, nombre_archivo=os.path.basename(args.archivo))
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
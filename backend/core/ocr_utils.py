@@ -1,14 +1,14 @@
-import pytesseract
-from PIL import Image
 import os
 
+from ocr.motores import obtener_motor
+
 # ===========================================================
-#  OCR CON TESSERACT – SmartCar
+#  OCR DE ARCHIVOS – SmartCar
 # ===========================================================
 
 def leer_placa_imagen(ruta_imagen: str) -> str:
     """
-    Lee una placa desde una imagen usando Tesseract OCR.
+    Lee una placa desde una imagen con el motor OCR configurado.
 
     Parámetro:
         ruta_imagen (str): ruta absoluta del archivo de imagen.
@@ -21,28 +21,8 @@ def leer_placa_imagen(ruta_imagen: str) -> str:
         return ""
 
     try:
-        # Abrir imagen
-        imagen = Image.open(ruta_imagen)
-
-        # Procesar con Tesseract
-        texto = pytesseract.image_to_string(
-            imagen,
-            config="--psm 7 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-        )
-
-        # Limpiar la salida
-        placa = (
-            texto.replace(" ", "")
-                 .replace("\n", "")
-                 .replace("\t", "")
-                 .strip()
-                 .upper()
-        )
-
-        # Mantener solo letras y números
-        placa = "".join(c for c in placa if c.isalnum())
-
-        return placa
+        # Mismo motor (OCR_MOTOR) que usa el detector del servidor
+        return obtener_motor().leer(ruta_imagen)["placa"] or ""
 
     except Exception as e:
         print("❌ Error en OCR:", e)
@@ -0,0 +1,326 @@
+# backend/core/services/auditoria_async.py
+# Escritura de auditoría en segundo plano.
+# registrar_auditoria_global solo encola la fila (con la hora del evento) y
+# vuelve; un hilo la escribe por lotes con un INSERT multi-fila cada
+# AUDITORIA_INTERVALO_MS o al juntar AUDITORIA_LOTE_MAX filas.
+# Si la BD no está disponible (o la cola se llena), las filas van a un archivo
+# local en core/logs y se reintentan en cuanto la BD responde. Al apagar el
+# proceso se vacía la cola.
+# Para reintentar, el archivo se renombra a <archivo>.<pid>.procesando y se
+# borra solo después de escribir (o devolver al archivo) todas sus filas; si
+# el proceso muere a mitad, el siguiente hilo que arranca lo retoma (alguna
+# fila puede quedar dos veces, ninguna se pierde). Una línea que no se puede
+# leer (p. ej. cortada por un apagado a mitad de escritura) va a
+# <archivo>.cuarentena en vez de impedir que se lea el resto.
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from core.db.connection import conexion, PoolAgotadoError
+
+AUDITORIA_ASYNC = os.getenv("AUDITORIA_ASYNC", "1") == "1"
+AUDITORIA_COLA_MAX = int(os.getenv("AUDITORIA_COLA_MAX", "10000"))
+AUDITORIA_LOTE_MAX = int(os.getenv("AUDITORIA_LOTE_MAX", "200"))
+AUDITORIA_INTERVALO_MS = float(os.getenv("AUDITORIA_INTERVALO_MS", "500"))
+AUDITORIA_ARCHIVO_PENDIENTES = os.getenv(
+    "AUDITORIA_ARCHIVO_PENDIENTES",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "auditoria_pendiente.jsonl")
+)
+
+COLUMNAS = ("id_usuario", "entidad", "id_entidad", "accion", "datos_previos", "datos_nuevos", "fecha_hora")
+
+_INSERT = """
+    INSERT INTO auditoria (id_usuario, entidad, id_entidad, accion, datos_previos, datos_nuevos, fecha_hora)
+    VALUES %s
+"""
+# fecha_hora llega con zona (UTC); la columna es TIMESTAMP y Postgres la
+# convierte a la zona de la sesión (DB_ZONA_HORARIA), igual que NOW()
+_PLANTILLA = "(%s, %s, %s, %s, %s, %s, %s::timestamptz)"
+
+# Errores que indican que la BD no está disponible (no que la fila sea mala)
+_ERRORES_CONEXION = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolAgotadoError)
+
+
+class EscritorAuditoria:
+    def __init__(self, cola_max=AUDITORIA_COLA_MAX, lote_max=AUDITORIA_LOTE_MAX,
+                 intervalo_ms=AUDITORIA_INTERVALO_MS, archivo=AUDITORIA_ARCHIVO_PENDIENTES):
+        self.lote_max = max(lote_max, 1)
+        self.intervalo = intervalo_ms / 1000.0
+        self.archivo = archivo
+        self._cola = queue.Queue(maxsize=max(cola_max, 1))
+        self._detener = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._lock_archivo = threading.Lock()
+
+        # Métricas
+        self._encoladas = 0
+        self._escritas = 0
+        self._lotes = 0
+        self._derramadas = 0
+        self._descartadas = 0
+        self._en_cuarentena = 0
+        self._ultimo_error = None
+
+    # -------------------------------------------------------
+    # Lado de la petición
+    # -------------------------------------------------------
+    def encolar(self, fila):
+        self._asegurar_hilo()
+        try:
+            self._cola.put_nowait(fila)
+        except queue.Full:
+            # No se bloquea la petición: la fila va directo al archivo
+            self._derramar([fila])
+            return
+        with self._lock:
+            self._encoladas += 1
+
+    def _asegurar_hilo(self):
+        pid = os.getpid()
+        if self._hilo is not None and self._pid == pid and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or self._pid != pid or not self._hilo.is_alive():
+                self._pid = pid
+                self._detener.clear()
+                self._hilo = threading.Thread(target=self._bucle, name="auditoria-async", daemon=True)
+                self._hilo.start()
+
+    # -------------------------------------------------------
+    # Hilo escritor
+    # -------------------------------------------------------
+    def _bucle(self):
+        self._reintentar_pendientes(huerfanos=True)
+        while not self._detener.is_set():
+            lote = self._tomar_lote(self.intervalo)
+            if lote:
+                if self._escribir(lote):
+                    self._reintentar_pendientes()
+        self.vaciar()
+
+    def _tomar_lote(self, espera):
+        lote = []
+        limite = time.monotonic() + espera
+        while len(lote) < self.lote_max:
+            restante = limite - time.monotonic()
+            try:
+                lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _escribir(self, lote):
+        """Escribe el lote; si la BD no responde lo deja en el archivo. True si llegó a la BD."""
+        try:
+            self._insertar(lote)
+            return True
+        except _ERRORES_CONEXION as e:
+            self._ultimo_error = str(e)
+            print(f"❌ Auditoría sin BD, {len(lote)} registros a archivo: {e}")
+            self._derramar(lote)
+            return False
+        except Exception as e:
+            # Una fila inválida (p. ej. id_usuario inexistente) no debe tumbar el lote
+            self._ultimo_error = str(e)
+            print(f"❌ Error guardando lote de auditoría, se reintenta fila por fila: {e}")
+            for fila in lote:
+                try:
+                    self._insertar([fila])
+                except _ERRORES_CONEXION:
+                    self._derramar([fila])
+                except Exception as e_fila:
+                    print(f"❌ Registro de auditoría descartado ({fila.get('accion')}): {e_fila}")
+                    with self._lock:
+                        self._descartadas += 1
+            return True
+
+    def _insertar(self, lote):
+        with conexion() as conn:
+            with conn.cursor() as cur:
+                execute_values(
+                    cur, _INSERT,
+                    [tuple(fila[c] for c in COLUMNAS) for fila in lote],
+                    template=_PLANTILLA, page_size=self.lote_max
+                )
+        with self._lock:
+            self._escritas += len(lote)
+            self._lotes += 1
+
+    # -------------------------------------------------------
+    # Archivo de pendientes
+    # -------------------------------------------------------
+    def _derramar(self, filas):
+        try:
+            with self._lock_archivo:
+                os.makedirs(os.path.dirname(self.archivo), exist_ok=True)
+                with open(self.archivo, "a", encoding="utf-8") as f:
+                    for fila in filas:
+                        f.write(json.dumps(fila, default=str) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            with self._lock:
+                self._derramadas += len(filas)
+        except Exception as e:
+            print(f"❌ Error escribiendo auditoría pendiente en archivo: {e}")
+            with self._lock:
+                self._descartadas += len(filas)
+
+    def _procesando(self, pid=None):
+        return f"{self.archivo}.{pid or os.getpid()}.procesando"
+
+    def _huerfanos(self):
+        """Archivos .procesando de procesos que ya no existen (o de este mismo pid antes de un reinicio)."""
+        carpeta, base = os.path.split(self.archivo)
+        try:
+            nombres = os.listdir(carpeta or ".")
+        except FileNotFoundError:
+            return []
+        huerfanos = []
+        for nombre in nombres:
+            if not (nombre.startswith(base + ".") and nombre.endswith(".procesando")):
+                continue
+            pid = nombre[len(base) + 1:-len(".procesando")]
+            if not pid.isdigit():
+                continue
+            if int(pid) != os.getpid():
+                try:
+                    os.kill(int(pid), 0)
+                    continue            # otro worker vivo lo está procesando
+                except ProcessLookupError:
+                    pass
+                except PermissionError:
+                    continue
+            huerfanos.append(os.path.join(carpeta, nombre))
+        # El de este pid primero: los demás se renombran a ese mismo nombre
+        propio = self._procesando()
+        return sorted(huerfanos, key=lambda ruta: ruta != propio)
+
+    def _leer_pendientes(self, ruta):
+        """Filas válidas del archivo; las líneas ilegibles van a cuarentena."""
+        filas, malas = [], []
+        with open(ruta, encoding="utf-8", errors="replace") as f:
+            for linea in f:
+                if not linea.strip():
+                    continue
+                try:
+                    fila = json.loads(linea)
+                    if not isinstance(fila, dict) or any(c not in fila for c in COLUMNAS):
+                        raise ValueError("faltan columnas")
+                    filas.append(fila)
+                except ValueError:
+                    malas.append(linea if linea.endswith("\n") else linea + "\n")
+        if malas:
+            print(f"❌ {len(malas)} líneas ilegibles de auditoría pendiente a cuarentena")
+            with self._lock_archivo:
+                with open(f"{self.archivo}.cuarentena", "a", encoding="utf-8") as f:
+                    f.writelines(malas)
+                    f.flush()
+                    os.fsync(f.fileno())
+            with self._lock:
+                self._en_cuarentena += len(malas)
+        return filas
+
+    def _procesar(self, ruta):
+        """
+        Escribe las filas de `ruta` y recién entonces la borra. Si la BD vuelve
+        a fallar, el resto regresa al archivo de pendientes. True si llegó todo.
+        """
+        filas = self._leer_pendientes(ruta)
+        if filas:
+            print(f"🔁 Reintentando {len(filas)} registros de auditoría pendientes")
+        completo = True
+        for i in range(0, len(filas), self.lote_max):
+            if not self._escribir(filas[i:i + self.lote_max]):
+                # Sin BD otra vez: el resto también vuelve al archivo
+                self._derramar(filas[i + self.lote_max:])
+                completo = False
+                break
+        os.remove(ruta)
+        return completo
+
+    def _reintentar_pendientes(self, huerfanos=False):
+        """Pasa a la BD lo que quedó en el archivo; si vuelve a fallar, queda ahí."""
+        propio = self._procesando()
+        if huerfanos:
+            for ruta in self._huerfanos():
+                # Se toma con un rename: si otro worker lo tomó antes, ya no está
+                if ruta != propio:
+                    with self._lock_archivo:
+                        try:
+                            os.replace(ruta, propio)
+                        except FileNotFoundError:
+                            continue
+                if not self._procesar(propio):
+                    return
+        if not os.path.exists(self.archivo):
+            return
+        with self._lock_archivo:
+            try:
+                os.replace(self.archivo, propio)
+            except FileNotFoundError:
+                return
+        self._procesar(propio)
+
+    # -------------------------------------------------------
+    # Apagado y métricas
+    # -------------------------------------------------------
+    def vaciar(self):
+        """Escribe todo lo que quede en la cola (o lo deja en el archivo)."""
+        while True:
+            lote = self._tomar_lote(0)
+            if not lote:
+                return
+            self._escribir(lote)
+
+    def detener(self, timeout=5.0):
+        hilo = self._hilo
+        if hilo is None or self._pid != os.getpid():
+            return
+        self._detener.set()
+        hilo.join(timeout)
+        # Si el hilo no alcanzó a terminar, lo que quede se guarda en archivo
+        if hilo.is_alive():
+            restantes = self._tomar_lote(0)
+            while restantes:
+                self._derramar(restantes)
+                restantes = self._tomar_lote(0)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "activo": AUDITORIA_ASYNC,
+                "en_cola": self._cola.qsize(),
+                "encoladas": self._encoladas,
+                "escritas": self._escritas,
+                "lotes": self._lotes,
+                "a_archivo": self._derramadas,
+                "descartadas": self._descartadas,
+                "en_cuarentena": self._en_cuarentena,
+                "pendientes_en_archivo": os.path.exists(self.archivo),
+                "ultimo_error": self._ultimo_error,
+            }
+
+
+_escritor = EscritorAuditoria()
+
+
+def encolar_auditoria(fila):
+    _escritor.encolar(fila)
+
+
+def estadisticas_auditoria():
+    return _escritor.estadisticas()
+
+
+@atexit.register
+def _vaciar_al_salir():
+    _escritor.detener()
@@ -0,0 +1,265 @@
+# backend/core/services/bus_cambios.py
+# Coherencia de las cachés en memoria entre procesos (LISTEN/NOTIFY).
+# Los triggers de la migración 006 avisan por el canal 'smartcar_cambios' de
+# cada cambio confirmado en vehiculo, persona, evento, acceso y alerta (y de
+# cada importación masiva, con un solo aviso por lote; migración 008; y de
+# las filas que el mantenimiento mueve entre particiones; migración 009). Un
+# hilo por proceso escucha en una conexión propia (fuera del pool) y aplica
+# al patio, al registro de placas, al índice de eventos, a los contadores y
+# al canal SSE solo lo que cambió, igual que lo hace el proceso que escribió
+# después de su commit. Los avisos que vienen del mismo proceso (mismo
+# application_name, ver identidad_proceso) se ignoran: ya están aplicados.
+#
+# Si la conexión se cae, los avisos de mientras tanto se pierden: al
+# reconectar se recarga todo (resincronizar_todo) y los dashboards reciben
+# un evento "reinicio". Las recargas periódicas de cada caché siguen siendo
+# la última red de seguridad.
+
+import json
+import os
+import select
+import threading
+import time
+
+from core.db.connection import conexion_dedicada, identidad_proceso
+from core.services.ocupacion_patio import (
+    cargar_indice_patio,
+    indice_disponible,
+    obtener_indice_patio,
+    resincronizar_vehiculo,
+)
+from core.services.registro_placas import cargar_registro_placas, invalidar_registro, placa_registrada_agregada
+from core.services.eventos_activos import invalidar_eventos
+from core.services.contadores import contador_sumar, reconciliar_contadores
+from core.services.tiempo_real import publicar_evento
+from core.services.coincidencia_placas import invalidar_coincidencias
+from core.importacion_masiva import refrescar_caches
+
+BUS_CAMBIOS_ACTIVO = os.getenv("BUS_CAMBIOS_ACTIVO", "1") == "1"
+CANAL = "smartcar_cambios"
+# Sin avisos en N segundos se prueba la conexión con SELECT 1
+BUS_LATIDO_SEGUNDOS = float(os.getenv("BUS_LATIDO_SEGUNDOS", "30"))
+BUS_REINTENTO_MAX_SEGUNDOS = float(os.getenv("BUS_REINTENTO_MAX_SEGUNDOS", "30"))
+
+
+class BusCambios:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.conectado = False
+        self._conexiones = 0
+
+        # Métricas
+        self._recibidos = 0
+        self._aplicados = 0
+        self._propios = 0
+        self._por_tabla = {}
+        self._errores = 0
+        self._reconexiones = 0
+        self._resincronizaciones = 0
+        self._ultimo_error = None
+        self._ultimo_aviso = None
+
+    # -------------------------------------------------------
+    # Aplicación de un aviso
+    # -------------------------------------------------------
+    def _vehiculo(self, op, nueva, anterior):
+        invalidar_coincidencias()
+        if op == "INSERT":
+            placa_registrada_agregada(nueva["placa"])
+            contador_sumar("vehiculos")
+            return
+        invalidar_registro(placa=anterior["placa"], id_vehiculo=anterior["id_vehiculo"])
+        if op == "UPDATE":
+            placa_registrada_agregada(nueva["placa"])
+        else:
+            contador_sumar("vehiculos", -1)
+        resincronizar_vehiculo(anterior["id_vehiculo"])
+
+    def _persona(self, op, nueva, anterior):
+        invalidar_registro(id_persona=anterior["id_persona"])
+
+    def _evento(self, op, nueva, anterior):
+        invalidar_eventos()
+
+    def _acceso(self, op, nueva, anterior):
+        indice = obtener_indice_patio() if indice_disponible() else None
+        if op == "INSERT":
+            contador_sumar("accesos")
+            if indice is None:
+                return
+            indice.resincronizar(id_vehiculo=nueva["id_vehiculo"])
+            datos = indice.por_id_acceso(nueva["id_acceso"])
+            publicar_evento("acceso", {
+                "movimiento": "entrada", "id_acceso": nueva["id_acceso"],
+                "placa": datos["placa"] if datos else None, "tipo": datos["tipo"] if datos else None,
+                "fecha_hora": nueva["fecha_hora"], "resultado": "Acceso Concedido - Entrada"
+            })
+        elif op == "UPDATE":
+            if anterior["hora_salida"] is not None or nueva["hora_salida"] is None:
+                return
+            datos = indice.por_id_acceso(nueva["id_acceso"]) if indice else None
+            if indice:
+                indice.marcar_salida(nueva["id_acceso"])
+            publicar_evento("acceso", {
+                "movimiento": "salida", "id_acceso": nueva["id_acceso"],
+                "placa": datos["placa"] if datos else None,
+                "fecha_hora": nueva["hora_salida"], "resultado": "Salida Exitosa"
+            })
+        else:
+            contador_sumar("accesos", -1)
+            if indice:
+                indice.marcar_salida(anterior["id_acceso"])
+
+    def _alerta(self, op, nueva, anterior):
+        if op == "INSERT":
+            contador_sumar("alertas")
+            publicar_evento("alerta", {
+                "movimiento": "creada", "id_alerta": nueva["id_alerta"], "tipo": nueva["tipo"],
+                "severidad": nueva["severidad"], "id_acceso": nueva["id_acceso"]
+            })
+        else:
+            contador_sumar("alertas", -1)
+            publicar_evento("alerta", {"movimiento": "resuelta", "id_alerta": anterior["id_alerta"]})
+
+    def _importacion(self, op, nueva, anterior):
+        # Un solo aviso por lote (migración 008) con el resumen
+        refrescar_caches(nueva)
+
+    def _particion(self, op, nueva, anterior):
+        # Filas movidas de <tabla>_p_defecto a su mes (migración 009): los
+        # accesos no cambiaron, pero se recargan por si algún aviso se perdió
+        if nueva.get("tabla") != "acceso":
+            return
+        cargar_indice_patio()
+        reconciliar_contadores()
+
+    def aplicar(self, payload):
+        """Aplica un aviso (texto JSON del trigger). Retorna False si era propio o desconocido."""
+        aviso = json.loads(payload)
+        tabla = aviso.get("tabla")
+        with self._lock:
+            self._recibidos += 1
+            self._ultimo_aviso = time.monotonic()
+            if aviso.get("origen") == identidad_proceso():
+                self._propios += 1
+                return False
+        manejador = getattr(self, f"_{tabla}", None) if tabla in _TABLAS else None
+        if manejador is None:
+            return False
+        manejador(aviso["op"], aviso.get("nueva") or {}, aviso.get("anterior") or {})
+        with self._lock:
+            self._aplicados += 1
+            self._por_tabla[tabla] = self._por_tabla.get(tabla, 0) + 1
+        return True
+
+    # -------------------------------------------------------
+    # Resincronización completa
+    # -------------------------------------------------------
+    def resincronizar_todo(self):
+        """Tras una desconexión: se recargan todas las cachés desde la BD."""
+        cargar_indice_patio()
+        cargar_registro_placas()
+        invalidar_eventos()
+        invalidar_coincidencias()
+        try:
+            reconciliar_contadores()
+        except Exception as e:
+            print(f"❌ Error reconciliando contadores tras reconectar el bus: {e}")
+        publicar_evento("reinicio", {"motivo": "bus_cambios"})
+        with self._lock:
+            self._resincronizaciones += 1
+
+    # -------------------------------------------------------
+    # Escucha
+    # -------------------------------------------------------
+    def _escuchar(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CANAL}")
+        while True:
+            listos, _, _ = select.select([conn], [], [], BUS_LATIDO_SEGUNDOS)
+            if not listos:
+                # Detecta una conexión muerta aunque no lleguen avisos
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+            conn.poll()
+            while conn.notifies:
+                aviso = conn.notifies.pop(0)
+                try:
+                    self.aplicar(aviso.payload)
+                except Exception as e:
+                    # Un aviso que falla no detiene el bus; la recarga periódica lo corrige
+                    with self._lock:
+                        self._errores += 1
+                        self._ultimo_error = str(e)
+                    print(f"❌ Error aplicando aviso del bus de cambios: {e}")
+
+    def bucle(self):
+        espera = 1.0
+        while True:
+            conn = None
+            try:
+                conn = conexion_dedicada()
+                with self._lock:
+                    self._conexiones += 1
+                    reconexion = self._conexiones > 1
+                    if reconexion:
+                        self._reconexiones += 1
+                self.conectado = True
+                espera = 1.0
+                # Lo ocurrido sin conexión no llegó; al arrancar las cachés ya se cargaron
+                if reconexion:
+                    self.resincronizar_todo()
+                self._escuchar(conn)
+            except Exception as e:
+                with self._lock:
+                    self._ultimo_error = str(e)
+                print(f"❌ Bus de cambios desconectado: {e}")
+            finally:
+                self.conectado = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            time.sleep(espera)
+            espera = min(espera * 2, BUS_REINTENTO_MAX_SEGUNDOS)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "activo": BUS_CAMBIOS_ACTIVO,
+                "conectado": self.conectado,
+                "identidad": identidad_proceso(),
+                "recibidos": self._recibidos,
+                "aplicados": self._aplicados,
+                "propios_ignorados": self._propios,
+                "por_tabla": dict(self._por_tabla),
+                "errores": self._errores,
+                "reconexiones": self._reconexiones,
+                "resincronizaciones": self._resincronizaciones,
+                "segundos_desde_ultimo_aviso": (
+                    round(time.monotonic() - self._ultimo_aviso, 1) if self._ultimo_aviso else None
+                ),
+                "ultimo_error": self._ultimo_error,
+            }
+
+
+_TABLAS = {"vehiculo", "persona", "evento", "acceso", "alerta", "importacion", "particion"}
+
+_bus = BusCambios()
+_hilo = None
+_pid = None
+
+
+def iniciar_bus_cambios():
+    """Arranca el hilo que escucha (uno por proceso; tras un fork se crea otro)."""
+    global _hilo, _pid
+    if not BUS_CAMBIOS_ACTIVO or (_hilo is not None and _pid == os.getpid() and _hilo.is_alive()):
+        return
+    _pid = os.getpid()
+    _hilo = threading.Thread(target=_bus.bucle, name="bus_cambios", daemon=True)
+    _hilo.start()
+
+
+def estadisticas_bus_cambios():
+    return _bus.estadisticas()
@@ -0,0 +1,252 @@
+# backend/core/services/coincidencia_placas.py
+# Coincidencia aproximada de placas para lecturas OCR con errores.
+# Tesseract confunde 0/O, 8/B, 1/I (y 5/S, 2/Z): la placa leída no existe y
+# el vehículo registrado se niega o, con un evento activo, entra como un
+# invitado nuevo. Este índice busca las placas registradas más cercanas:
+#   - distancia de edición ponderada: cambiar un carácter por su "gemelo" OCR
+#     cuesta 0.5; cualquier otro cambio, inserción o borrado cuesta 1.
+#   - índice precalculado de vecindad: cada placa se guarda bajo su forma
+#     canónica (confusiones OCR igualadas) y bajo las variantes con un
+#     carácter borrado. Una lectura consulta las mismas claves (unas 7
+#     búsquedas en un dict) y solo mide la distancia exacta a esos candidatos.
+#     Un árbol BK sobre la misma métrica no sirve aquí: con placas de 6
+#     caracteres casi todas quedan a distancia 4-6 entre sí, el árbol no poda
+#     y cada búsqueda recorre buena parte de las placas.
+# Se indexan las placas normalizadas de vehiculo, sin los invitados (una
+# lectura mala ya registrada como invitado no debe atraer a otras).
+#
+# Solo se acepta sin intervención una placa que difiere de la leída únicamente
+# en confusiones OCR (misma forma canónica, distancia = 0.5 por carácter).
+# Cualquier otra cercana (una letra distinta, un carácter de más o de menos)
+# puede ser otro vehículo: se devuelve como sugerencia para que el vigilante
+# la confirme y no registra entradas ni salidas.
+#
+# El CRUD de vehículos y el bus de cambios lo invalidan y se reconstruye en
+# segundo plano mientras el anterior sigue respondiendo. Quien usa un
+# candidato lo confirma contra el registro de placas.
+
+import os
+import threading
+import time
+
+from core.db.connection import conexion
+from core.services.registro_placas import normalizar_placa
+
+COINCIDENCIA_DIFUSA_ACTIVA = os.getenv("COINCIDENCIA_DIFUSA_ACTIVA", "1") == "1"
+# Radio de búsqueda de sugerencias (1.0 = un error cualquiera o dos
+# confusiones OCR). No amplía lo que se acepta solo: eso exige misma forma canónica
+COINCIDENCIA_DISTANCIA_MAX = float(os.getenv("COINCIDENCIA_DISTANCIA_MAX", "1.0"))
+# Reconstrucción periódica (0 = solo al invalidar)
+COINCIDENCIA_RECARGA_SEGUNDOS = float(os.getenv("COINCIDENCIA_RECARGA_SEGUNDOS", "300"))
+
+COSTO_CONFUSION = 0.5
+_PARES_CONFUSION = [("0", "O"), ("8", "B"), ("1", "I"), ("5", "S"), ("2", "Z")]
+_CONFUSIONES = {par for a, b in _PARES_CONFUSION for par in ((a, b), (b, a))}
+_CANONICO = str.maketrans({letra: numero for numero, letra in _PARES_CONFUSION})
+
+
+def distancia_placas(a, b):
+    """Levenshtein con costo COSTO_CONFUSION para las sustituciones OCR típicas."""
+    if a == b:
+        return 0.0
+    anterior = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        actual = [float(i)]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                sustitucion = anterior[j - 1]
+            elif (ca, cb) in _CONFUSIONES:
+                sustitucion = anterior[j - 1] + COSTO_CONFUSION
+            else:
+                sustitucion = anterior[j - 1] + 1
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, sustitucion))
+        anterior = actual
+    return anterior[-1]
+
+
+def forma_canonica(placa):
+    """Cada carácter confundible se reemplaza por su gemelo numérico ('OB1' -> '081')."""
+    return placa.translate(_CANONICO)
+
+
+def _borrados(texto, n):
+    """El texto y todas sus variantes con hasta n caracteres borrados."""
+    variantes = {texto}
+    frontera = {texto}
+    for _ in range(n):
+        frontera = {v[:i] + v[i + 1:] for v in frontera for i in range(len(v))}
+        variantes |= frontera
+    return variantes
+
+
+class IndiceVecindad:
+    """
+    clave -> placas, donde las claves de una placa son su forma canónica y
+    las variantes con hasta `borrados` caracteres menos. Dos placas a
+    distancia <= borrados (sin contar las confusiones OCR, que la forma
+    canónica ya iguala) comparten al menos una clave; los candidatos se
+    confirman con distancia_placas.
+    """
+
+    def __init__(self, placas=(), borrados=1):
+        self.borrados = borrados
+        self._por_clave = {}
+        self.tamano = 0
+        for placa in placas:
+            self.agregar(placa)
+
+    def agregar(self, placa):
+        for clave in _borrados(forma_canonica(placa), self.borrados):
+            self._por_clave.setdefault(clave, set()).add(placa)
+        self.tamano += 1
+
+    def buscar(self, placa, radio):
+        """[(distancia, placa)] a distancia <= radio, de la más cercana a la más lejana."""
+        candidatos = set()
+        for clave in _borrados(forma_canonica(placa), self.borrados):
+            candidatos |= self._por_clave.get(clave, set())
+        encontradas = ((distancia_placas(placa, c), c) for c in candidatos)
+        return sorted((d, c) for d, c in encontradas if d <= radio)
+
+
+class IndiceCoincidencias:
+    def __init__(self):
+        self._vecindad = None
+        self._lock = threading.Lock()
+        self._vigente = False
+        self._reconstruyendo = False
+        self._cargado_en = 0.0
+
+        # Métricas
+        self._busquedas = 0
+        self._con_coincidencia = 0
+        self._ambiguas = 0
+        self._automaticas = 0
+        self._tiempo_total = 0.0
+        self._reconstrucciones = 0
+        self._ultimo_error = None
+
+    # -------------------------------------------------------
+    # Construcción
+    # -------------------------------------------------------
+    def cargar(self):
+        with conexion() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT placa_norm FROM vehiculo WHERE tipo <> 'Invitado'")
+                placas = [fila[0] for fila in cur.fetchall()]
+        vecindad = IndiceVecindad(placas, borrados=int(COINCIDENCIA_DISTANCIA_MAX))
+        with self._lock:
+            self._vecindad = vecindad
+            self._vigente = True
+            self._cargado_en = time.monotonic()
+            self._reconstrucciones += 1
+        return vecindad.tamano
+
+    def invalidar(self):
+        with self._lock:
+            self._vigente = False
+
+    def _reconstruir_en_segundo_plano(self):
+        try:
+            self.cargar()
+        except Exception as e:
+            self._ultimo_error = str(e)
+            print(f"❌ Error reconstruyendo índice de coincidencias: {e}")
+        finally:
+            with self._lock:
+                self._reconstruyendo = False
+                self._cargado_en = time.monotonic()
+
+    def _asegurar_vigente(self):
+        if self._vecindad is None:
+            self.cargar()
+            return
+        with self._lock:
+            vencido = COINCIDENCIA_RECARGA_SEGUNDOS and time.monotonic() - self._cargado_en >= COINCIDENCIA_RECARGA_SEGUNDOS
+            if (self._vigente and not vencido) or self._reconstruyendo:
+                return
+            self._reconstruyendo = True
+        threading.Thread(target=self._reconstruir_en_segundo_plano, name="coincidencias", daemon=True).start()
+
+    # -------------------------------------------------------
+    # Consulta
+    # -------------------------------------------------------
+    def buscar(self, placa, radio=COINCIDENCIA_DISTANCIA_MAX):
+        """
+        Placas registradas cercanas a `placa` (sin la placa exacta):
+        {"placa", "distancia", "ambigua", "automatica", "candidatos"} o None si no hay ninguna.
+        ambigua = más de una placa a la distancia mínima.
+        automatica = la más cercana es la única que difiere solo en confusiones
+        OCR (candidato "confusion"); las demás son sugerencias a confirmar.
+        """
+        self._asegurar_vigente()
+        placa = normalizar_placa(placa)
+        inicio = time.perf_counter()
+        candidatos = [(d, p) for d, p in self._vecindad.buscar(placa, radio) if d > 0]
+        transcurrido = time.perf_counter() - inicio
+
+        with self._lock:
+            self._busquedas += 1
+            self._tiempo_total += transcurrido
+            if not candidatos:
+                return None
+            ambigua = len(candidatos) > 1 and candidatos[1][0] == candidatos[0][0]
+            self._con_coincidencia += 1
+            self._ambiguas += int(ambigua)
+        canonica = forma_canonica(placa)
+        lista = [{"placa": p, "distancia": d, "confusion": forma_canonica(p) == canonica} for d, p in candidatos]
+        automatica = lista[0]["confusion"] and not ambigua and sum(c["confusion"] for c in lista) == 1
+        with self._lock:
+            self._automaticas += int(automatica)
+        return {
+            "placa": candidatos[0][1],
+            "distancia": candidatos[0][0],
+            "ambigua": ambigua,
+            "automatica": automatica,
+            "candidatos": lista,
+        }
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "activo": COINCIDENCIA_DIFUSA_ACTIVA,
+                "placas_indexadas": self._vecindad.tamano if self._vecindad else 0,
+                "distancia_max": COINCIDENCIA_DISTANCIA_MAX,
+                "busquedas": self._busquedas,
+                "con_coincidencia": self._con_coincidencia,
+                "ambiguas": self._ambiguas,
+                "automaticas": self._automaticas,
+                "tiempo_medio_ms": round(self._tiempo_total / self._busquedas * 1000, 3) if self._busquedas else 0.0,
+                "reconstrucciones": self._reconstrucciones,
+                "ultimo_error": self._ultimo_error,
+            }
+
+
+_indice = IndiceCoincidencias()
+
+
+def cargar_coincidencias_placas():
+    """Carga inicial (al arrancar el servidor). Si falla, se intenta en la primera búsqueda."""
+    if not COINCIDENCIA_DIFUSA_ACTIVA:
+        return
+    try:
+        total = _indice.cargar()
+        print(f"🔎 Índice de coincidencias de placas: {total} placas")
+    except Exception as e:
+        print(f"❌ Error cargando índice de coincidencias: {e}")
+
+
+def buscar_placa_similar(placa):
+    """Ver IndiceCoincidencias.buscar; None si la función está desactivada."""
+    if not COINCIDENCIA_DIFUSA_ACTIVA:
+        return None
+    return _indice.buscar(placa)
+
+
+def invalidar_coincidencias():
+    """Tras crear, editar o borrar un vehículo; se reconstruye en segundo plano."""
+    _indice.invalidar()
+
+
+def estadisticas_coincidencias():
+    return _indice.estadisticas()
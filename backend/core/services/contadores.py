@@ -0,0 +1,184 @@
+# backend/core/services/contadores.py
+# Totales del dashboard (vehículos, accesos, alertas) en memoria.
+# Se cuentan una vez en la BD y después los mantienen los caminos que crean o
+# borran filas: CRUD de vehículos, registro de invitados, registrar_entrada_db,
+# _insertar_alerta y eliminar_alerta_controller. Dentro de una unidad de
+# trabajo el ajuste se aplica solo si la transacción se confirma.
+#
+# Lo que hace el otro worker de gunicorn llega como delta por el bus de
+# cambios (core/services/bus_cambios.py). Lo que no pasa por ahí (el archivo
+# de particiones, SQL a mano con el bus caído) se corrige con una
+# reconciliación cada CONTADORES_RECONCILIAR_SEGUNDOS, que corre en un hilo
+# aparte: la consulta del dashboard nunca espera los COUNT(*).
+# Cada cambio se publica como evento "contadores" (core/services/tiempo_real.py).
+
+import os
+import threading
+import time
+
+from core.db.connection import conexion
+from core.db.sesion import al_confirmar
+from core.services.tiempo_real import publicar_evento
+
+CONTADORES_ACTIVOS = os.getenv("CONTADORES_ACTIVOS", "1") == "1"
+# 0 = no reconciliar (solo la carga inicial)
+CONTADORES_RECONCILIAR_SEGUNDOS = float(os.getenv("CONTADORES_RECONCILIAR_SEGUNDOS", "300"))
+
+_CONSULTAS = {
+    "vehiculos": "SELECT COUNT(*) FROM vehiculo",
+    "accesos": "SELECT COUNT(*) FROM acceso",
+    "alertas": "SELECT COUNT(*) FROM alerta",
+}
+
+
+class Contadores:
+    def __init__(self):
+        self._valores = None
+        self._lock = threading.Lock()
+        self._cargado_en = 0.0
+        self._reconciliando = False
+        # Ajustes aplicados mientras corre una reconciliación: el conteo de la
+        # BD puede no incluirlos todavía
+        self._ajustes_en_curso = None
+
+        # Métricas
+        self._lecturas = 0
+        self._ajustes = 0
+        self._reconciliaciones = 0
+        self._ultima_diferencia = {}
+        self._ultimo_error = None
+
+    # -------------------------------------------------------
+    # Carga y reconciliación
+    # -------------------------------------------------------
+    @staticmethod
+    def contar_bd():
+        with conexion() as conn:
+            with conn.cursor() as cur:
+                valores = {}
+                for nombre, consulta in _CONSULTAS.items():
+                    cur.execute(consulta)
+                    valores[nombre] = cur.fetchone()[0]
+        return valores
+
+    def reconciliar(self):
+        with self._lock:
+            self._ajustes_en_curso = {}
+        try:
+            valores = self.contar_bd()
+        except Exception:
+            with self._lock:
+                self._ajustes_en_curso = None
+            raise
+        with self._lock:
+            # Lo ajustado durante el conteo se vuelve a aplicar: si el COUNT ya
+            # lo incluía, la diferencia dura hasta la próxima reconciliación
+            for nombre, delta in self._ajustes_en_curso.items():
+                valores[nombre] += delta
+            if self._valores is not None:
+                self._ultima_diferencia = {n: valores[n] - self._valores.get(n, 0) for n in valores}
+            cambio = self._valores != valores
+            self._valores = valores
+            self._ajustes_en_curso = None
+            self._cargado_en = time.monotonic()
+            self._reconciliaciones += 1
+        if cambio:
+            publicar_evento("contadores", {"valores": dict(valores)})
+        return dict(valores)
+
+    def _reconciliar_en_segundo_plano(self):
+        try:
+            self.reconciliar()
+        except Exception as e:
+            self._ultimo_error = str(e)
+            print(f"❌ Error reconciliando contadores: {e}")
+        finally:
+            with self._lock:
+                self._reconciliando = False
+                self._cargado_en = time.monotonic()
+
+    def _revisar_vencimiento(self):
+        if not CONTADORES_RECONCILIAR_SEGUNDOS:
+            return
+        with self._lock:
+            vencido = time.monotonic() - self._cargado_en >= CONTADORES_RECONCILIAR_SEGUNDOS
+            if not vencido or self._reconciliando:
+                return
+            self._reconciliando = True
+        threading.Thread(target=self._reconciliar_en_segundo_plano, name="contadores", daemon=True).start()
+
+    # -------------------------------------------------------
+    # Lectura y ajustes
+    # -------------------------------------------------------
+    def obtener(self):
+        """Totales actuales; solo la primera llamada (sin carga previa) cuenta en la BD."""
+        if self._valores is None:
+            self.reconciliar()
+        else:
+            self._revisar_vencimiento()
+        with self._lock:
+            self._lecturas += 1
+            return dict(self._valores)
+
+    def _ajustar(self, nombre, delta):
+        with self._lock:
+            if self._valores is None:
+                return
+            self._valores[nombre] = max(self._valores[nombre] + delta, 0)
+            if self._ajustes_en_curso is not None:
+                self._ajustes_en_curso[nombre] = self._ajustes_en_curso.get(nombre, 0) + delta
+            self._ajustes += 1
+            valores = dict(self._valores)
+        publicar_evento("contadores", {"delta": {nombre: delta}, "valores": valores})
+
+    def ajustar(self, nombre, delta):
+        """Suma `delta` al contador tras el commit (o ya, fuera de una unidad de trabajo)."""
+        al_confirmar(lambda: self._ajustar(nombre, delta))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "activo": CONTADORES_ACTIVOS,
+                "valores": dict(self._valores) if self._valores is not None else None,
+                "lecturas": self._lecturas,
+                "ajustes": self._ajustes,
+                "reconciliaciones": self._reconciliaciones,
+                "ultima_diferencia": dict(self._ultima_diferencia),
+                "ultimo_error": self._ultimo_error,
+            }
+
+
+_contadores = Contadores()
+
+
+def cargar_contadores():
+    """Carga inicial (al arrancar el servidor). Si falla, se intenta en la primera lectura."""
+    if not CONTADORES_ACTIVOS:
+        return
+    try:
+        valores = _contadores.reconciliar()
+        print(f"🔢 Contadores cargados: {valores}")
+    except Exception as e:
+        print(f"❌ Error cargando contadores: {e}")
+
+
+def obtener_contadores():
+    """{'vehiculos', 'accesos', 'alertas'}; con CONTADORES_ACTIVOS=0 cuenta en la BD cada vez."""
+    if not CONTADORES_ACTIVOS:
+        return Contadores.contar_bd()
+    return _contadores.obtener()
+
+
+def contador_sumar(nombre, delta=1):
+    if CONTADORES_ACTIVOS:
+        _contadores.ajustar(nombre, delta)
+
+
+def reconciliar_contadores():
+    """Vuelve a contar en la BD (p. ej. tras perder avisos del bus de cambios)."""
+    if CONTADORES_ACTIVOS:
+        _contadores.reconciliar()
+
+
+def estadisticas_contadores():
+    return _contadores.estadisticas()
@@ -0,0 +1,154 @@
+# backend/core/services/eventos_activos.py
+# Índice en memoria de los eventos vigentes y próximos (fecha_fin >= ahora).
+# Responde "¿hay evento activo en t?" en O(log n) sin ir a la BD:
+#   - los intervalos se ordenan por fecha_inicio
+#   - fin_max[i] = mayor fecha_fin entre los eventos 0..i
+# Con bisect se encuentra el último evento que ya empezó en t; hay alguno
+# activo si fin_max en esa posición alcanza t. Listar cuáles recorre hacia
+# atrás solo mientras fin_max >= t.
+# Lo invalidan los controladores de crear/actualizar/eliminar evento.
+
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+from psycopg2.extras import RealDictCursor
+
+from core.db.connection import conexion
+
+EVENTOS_INDICE_ACTIVO = os.getenv("EVENTOS_INDICE_ACTIVO", "1") == "1"
+# Reconstrucción periódica: descarta eventos ya terminados y recoge los
+# cambios hechos desde otros procesos del servidor (0 = nunca)
+EVENTOS_RECARGA_SEGUNDOS = float(os.getenv("EVENTOS_RECARGA_SEGUNDOS", "60"))
+
+
+class IndiceEventos:
+    def __init__(self):
+        self._eventos = []        # dicts ordenados por fecha_inicio
+        self._inicios = []
+        self._fin_max = []
+        self._desfase = None      # hora local de la BD - hora local de Python
+        self._lock = threading.Lock()
+        self._vigente = False
+        self._reconstruyendo = False
+        self._generacion = 0      # sube con cada invalidación
+        self._cargado_en = 0.0
+
+        # Métricas
+        self._consultas = 0
+        self._recargas = 0
+        self._invalidaciones = 0
+
+    def cargar(self):
+        generacion = self._generacion
+        with conexion() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                # Las fechas son TIMESTAMP sin zona en la hora de la sesión (DB_ZONA_HORARIA)
+                cur.execute("SELECT LOCALTIMESTAMP AS ahora")
+                ahora_bd = cur.fetchone()["ahora"]
+                cur.execute("""
+                    SELECT id_evento, titulo, categoria, ubicacion, verificado, fecha_inicio, fecha_fin
+                    FROM evento
+                    WHERE fecha_fin >= LOCALTIMESTAMP
+                    ORDER BY fecha_inicio
+                """)
+                eventos = [dict(fila) for fila in cur.fetchall()]
+
+        fin_max = []
+        for evento in eventos:
+            fin_max.append(max(evento["fecha_fin"], fin_max[-1]) if fin_max else evento["fecha_fin"])
+
+        with self._lock:
+            self._eventos = eventos
+            self._inicios = [e["fecha_inicio"] for e in eventos]
+            self._fin_max = fin_max
+            self._desfase = ahora_bd - datetime.now()
+            # Si se invalidó mientras se leía, esta carga ya nació vieja
+            self._vigente = generacion == self._generacion
+            self._cargado_en = time.monotonic()
+            self._recargas += 1
+        return len(eventos)
+
+    def invalidar(self):
+        with self._lock:
+            self._vigente = False
+            self._generacion += 1
+            self._invalidaciones += 1
+
+    def _reconstruir_en_segundo_plano(self):
+        try:
+            self.cargar()
+        except Exception as e:
+            print(f"❌ Error reconstruyendo índice de eventos: {e}")
+        finally:
+            with self._lock:
+                self._reconstruyendo = False
+                self._cargado_en = time.monotonic()
+
+    def _asegurar_vigente(self):
+        """La primera carga es síncrona; después se sigue sirviendo el índice anterior."""
+        if self._desfase is None:
+            self.cargar()
+            return
+        with self._lock:
+            vencido = EVENTOS_RECARGA_SEGUNDOS and time.monotonic() - self._cargado_en >= EVENTOS_RECARGA_SEGUNDOS
+            if (self._vigente and not vencido) or self._reconstruyendo:
+                return
+            self._reconstruyendo = True
+        threading.Thread(target=self._reconstruir_en_segundo_plano, name="eventos", daemon=True).start()
+
+    def ahora(self):
+        """Hora actual en el reloj (y zona) de la BD, como NOW() en las consultas."""
+        return datetime.now() + self._desfase
+
+    def eventos_en(self, instante=None):
+        """Eventos activos en `instante` (por defecto, ahora), más reciente primero."""
+        self._asegurar_vigente()
+        with self._lock:
+            self._consultas += 1
+            instante = instante or self.ahora()
+            activos = []
+            i = bisect_right(self._inicios, instante) - 1
+            while i >= 0 and self._fin_max[i] >= instante:
+                if self._eventos[i]["fecha_fin"] >= instante:
+                    activos.append(dict(self._eventos[i]))
+                i -= 1
+            return activos
+
+    def hay_evento_en(self, instante=None):
+        self._asegurar_vigente()
+        with self._lock:
+            self._consultas += 1
+            instante = instante or self.ahora()
+            i = bisect_right(self._inicios, instante) - 1
+            return i >= 0 and self._fin_max[i] >= instante
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "activo": EVENTOS_INDICE_ACTIVO,
+                "vigente": self._vigente,
+                "reconstruyendo": self._reconstruyendo,
+                "eventos_indexados": len(self._eventos),
+                "consultas": self._consultas,
+                "recargas": self._recargas,
+                "invalidaciones": self._invalidaciones,
+            }
+
+
+_indice = IndiceEventos()
+
+
+def obtener_indice_eventos():
+    return _indice
+
+
+def invalidar_eventos():
+    """Llamar tras crear, editar o borrar un evento; se reconstruye en segundo plano en la próxima consulta."""
+    _indice.invalidar()
+
+
+def estadisticas_eventos():
+    return _indice.estadisticas()
@@ -0,0 +1,215 @@
+# backend/core/services/ocupacion_patio.py
+# Índice en memoria de los vehículos que están en el patio:
+#   placa normalizada -> acceso abierto (hora_salida IS NULL) con los datos del listado.
+# Se carga de la BD al arrancar y lo mantienen al día registrar_entrada_db /
+# registrar_salida_db después del commit. Así la validación de entrada/salida
+# y el listado del patio no consultan la BD.
+#
+# Con varios procesos (gunicorn --workers N) cada uno tiene su copia: los
+# movimientos hechos por otro proceso llegan por el bus de cambios
+# (core/services/bus_cambios.py) o, sin él, con la próxima recarga.
+# Por eso las escrituras en models/acceso.py van protegidas (solo cierran un
+# acceso que siga abierto y solo abren uno si no hay otro) y, si chocan con
+# un índice desactualizado, la placa se relee de la BD y se decide de nuevo.
+
+import os
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+from core.db.connection import conexion
+from core.services.registro_placas import normalizar_placa
+
+OCUPACION_PATIO_ACTIVA = os.getenv("OCUPACION_PATIO_ACTIVA", "1") == "1"
+# Recarga completa periódica (0 = nunca); acota lo que puede durar un desfase
+OCUPACION_RECARGA_SEGUNDOS = float(os.getenv("OCUPACION_RECARGA_SEGUNDOS", "300"))
+
+_CONSULTA_ABIERTOS = """
+    SELECT DISTINCT ON (v.placa)
+        v.placa,
+        v.tipo,
+        v.color,
+        p.nombre as propietario,
+        a.fecha_hora as hora_entrada,
+        a.id_acceso,
+        a.id_vehiculo,
+        pc.tipo as ultima_accion
+    FROM acceso a
+    JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+    JOIN persona p ON v.id_persona = p.id_persona
+    JOIN punto_de_control pc ON a.id_punto = pc.id_punto
+    WHERE a.hora_salida IS NULL {filtro}
+    ORDER BY v.placa, a.fecha_hora DESC
+"""
+
+
+class IndicePatio:
+    def __init__(self):
+        self._por_placa = {}
+        self._lock = threading.Lock()
+        self.cargado = False
+        self._cargado_en = 0.0
+        self._reconstruyendo = False
+        # Movimientos que llegan mientras se reconstruye; se reaplican al reemplazar
+        self._pendientes = None
+
+        # Métricas
+        self._consultas = 0
+        self._recargas = 0
+        self._resincronizaciones = 0
+
+    # -------------------------------------------------------
+    # Carga desde la BD
+    # -------------------------------------------------------
+    def cargar(self):
+        """Reemplaza el índice completo con los accesos abiertos de la BD."""
+        with conexion() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(_CONSULTA_ABIERTOS.format(filtro=""))
+                filas = cur.fetchall()
+        with self._lock:
+            self._por_placa = {normalizar_placa(fila["placa"]): dict(fila) for fila in filas}
+            for movimiento, dato in self._pendientes or ():
+                self._aplicar(movimiento, dato)
+            if self._pendientes is not None:
+                self._pendientes = []
+            self.cargado = True
+            self._cargado_en = time.monotonic()
+            self._recargas += 1
+        return len(filas)
+
+    def _reconstruir_en_segundo_plano(self):
+        try:
+            self.cargar()
+        except Exception as e:
+            # Se sigue sirviendo el índice anterior; las escrituras siguen protegidas
+            print(f"❌ Error recargando índice del patio: {e}")
+        finally:
+            with self._lock:
+                self._reconstruyendo = False
+                self._pendientes = None
+                self._cargado_en = time.monotonic()
+
+    def _recargar_si_vencido(self):
+        """Mientras se recarga en segundo plano se sigue sirviendo el índice anterior."""
+        with self._lock:
+            vencido = OCUPACION_RECARGA_SEGUNDOS and time.monotonic() - self._cargado_en >= OCUPACION_RECARGA_SEGUNDOS
+            if not vencido or self._reconstruyendo:
+                return
+            self._reconstruyendo = True
+            self._pendientes = []
+        threading.Thread(target=self._reconstruir_en_segundo_plano, name="patio", daemon=True).start()
+
+    def resincronizar(self, placa=None, id_vehiculo=None):
+        """Relee de la BD los accesos abiertos de una placa o de un vehículo."""
+        if placa is not None:
+            placa = normalizar_placa(placa)
+            filtro, parametro = "AND v.placa_norm = %s", placa
+        else:
+            filtro, parametro = "AND v.id_vehiculo = %s", id_vehiculo
+        with conexion() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(_CONSULTA_ABIERTOS.format(filtro=filtro), (parametro,))
+                filas = cur.fetchall()
+        with self._lock:
+            for clave in [p for p, d in self._por_placa.items()
+                          if p == placa or (id_vehiculo is not None and d["id_vehiculo"] == id_vehiculo)]:
+                del self._por_placa[clave]
+            for fila in filas:
+                self._por_placa[normalizar_placa(fila["placa"])] = dict(fila)
+            self._resincronizaciones += 1
+
+    # -------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------
+    def id_acceso_abierto(self, placa):
+        self._recargar_si_vencido()
+        with self._lock:
+            self._consultas += 1
+            datos = self._por_placa.get(normalizar_placa(placa))
+            return datos["id_acceso"] if datos else None
+
+    def por_id_acceso(self, id_acceso):
+        with self._lock:
+            for datos in self._por_placa.values():
+                if datos["id_acceso"] == id_acceso:
+                    return dict(datos)
+        return None
+
+    def listar(self):
+        self._recargar_si_vencido()
+        with self._lock:
+            return [dict(self._por_placa[placa]) for placa in sorted(self._por_placa)]
+
+    # -------------------------------------------------------
+    # Movimientos (llamados después del commit)
+    # -------------------------------------------------------
+    def _aplicar(self, movimiento, dato):
+        if movimiento == "entrada":
+            self._por_placa[normalizar_placa(dato["placa"])] = dict(dato)
+        else:
+            for placa in [p for p, d in self._por_placa.items() if d["id_acceso"] == dato]:
+                del self._por_placa[placa]
+
+    def _registrar(self, movimiento, dato):
+        with self._lock:
+            self._aplicar(movimiento, dato)
+            # La recarga pudo leer la BD antes de este commit
+            if self._pendientes is not None:
+                self._pendientes.append((movimiento, dato))
+
+    def marcar_entrada(self, datos):
+        self._registrar("entrada", datos)
+
+    def marcar_salida(self, id_acceso):
+        self._registrar("salida", id_acceso)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "activo": OCUPACION_PATIO_ACTIVA,
+                "cargado": self.cargado,
+                "vehiculos_en_patio": len(self._por_placa),
+                "consultas": self._consultas,
+                "recargas": self._recargas,
+                "reconstruyendo": self._reconstruyendo,
+                "resincronizaciones": self._resincronizaciones,
+                "segundos_desde_carga": round(time.monotonic() - self._cargado_en, 1) if self.cargado else None,
+            }
+
+
+_indice = IndicePatio()
+
+
+def obtener_indice_patio():
+    return _indice
+
+
+def indice_disponible():
+    return OCUPACION_PATIO_ACTIVA and _indice.cargado
+
+
+def cargar_indice_patio():
+    """Carga inicial (al arrancar el servidor). Si falla, se consulta la BD como antes."""
+    if not OCUPACION_PATIO_ACTIVA:
+        return
+    try:
+        total = _indice.cargar()
+        print(f"🅿️ Índice del patio cargado: {total} vehículos dentro")
+    except Exception as e:
+        print(f"❌ Error cargando índice del patio: {e}")
+
+
+def resincronizar_vehiculo(id_vehiculo):
+    """Tras editar o borrar un vehículo (cambia placa, tipo, color o dueño)."""
+    if not indice_disponible():
+        return
+    try:
+        _indice.resincronizar(id_vehiculo=id_vehiculo)
+    except Exception as e:
+        print(f"❌ Error resincronizando índice del patio: {e}")
+
+
+def estadisticas_patio():
+    return _indice.estadisticas()
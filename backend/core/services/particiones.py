@@ -0,0 +1,269 @@
+# backend/core/services/particiones.py
+# Mantenimiento de las particiones mensuales de acceso y auditoria
+# (migración 005):
+#   - crea la partición del mes actual y de los PARTICIONES_MESES_ADELANTE
+#     siguientes, para que ningún insert caiga en la partición por defecto
+#   - desengancha los meses más viejos que la retención de cada tabla, los
+#     copia a un .csv.gz en PARTICIONES_DIR_ARCHIVO y borra la tabla.
+#
+# Corre al arrancar el servidor y luego cada PARTICIONES_INTERVALO_HORAS en un
+# hilo; un advisory lock de Postgres evita que dos workers lo hagan a la vez.
+# También se puede correr a mano:
+#     python -m core.services.particiones [--simular]
+
+import argparse
+import csv
+import gzip
+import os
+import re
+import threading
+import time
+from datetime import date
+
+from psycopg2 import sql
+
+from core.db.connection import conexion
+
+PARTICIONES_ACTIVAS = os.getenv("PARTICIONES_ACTIVAS", "1") == "1"
+PARTICIONES_MESES_ADELANTE = int(os.getenv("PARTICIONES_MESES_ADELANTE", "3"))
+PARTICIONES_INTERVALO_HORAS = float(os.getenv("PARTICIONES_INTERVALO_HORAS", "24"))
+PARTICIONES_DIR_ARCHIVO = os.getenv(
+    "PARTICIONES_DIR_ARCHIVO",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "archivo_particiones")
+)
+
+# Meses completos que se conservan en línea (0 = no archivar nunca)
+RETENCION_MESES = {
+    "acceso": int(os.getenv("RETENCION_ACCESO_MESES", "24")),
+    "auditoria": int(os.getenv("RETENCION_AUDITORIA_MESES", "36")),
+}
+
+# Clave del advisory lock (cualquier entero fijo del proyecto)
+_LOCK_MANTENIMIENTO = 7301190
+
+_estado = {
+    "ultima_ejecucion": None,
+    "creadas": [],
+    "archivadas": [],
+    "omitidas": [],
+    "ultimo_error": None,
+}
+_hilo = None
+_pid = None
+
+
+def _sumar_meses(mes, meses):
+    indice = mes.year * 12 + mes.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def _mes_de_particion(tabla, nombre):
+    """'acceso_p2025_03' -> date(2025, 3, 1); None para la partición por defecto."""
+    coincide = re.fullmatch(rf"{tabla}_p(\d{{4}})_(\d{{2}})", nombre)
+    if not coincide:
+        return None
+    return date(int(coincide.group(1)), int(coincide.group(2)), 1)
+
+
+def tabla_particionada(cur, tabla):
+    cur.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)
+        )
+    """, (tabla,))
+    return cur.fetchone()[0]
+
+
+def listar_particiones(cur, tabla):
+    """[(nombre, mes)] de las particiones mensuales enganchadas, de la más vieja a la más nueva."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+    """, (tabla,))
+    particiones = [(nombre, _mes_de_particion(tabla, nombre)) for (nombre,) in cur.fetchall()]
+    return sorted((p for p in particiones if p[1]), key=lambda p: p[1])
+
+
+def _sueltas(cur, tabla):
+    """Meses ya desenganchados pero no archivados (p. ej. si falló la copia)."""
+    cur.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        WHERE c.relkind = 'r' AND c.relname LIKE %s AND NOT c.relispartition
+    """, (f"{tabla}_p%",))
+    return [nombre for (nombre,) in cur.fetchall() if _mes_de_particion(tabla, nombre)]
+
+
+# ===========================================================
+# Creación
+# ===========================================================
+def crear_particiones_futuras(cur, tabla, hoy=None):
+    mes_actual = (hoy or date.today()).replace(day=1)
+    creadas = []
+    for i in range(PARTICIONES_MESES_ADELANTE + 1):
+        cur.execute("SELECT crear_particion_mensual(%s, %s)", (tabla, _sumar_meses(mes_actual, i)))
+        nombre = cur.fetchone()[0]
+        if nombre:
+            creadas.append(nombre)
+    return creadas
+
+
+# ===========================================================
+# Archivo
+# ===========================================================
+def particiones_vencidas(cur, tabla, hoy=None):
+    retencion = RETENCION_MESES.get(tabla, 0)
+    if not retencion:
+        return []
+    limite = _sumar_meses((hoy or date.today()).replace(day=1), -retencion)
+    return [nombre for nombre, mes in listar_particiones(cur, tabla) if mes < limite]
+
+
+def _tiene_accesos_abiertos(cur, nombre):
+    cur.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE hora_salida IS NULL)")
+                .format(sql.Identifier(nombre)))
+    return cur.fetchone()[0]
+
+
+def archivar_particion(tabla, nombre, destino=PARTICIONES_DIR_ARCHIVO):
+    """
+    Desengancha la partición, la vuelca a <destino>/<nombre>.csv.gz y la borra.
+    La tabla solo se borra si el archivo quedó completo (mismo número de filas).
+    Retorna (ruta, filas).
+    """
+    # 1. Desenganchar en su propia transacción: desde aquí las consultas ya no la ven
+    with conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT relispartition FROM pg_class WHERE oid = to_regclass(%s)", (nombre,))
+            fila = cur.fetchone()
+            if fila and fila[0]:
+                cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}")
+                            .format(sql.Identifier(tabla), sql.Identifier(nombre)))
+
+    # 2. Copiar a un temporal y renombrar: nunca queda un .gz a medias con el nombre final
+    os.makedirs(destino, exist_ok=True)
+    ruta = os.path.join(destino, f"{nombre}.csv.gz")
+    temporal = f"{ruta}.tmp"
+    with conexion() as conn:
+        with conn.cursor() as cur:
+            with gzip.open(temporal, "wb") as archivo:
+                cur.copy_expert(
+                    sql.SQL("COPY {} TO STDOUT WITH (FORMAT csv, HEADER)")
+                    .format(sql.Identifier(nombre)).as_string(conn),
+                    archivo
+                )
+            cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(nombre)))
+            filas = cur.fetchone()[0]
+
+    with gzip.open(temporal, "rt", encoding="utf-8", newline="") as archivo:
+        # Sin contar el encabezado; el lector csv respeta los saltos de línea
+        # dentro de campos entre comillas (observaciones, datos JSON)
+        escritas = sum(1 for _ in csv.reader(archivo)) - 1
+    if escritas != filas:
+        os.remove(temporal)
+        raise RuntimeError(f"{nombre}: se archivaron {escritas} de {filas} filas, no se borra")
+    with open(temporal, "rb") as archivo:
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+    # 3. Borrar la tabla ya archivada
+    with conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(nombre)))
+    return ruta, filas
+
+
+# ===========================================================
+# Mantenimiento completo
+# ===========================================================
+def mantener_particiones(simular=False, hoy=None):
+    """
+    Crea los meses siguientes y archiva los vencidos. Con simular=True solo
+    informa qué haría. Retorna un resumen; si otro proceso tiene el lock, None.
+    """
+    creadas, archivadas, omitidas, pendientes = [], [], [], []
+    # Lock de sesión sobre una conexión que se mantiene toda la corrida; cada
+    # archivo usa otras conexiones (y sus propias transacciones)
+    with conexion() as conn_lock:
+        with conn_lock.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (_LOCK_MANTENIMIENTO,))
+            if not cur.fetchone()[0]:
+                return None
+            try:
+                for tabla in RETENCION_MESES:
+                    if not tabla_particionada(cur, tabla):
+                        omitidas.append(f"{tabla} (sin migración 005)")
+                        continue
+                    if not simular:
+                        creadas.extend(crear_particiones_futuras(cur, tabla, hoy))
+                        conn_lock.commit()
+                    for nombre in _sueltas(cur, tabla) + particiones_vencidas(cur, tabla, hoy):
+                        # Un vehículo que sigue en el patio no se archiva con su mes
+                        if tabla == "acceso" and _tiene_accesos_abiertos(cur, nombre):
+                            omitidas.append(f"{nombre} (accesos sin salida)")
+                            continue
+                        pendientes.append((tabla, nombre))
+                conn_lock.commit()
+
+                if simular:
+                    return {"crearia_hasta": PARTICIONES_MESES_ADELANTE,
+                            "archivaria": [n for _, n in pendientes], "omitidas": omitidas}
+
+                for tabla, nombre in pendientes:
+                    try:
+                        ruta, filas = archivar_particion(tabla, nombre)
+                        archivadas.append({"particion": nombre, "filas": filas, "archivo": ruta})
+                        print(f"📦 Partición archivada: {nombre} ({filas} filas) -> {ruta}")
+                    except Exception as e:
+                        print(f"❌ Error archivando partición {nombre}: {e}")
+                        _estado["ultimo_error"] = str(e)
+                        omitidas.append(f"{nombre} (error: {e})")
+            finally:
+                conn_lock.rollback()
+                cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_MANTENIMIENTO,))
+
+    _estado.update(ultima_ejecucion=time.strftime("%Y-%m-%d %H:%M:%S"),
+                   creadas=creadas, archivadas=archivadas, omitidas=omitidas)
+    return {"creadas": creadas, "archivadas": archivadas, "omitidas": omitidas}
+
+
+def _bucle_mantenimiento():
+    while True:
+        try:
+            mantener_particiones()
+        except Exception as e:
+            _estado["ultimo_error"] = str(e)
+            print(f"❌ Error en mantenimiento de particiones: {e}")
+        time.sleep(max(PARTICIONES_INTERVALO_HORAS, 0.1) * 3600)
+
+
+def iniciar_mantenimiento_particiones():
+    """Arranca el hilo de mantenimiento (uno por proceso; el lock deja correr a uno solo)."""
+    global _hilo, _pid
+    if not PARTICIONES_ACTIVAS or (_hilo is not None and _pid == os.getpid() and _hilo.is_alive()):
+        return
+    _pid = os.getpid()
+    _hilo = threading.Thread(target=_bucle_mantenimiento, name="particiones", daemon=True)
+    _hilo.start()
+
+
+def estadisticas_particiones():
+    return {
+        "activo": PARTICIONES_ACTIVAS,
+        "meses_adelante": PARTICIONES_MESES_ADELANTE,
+        "retencion_meses": dict(RETENCION_MESES),
+        **_estado,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de particiones de acceso y auditoria")
+    parser.add_argument("--simular", action="store_true", help="solo muestra qué se crearía y archivaría")
+    args = parser.parse_args()
+    resultado = mantener_particiones(simular=args.simular)
+    if resultado is None:
+        print("⚠️  Otro proceso está haciendo el mantenimiento")
+    else:
+        print(resultado)
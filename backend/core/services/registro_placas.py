@@ -0,0 +1,257 @@
+# backend/core/services/registro_placas.py
+# Registro en memoria de placas matriculadas, por placa normalizada
+# (normalizar_placa: mayúsculas, sin guiones ni espacios; columna placa_norm):
+#   - positivos: LRU placa -> {id_vehiculo, tipo, color, id_persona, propietario}
+#   - negativos: filtro de Bloom con TODAS las placas de la tabla vehiculo.
+#     Si la placa no está en el filtro, seguro no está registrada y se niega
+#     sin consultar Postgres. Un falso positivo solo cuesta la consulta.
+# Los controladores del CRUD de vehículos y personas lo mantienen coherente.
+# Las altas de otros procesos llegan por el bus de cambios; la recarga
+# periódica acota cuánto tarda en verse un vehículo si el bus no está.
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from core.db.connection import conexion
+from core.db.sesion import conexion_unidad, al_confirmar
+
+REGISTRO_PLACAS_ACTIVO = os.getenv("REGISTRO_PLACAS_ACTIVO", "1") == "1"
+REGISTRO_CACHE_TAMANO = int(os.getenv("REGISTRO_CACHE_TAMANO", "4096"))
+# Tasa de falsos positivos objetivo del filtro de Bloom
+REGISTRO_BLOOM_FP = float(os.getenv("REGISTRO_BLOOM_FP", "0.01"))
+# Reconstrucción completa del filtro (0 = nunca)
+REGISTRO_RECARGA_SEGUNDOS = float(os.getenv("REGISTRO_RECARGA_SEGUNDOS", "60"))
+
+
+def normalizar_placa(placa):
+    """'abc-123' -> 'ABC123'. Misma regla que la columna vehiculo.placa_norm (migración 007)."""
+    return re.sub(r"[^A-Z0-9]", "", (placa or "").upper())
+
+
+class FiltroBloom:
+    """Filtro de Bloom sobre un bytearray; k posiciones por doble hashing."""
+
+    def __init__(self, capacidad, tasa_fp=REGISTRO_BLOOM_FP):
+        capacidad = max(int(capacidad), 1)
+        self.capacidad = capacidad
+        self.bits = max(int(-capacidad * math.log(tasa_fp) / (math.log(2) ** 2)), 64)
+        self.hashes = max(int(round(self.bits / capacidad * math.log(2))), 1)
+        self._arreglo = bytearray((self.bits + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, clave):
+        digest = hashlib.blake2b(clave.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.bits for i in range(self.hashes))
+
+    def agregar(self, clave):
+        for posicion in self._posiciones(clave):
+            self._arreglo[posicion >> 3] |= 1 << (posicion & 7)
+        self.elementos += 1
+
+    def __contains__(self, clave):
+        return all(self._arreglo[p >> 3] & (1 << (p & 7)) for p in self._posiciones(clave))
+
+    def tasa_fp_estimada(self):
+        return (1 - math.exp(-self.hashes * self.elementos / self.bits)) ** self.hashes
+
+
+class RegistroPlacas:
+    def __init__(self, tamano=REGISTRO_CACHE_TAMANO):
+        self.tamano = max(tamano, 1)
+        self._positivos = OrderedDict()
+        self._bloom = None
+        self._lock = threading.Lock()
+        self._cargado_en = 0.0
+        self._reconstruyendo = False
+        # Altas que llegan mientras se reconstruye; se reaplican al filtro nuevo
+        self._pendientes = None
+
+        # Métricas
+        self._aciertos = 0
+        self._negativos = 0
+        self._consultas_bd = 0
+        self._falsos_positivos = 0
+
+    @property
+    def cargado(self):
+        return self._bloom is not None
+
+    # -------------------------------------------------------
+    # Carga del filtro
+    # -------------------------------------------------------
+    def cargar(self):
+        with conexion() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT placa_norm FROM vehiculo")
+                placas = [fila[0] for fila in cur.fetchall()]
+        # Holgura para las altas que lleguen antes de la próxima recarga
+        bloom = FiltroBloom(max(len(placas) * 2, 1024))
+        for placa in placas:
+            bloom.agregar(placa)
+        with self._lock:
+            # Altas hechas mientras se leía la tabla (quizá aún sin commit)
+            for placa in self._pendientes or ():
+                bloom.agregar(placa)
+            if self._pendientes is not None:
+                self._pendientes = []
+            self._bloom = bloom
+            self._positivos.clear()
+            self._cargado_en = time.monotonic()
+        return len(placas)
+
+    def _reconstruir_en_segundo_plano(self):
+        try:
+            self.cargar()
+        except Exception as e:
+            print(f"❌ Error recargando registro de placas: {e}")
+        finally:
+            with self._lock:
+                self._reconstruyendo = False
+                self._pendientes = None
+                self._cargado_en = time.monotonic()
+
+    def _recargar_si_vencido(self):
+        """Mientras se reconstruye en segundo plano se sigue usando el filtro anterior."""
+        with self._lock:
+            bloom = self._bloom
+            vencido = REGISTRO_RECARGA_SEGUNDOS and time.monotonic() - self._cargado_en >= REGISTRO_RECARGA_SEGUNDOS
+            lleno = bloom is not None and bloom.elementos > bloom.capacidad
+            if not (vencido or lleno) or self._reconstruyendo:
+                return
+            self._reconstruyendo = True
+            self._pendientes = []
+        threading.Thread(target=self._reconstruir_en_segundo_plano, name="registro-placas", daemon=True).start()
+
+    # -------------------------------------------------------
+    # Consulta
+    # -------------------------------------------------------
+    def buscar(self, placa):
+        """Datos del vehículo con esa placa, o None si no está registrada."""
+        placa = normalizar_placa(placa)
+        if self.cargado:
+            self._recargar_si_vencido()
+        with self._lock:
+            if self._bloom is not None and placa not in self._bloom:
+                self._negativos += 1
+                return None
+            datos = self._positivos.get(placa)
+            if datos is not None:
+                self._positivos.move_to_end(placa)
+                self._aciertos += 1
+                return dict(datos)
+            self._consultas_bd += 1
+
+        datos = self.consultar_bd(placa)
+        if datos is None:
+            with self._lock:
+                self._falsos_positivos += int(self._bloom is not None)
+            return None
+        # Solo se memoriza lo confirmado
+        al_confirmar(lambda: self._guardar(placa, datos))
+        return dict(datos)
+
+    @staticmethod
+    def consultar_bd(placa):
+        # Dentro de la unidad de trabajo: ve también el invitado recién insertado
+        with conexion_unidad() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT v.id_vehiculo, v.tipo, v.color, v.id_persona, p.nombre
+                    FROM vehiculo v
+                    JOIN persona p ON v.id_persona = p.id_persona
+                    WHERE v.placa_norm = %s
+                """, (normalizar_placa(placa),))
+                fila = cur.fetchone()
+        if fila is None:
+            return None
+        return {"id_vehiculo": fila[0], "tipo": fila[1], "color": fila[2], "id_persona": fila[3], "propietario": fila[4]}
+
+    def _guardar(self, placa, datos):
+        with self._lock:
+            self._positivos[placa] = datos
+            self._positivos.move_to_end(placa)
+            while len(self._positivos) > self.tamano:
+                self._positivos.popitem(last=False)
+
+    # -------------------------------------------------------
+    # Coherencia con el CRUD
+    # -------------------------------------------------------
+    def agregar(self, placa):
+        """Alta de una placa. Va directo al filtro: si la transacción se revierte
+        solo queda un falso positivo, que se resuelve con una consulta."""
+        placa = normalizar_placa(placa)
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.agregar(placa)
+            if self._pendientes is not None:
+                self._pendientes.append(placa)
+
+    def invalidar(self, placa=None, id_vehiculo=None, id_persona=None):
+        """Saca del LRU las entradas afectadas por una edición o un borrado."""
+        placa = normalizar_placa(placa)
+        with self._lock:
+            for clave in [p for p, d in self._positivos.items()
+                          if p == placa
+                          or (id_vehiculo is not None and d["id_vehiculo"] == id_vehiculo)
+                          or (id_persona is not None and d["id_persona"] == id_persona)]:
+                del self._positivos[clave]
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self._aciertos + self._negativos + self._consultas_bd
+            bloom = self._bloom
+            return {
+                "activo": REGISTRO_PLACAS_ACTIVO,
+                "cargado": bloom is not None,
+                "reconstruyendo": self._reconstruyendo,
+                "positivos_en_cache": len(self._positivos),
+                "tamano_cache": self.tamano,
+                "bloom_placas": bloom.elementos if bloom else 0,
+                "bloom_bytes": len(bloom._arreglo) if bloom else 0,
+                "bloom_hashes": bloom.hashes if bloom else 0,
+                "bloom_fp_estimada": round(bloom.tasa_fp_estimada(), 5) if bloom else None,
+                "aciertos": self._aciertos,
+                "negativos_sin_bd": self._negativos,
+                "consultas_bd": self._consultas_bd,
+                "falsos_positivos": self._falsos_positivos,
+                "tasa_sin_bd": round((self._aciertos + self._negativos) / consultas, 3) if consultas else 0.0,
+            }
+
+
+_registro = RegistroPlacas()
+
+
+def cargar_registro_placas():
+    """Carga inicial (al arrancar el servidor). Si falla, cada búsqueda consulta la BD."""
+    if not REGISTRO_PLACAS_ACTIVO:
+        return
+    try:
+        total = _registro.cargar()
+        print(f"🚗 Registro de placas cargado: {total} placas")
+    except Exception as e:
+        print(f"❌ Error cargando registro de placas: {e}")
+
+
+def buscar_vehiculo_por_placa(placa):
+    if not REGISTRO_PLACAS_ACTIVO:
+        return RegistroPlacas.consultar_bd(placa)
+    return _registro.buscar(placa)
+
+
+def placa_registrada_agregada(placa):
+    _registro.agregar(placa)
+
+
+def invalidar_registro(placa=None, id_vehiculo=None, id_persona=None):
+    _registro.invalidar(placa, id_vehiculo, id_persona)
+
+
+def estadisticas_registro_placas():
+    return _registro.estadisticas()
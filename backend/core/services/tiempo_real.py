@@ -0,0 +1,196 @@
+# backend/core/services/tiempo_real.py
+# Canal de eventos para los dashboards (Server-Sent Events).
+# Los caminos de escritura publican tras el commit:
+#   - "acceso"     entradas y salidas (models/acceso.py)
+#   - "alerta"     alertas creadas o resueltas
+#   - "contadores" deltas de vehículos / accesos / alertas (contadores.py)
+#   - "auditoria"  resumen de cada registro de auditoría (solo administradores)
+# Los últimos SSE_BUFFER eventos quedan en un buffer circular: un cliente que
+# se reconecta con Last-Event-ID recibe lo que se perdió sin ir a la BD. Si
+# ese id ya salió del buffer (o es de otro arranque del proceso) recibe un
+# evento "reinicio" y debe volver a pedir el estado completo.
+#
+# Cada worker de gunicorn tiene su propio canal; los accesos y alertas que
+# registra el otro worker llegan por el bus de cambios
+# (core/services/bus_cambios.py), que los vuelve a publicar aquí.
+
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import date, datetime
+
+from core.db.sesion import al_confirmar
+
+SSE_ACTIVO = os.getenv("SSE_ACTIVO", "1") == "1"
+SSE_BUFFER = int(os.getenv("SSE_BUFFER", "500"))
+SSE_LATIDO_SEGUNDOS = float(os.getenv("SSE_LATIDO_SEGUNDOS", "15"))
+# Cada conexión se cierra a los N segundos; EventSource se reconecta solo con
+# Last-Event-ID, así un hilo del servidor no queda tomado indefinidamente
+SSE_DURACION_MAX_SEGUNDOS = float(os.getenv("SSE_DURACION_MAX_SEGUNDOS", "300"))
+# Con gthread cada stream abierto ocupa uno de los --threads del worker
+# durante toda su duración. El tope sale de ese número (GUNICORN_THREADS, el
+# mismo que usa el CMD del Dockerfile) menos los hilos que se reservan para
+# las demás rutas (login, OCR, CRUD): sin esa reserva, los dashboards
+# abiertos dejan al worker sin hilos y la portería se queda esperando.
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "32"))
+SSE_HILOS_RESERVADOS = int(os.getenv("SSE_HILOS_RESERVADOS", "16"))
+_TOPE_CLIENTES = max(GUNICORN_THREADS - SSE_HILOS_RESERVADOS, 1)
+# SSE_MAX_CLIENTES solo puede bajar el tope, nunca pasarlo
+SSE_MAX_CLIENTES = min(int(os.getenv("SSE_MAX_CLIENTES", str(_TOPE_CLIENTES))), _TOPE_CLIENTES)
+
+# Eventos que solo ve un administrador
+SOLO_ADMIN = {"auditoria"}
+
+
+class CanalLlenoError(Exception):
+    """Se alcanzó SSE_MAX_CLIENTES en este proceso."""
+
+
+def _a_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+class CanalEventos:
+    def __init__(self, tamano=SSE_BUFFER):
+        # Identifica este arranque: un id de otro proceso no se puede reanudar
+        self.epoca = uuid.uuid4().hex[:8]
+        self._buffer = deque(maxlen=max(tamano, 1))
+        self._secuencia = itertools.count(1)
+        self._cond = threading.Condition()
+        self._clientes = 0
+
+        # Métricas
+        self._publicados = 0
+        self._reanudaciones = 0
+        self._reinicios = 0
+        self._rechazados = 0
+
+    # -------------------------------------------------------
+    # Publicación
+    # -------------------------------------------------------
+    def _publicar(self, tipo, datos):
+        with self._cond:
+            evento = {
+                "id": f"{self.epoca}-{next(self._secuencia)}",
+                "tipo": tipo,
+                "datos": json.dumps(datos, default=_a_json),
+            }
+            self._buffer.append(evento)
+            self._publicados += 1
+            self._cond.notify_all()
+
+    def publicar(self, tipo, datos):
+        """Publica tras el commit de la unidad de trabajo (o ya, si no hay)."""
+        al_confirmar(lambda: self._publicar(tipo, datos))
+
+    # -------------------------------------------------------
+    # Suscripción
+    # -------------------------------------------------------
+    def _pendientes(self, ultimo_id):
+        """Eventos del buffer posteriores a ultimo_id; None si no se puede reanudar."""
+        if not ultimo_id:
+            return []
+        epoca, _, secuencia = ultimo_id.partition("-")
+        if epoca != self.epoca or not secuencia.isdigit():
+            return None
+        secuencia = int(secuencia)
+        eventos = list(self._buffer)
+        if eventos and int(eventos[0]["id"].split("-")[1]) > secuencia + 1:
+            return None
+        return [e for e in eventos if int(e["id"].split("-")[1]) > secuencia]
+
+    @staticmethod
+    def _formatear(evento):
+        return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {evento['datos']}\n\n"
+
+    def suscribir(self, ultimo_id=None, es_admin=False):
+        """
+        Generador de texto SSE. Envía lo pendiente desde ultimo_id y luego los
+        eventos nuevos; un comentario de latido mantiene viva la conexión.
+        """
+        with self._cond:
+            if self._clientes >= SSE_MAX_CLIENTES:
+                self._rechazados += 1
+                raise CanalLlenoError("Demasiados clientes conectados")
+            pendientes = self._pendientes(ultimo_id)
+            if pendientes is None:
+                self._reinicios += 1
+            elif ultimo_id:
+                self._reanudaciones += 1
+            ultimo = self._buffer[-1]["id"] if self._buffer else f"{self.epoca}-0"
+        return self._flujo(pendientes, ultimo, es_admin)
+
+    def _flujo(self, pendientes, ultimo, es_admin):
+        fin = time.monotonic() + SSE_DURACION_MAX_SEGUNDOS
+        # Se cuenta al empezar a enviar: un generador que nunca se consume no ocupa cupo
+        with self._cond:
+            self._clientes += 1
+        try:
+            yield "retry: 3000\n\n"
+            if pendientes is None:
+                yield self._formatear({"id": ultimo, "tipo": "reinicio", "datos": "{}"})
+            else:
+                for evento in pendientes:
+                    if es_admin or evento["tipo"] not in SOLO_ADMIN:
+                        yield self._formatear(evento)
+                    ultimo = evento["id"]
+
+            while time.monotonic() < fin:
+                with self._cond:
+                    nuevos = self._pendientes(ultimo)
+                    if not nuevos:
+                        self._cond.wait(SSE_LATIDO_SEGUNDOS)
+                        nuevos = self._pendientes(ultimo)
+                if nuevos is None:
+                    # El cliente se quedó atrás más que el buffer
+                    yield self._formatear({"id": ultimo, "tipo": "reinicio", "datos": "{}"})
+                    with self._cond:
+                        ultimo = self._buffer[-1]["id"] if self._buffer else ultimo
+                    continue
+                if not nuevos:
+                    yield ": latido\n\n"
+                    continue
+                for evento in nuevos:
+                    if es_admin or evento["tipo"] not in SOLO_ADMIN:
+                        yield self._formatear(evento)
+                    ultimo = evento["id"]
+        finally:
+            with self._cond:
+                self._clientes -= 1
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                "activo": SSE_ACTIVO,
+                "epoca": self.epoca,
+                "clientes": self._clientes,
+                "max_clientes": SSE_MAX_CLIENTES,
+                "hilos_worker": GUNICORN_THREADS,
+                "en_buffer": len(self._buffer),
+                "publicados": self._publicados,
+                "reanudaciones": self._reanudaciones,
+                "reinicios": self._reinicios,
+                "rechazados": self._rechazados,
+            }
+
+
+_canal = CanalEventos()
+
+
+def publicar_evento(tipo, datos):
+    if SSE_ACTIVO:
+        _canal.publicar(tipo, datos)
+
+
+def suscribir_eventos(ultimo_id=None, es_admin=False):
+    return _canal.suscribir(ultimo_id, es_admin)
+
+
+def estadisticas_tiempo_real():
+    return _canal.estadisticas()
@@ -0,0 +1,377 @@
+# backend/core/services/trabajos_exportacion.py
+# Exportaciones como trabajos en segundo plano.
+# POST /api/admin/exportar/<formato> encola un trabajo y responde de inmediato
+# con su id; un pool de hilos (EXPORTACION_WORKERS) arma el archivo en disco.
+#
+# Artefactos: EXPORTACION_DIR/artefactos/<clave>_<version>.<ext>, donde
+#   - clave   = hash del formato y los filtros (desde / hasta / placa)
+#   - version = MAX(id_acceso) y MAX(hora_salida) al empezar; la segunda cambia
+#               con cada salida, que reescribe filas ya exportadas.
+# Una exportación idéntica sobre la misma versión reutiliza el archivo.
+#
+# CSV incremental: las filas con id_acceso menor que el primer acceso abierto
+# ya no cambian (solo la salida modifica un acceso). Si hay un CSV anterior con
+# los mismos filtros y un rango que el nuevo contiene, se copian sus bytes hasta
+# esa frontera y solo se consultan las filas desde ahí. Los datos del vehículo
+# y del propietario quedan como estaban al exportar por primera vez cada fila;
+# completo=1 fuerza regenerar. PDF y Excel no se pueden extender: se rehacen.
+#
+# El estado de cada trabajo se guarda en EXPORTACION_DIR/trabajos/<id>.json,
+# así cualquier worker de gunicorn puede responder el estado y la descarga.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from core.db.connection import conexion
+from core.exportaciones import (
+    escribir_csv, escribir_excel, escribir_pdf, condiciones_accesos
+)
+
+EXPORTACION_WORKERS = int(os.getenv("EXPORTACION_WORKERS", "2"))
+EXPORTACION_DIR = os.getenv(
+    "EXPORTACION_DIR", os.path.join(tempfile.gettempdir(), "smartcar_exportaciones")
+)
+# Artefactos más viejos que esto se borran (0 = nunca)
+EXPORTACION_RETENCION_HORAS = float(os.getenv("EXPORTACION_RETENCION_HORAS", "24"))
+
+FORMATOS = {
+    "pdf": {"extension": "pdf", "mimetype": "application/pdf"},
+    "excel": {"extension": "xlsx",
+              "mimetype": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "csv": {"extension": "csv", "mimetype": "text/csv"},
+}
+
+
+def _dir(nombre):
+    ruta = os.path.join(EXPORTACION_DIR, nombre)
+    os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+
+def _escribir_json(ruta, datos):
+    # Escritura atómica: otro worker nunca lee un JSON a medias
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, default=str)
+    os.replace(temporal, ruta)
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _fecha_iso(valor):
+    return valor.isoformat() if valor else None
+
+
+def _clave(formato, filtros):
+    base = json.dumps({
+        "formato": formato,
+        "desde": _fecha_iso(filtros.get("desde")),
+        "hasta": _fecha_iso(filtros.get("hasta")),
+        "placa": (filtros.get("placa") or "").upper(),
+    }, sort_keys=True)
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()[:16]
+
+
+def version_accesos():
+    """(max id_acceso, max hora_salida, primer id abierto): cada consulta usa un índice."""
+    with conexion() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(id_acceso), 0) FROM acceso")
+            max_id = cur.fetchone()[0]
+            cur.execute("SELECT MAX(hora_salida) FROM acceso")
+            max_salida = cur.fetchone()[0]
+            cur.execute("SELECT MIN(id_acceso) FROM acceso WHERE hora_salida IS NULL")
+            primer_abierto = cur.fetchone()[0]
+    return max_id, max_salida, primer_abierto
+
+
+def _etiqueta_version(max_id, max_salida):
+    sello = int(max_salida.timestamp()) if max_salida else 0
+    return f"{max_id}_{sello}"
+
+
+class GestorExportaciones:
+    def __init__(self, workers=EXPORTACION_WORKERS):
+        self.workers = max(workers, 1)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._en_curso = {}      # clave_version -> id_trabajo (este proceso)
+
+        # Métricas
+        self._encolados = 0
+        self._reutilizados = 0
+        self._incrementales = 0
+        self._completos = 0
+        self._fallidos = 0
+
+    def _asegurar_pool(self):
+        pid = os.getpid()
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                self._pid = pid
+                self._en_curso = {}
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="exportacion")
+            return self._pool
+
+    # -------------------------------------------------------
+    # Trabajos
+    # -------------------------------------------------------
+    def _ruta_trabajo(self, id_trabajo):
+        return os.path.join(_dir("trabajos"), f"{id_trabajo}.json")
+
+    def _guardar_trabajo(self, trabajo):
+        _escribir_json(self._ruta_trabajo(trabajo["id_trabajo"]), trabajo)
+
+    def obtener(self, id_trabajo):
+        # El id viene de la URL: solo hex, nada de rutas
+        if not id_trabajo or not all(c in "0123456789abcdef" for c in id_trabajo):
+            return None
+        return _leer_json(self._ruta_trabajo(id_trabajo))
+
+    def crear(self, formato, filtros, completo=False):
+        """Registra el trabajo y lo encola (o lo resuelve al instante si ya existe el archivo)."""
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato no soportado: {formato}")
+
+        max_id, max_salida, primer_abierto = version_accesos()
+        clave = _clave(formato, filtros)
+        version = _etiqueta_version(max_id, max_salida)
+        clave_version = f"{clave}_{version}"
+
+        trabajo = {
+            "id_trabajo": uuid.uuid4().hex,
+            "formato": formato,
+            "filtros": {k: _fecha_iso(v) if isinstance(v, datetime) else v for k, v in filtros.items()},
+            "max_id_acceso": max_id,
+            "estado": "en_cola",
+            "creado": datetime.now().isoformat(),
+            "terminado": None,
+            "filas": None,
+            "modo": None,
+            "error": None,
+        }
+
+        artefacto = self._ruta_artefacto(clave_version, formato)
+        if not completo and os.path.exists(artefacto):
+            meta = _leer_json(f"{artefacto}.json") or {}
+            # Se usa: no cuenta para la retención
+            os.utime(artefacto)
+            trabajo.update(estado="listo", modo="reutilizado", filas=meta.get("filas"),
+                           archivo=artefacto, terminado=trabajo["creado"])
+            self._guardar_trabajo(trabajo)
+            with self._lock:
+                self._reutilizados += 1
+            return trabajo
+
+        pool = self._asegurar_pool()
+        with self._lock:
+            # Misma exportación ya en marcha en este proceso: se comparte el trabajo
+            existente = self._en_curso.get(clave_version)
+            if existente and not completo:
+                anterior = self.obtener(existente)
+                if anterior and anterior["estado"] in ("en_cola", "procesando"):
+                    return anterior
+            self._en_curso[clave_version] = trabajo["id_trabajo"]
+            self._encolados += 1
+
+        self._guardar_trabajo(trabajo)
+        pool.submit(self._ejecutar, trabajo, dict(filtros), clave, clave_version,
+                    max_id, primer_abierto, completo)
+        return trabajo
+
+    def _ruta_artefacto(self, clave_version, formato):
+        return os.path.join(_dir("artefactos"), f"{clave_version}.{FORMATOS[formato]['extension']}")
+
+    def _ejecutar(self, trabajo, filtros, clave, clave_version, max_id, primer_abierto, completo):
+        trabajo["estado"] = "procesando"
+        self._guardar_trabajo(trabajo)
+        destino = self._ruta_artefacto(clave_version, trabajo["formato"])
+        temporal = f"{destino}.{uuid.uuid4().hex}.tmp"
+        inicio = time.perf_counter()
+        try:
+            # Nada posterior al inicio del trabajo: el archivo corresponde a su versión
+            filtros["id_max"] = max_id
+            # Filas con id menor que el primer acceso abierto ya no cambian
+            frontera = min(primer_abierto, max_id + 1) if primer_abierto else max_id + 1
+
+            meta = {"clave": clave, "formato": trabajo["formato"], "filtros": trabajo["filtros"],
+                    "max_id_acceso": max_id, "frontera_id": frontera}
+
+            if trabajo["formato"] == "csv":
+                base = None if completo else self._base_incremental(clave, trabajo["filtros"], filtros)
+                filas, bytes_prefijo, filas_prefijo, modo = self._escribir_csv(temporal, filtros, frontera, base)
+                meta["bytes_prefijo"] = bytes_prefijo
+                meta["filas_prefijo"] = filas_prefijo
+            elif trabajo["formato"] == "excel":
+                filas, modo = escribir_excel(temporal, filtros), "completo"
+            else:
+                filas, modo = escribir_pdf(temporal, filtros), "completo"
+
+            meta["filas"] = filas
+            meta["creado"] = datetime.now().isoformat()
+            os.replace(temporal, destino)
+            _escribir_json(f"{destino}.json", meta)
+
+            trabajo.update(estado="listo", filas=filas, modo=modo, archivo=destino,
+                           segundos=round(time.perf_counter() - inicio, 3),
+                           terminado=datetime.now().isoformat())
+            with self._lock:
+                if modo == "incremental":
+                    self._incrementales += 1
+                else:
+                    self._completos += 1
+        except Exception as e:
+            print(f"❌ Error en exportación {trabajo['id_trabajo']} ({trabajo['formato']}): {e}")
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            trabajo.update(estado="error", error=str(e), terminado=datetime.now().isoformat())
+            with self._lock:
+                self._fallidos += 1
+        finally:
+            with self._lock:
+                if self._en_curso.get(clave_version) == trabajo["id_trabajo"]:
+                    del self._en_curso[clave_version]
+            self._guardar_trabajo(trabajo)
+            self._limpiar_vencidos()
+
+    # -------------------------------------------------------
+    # CSV incremental
+    # -------------------------------------------------------
+    def _base_incremental(self, clave, filtros_iso, filtros):
+        """
+        CSV anterior reutilizable: mismo 'desde' y placa, 'hasta' igual o menor
+        (sin hasta = abierto). Se elige el de mayor frontera.
+        """
+        mejor = None
+        for nombre in os.listdir(_dir("artefactos")):
+            if not nombre.endswith(".csv.json"):
+                continue
+            meta = _leer_json(os.path.join(_dir("artefactos"), nombre))
+            if not meta or meta.get("formato") != "csv" or "filas_prefijo" not in meta:
+                continue
+            previos = meta["filtros"]
+            if previos.get("desde") != filtros_iso.get("desde"):
+                continue
+            if (previos.get("placa") or "").upper() != (filtros_iso.get("placa") or "").upper():
+                continue
+            hasta_prev, hasta_nuevo = previos.get("hasta"), filtros_iso.get("hasta")
+            if hasta_nuevo is None:
+                pass
+            elif hasta_prev is None or hasta_prev > hasta_nuevo:
+                continue
+            ruta = os.path.join(_dir("artefactos"), nombre[:-len(".json")])
+            if not os.path.exists(ruta):
+                continue
+            if mejor is None or meta["frontera_id"] > mejor[0]["frontera_id"]:
+                mejor = (meta, ruta)
+
+        if mejor is None:
+            return None
+        meta, ruta = mejor
+        # El prefijo sirve si ninguna fila bajo la frontera cae en el rango agregado
+        if meta["filtros"].get("hasta") != filtros_iso.get("hasta") and \
+                self._filas_en_rango_agregado(filtros, meta):
+            return None
+        return meta, ruta
+
+    @staticmethod
+    def _filas_en_rango_agregado(filtros, meta):
+        extra = dict(filtros)
+        extra.pop("id_max", None)
+        extra["desde"] = datetime.fromisoformat(meta["filtros"]["hasta"])
+        where, params = condiciones_accesos(extra)
+        with conexion() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT EXISTS (
+                        SELECT 1 FROM acceso a
+                        JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+                        WHERE a.id_acceso < %s {where}
+                    )
+                """, (meta["frontera_id"], *params))
+                return cur.fetchone()[0]
+
+    @staticmethod
+    def _escribir_csv(temporal, filtros, frontera, base):
+        if base is None:
+            with open(temporal, "w", encoding="utf-8", newline="") as f:
+                filas, bytes_prefijo, filas_prefijo = escribir_csv(f, filtros, frontera_id=frontera)
+            return filas, bytes_prefijo, filas_prefijo, "completo"
+
+        meta, ruta = base
+        # Se copian los bytes "estables" del archivo anterior y se consulta el resto
+        with open(ruta, "rb") as origen, open(temporal, "wb") as destino:
+            restante = meta["bytes_prefijo"]
+            while restante > 0:
+                trozo = origen.read(min(restante, 1024 * 1024))
+                if not trozo:
+                    break
+                destino.write(trozo)
+                restante -= len(trozo)
+        previas = meta["filas_prefijo"]
+        with open(temporal, "a", encoding="utf-8", newline="") as f:
+            filtros = dict(filtros, id_min=meta["frontera_id"])
+            filas, bytes_prefijo, filas_prefijo = escribir_csv(f, filtros, encabezado=False, frontera_id=frontera)
+        return previas + filas, bytes_prefijo, previas + filas_prefijo, "incremental"
+
+    # -------------------------------------------------------
+    # Limpieza y métricas
+    # -------------------------------------------------------
+    @staticmethod
+    def _limpiar_vencidos():
+        if not EXPORTACION_RETENCION_HORAS:
+            return
+        limite = time.time() - EXPORTACION_RETENCION_HORAS * 3600
+        for carpeta in ("artefactos", "trabajos"):
+            for nombre in os.listdir(_dir(carpeta)):
+                ruta = os.path.join(_dir(carpeta), nombre)
+                try:
+                    if os.path.getmtime(ruta) < limite:
+                        os.remove(ruta)
+                except OSError:
+                    pass
+
+    def estadisticas(self):
+        with self._lock:
+            artefactos = _dir("artefactos")
+            return {
+                "workers": self.workers,
+                "en_curso": len(self._en_curso),
+                "encolados": self._encolados,
+                "reutilizados": self._reutilizados,
+                "incrementales": self._incrementales,
+                "completos": self._completos,
+                "fallidos": self._fallidos,
+                "artefactos_en_disco": sum(1 for n in os.listdir(artefactos) if not n.endswith(".json")),
+                "espacio_libre_mb": round(shutil.disk_usage(artefactos).free / 1024 / 1024),
+            }
+
+
+_gestor = GestorExportaciones()
+
+
+def crear_trabajo_exportacion(formato, filtros, completo=False):
+    return _gestor.crear(formato, filtros, completo)
+
+
+def obtener_trabajo_exportacion(id_trabajo):
+    return _gestor.obtener(id_trabajo)
+
+
+def estadisticas_exportaciones():
+    return _gestor.estadisticas()
@@ -0,0 +1,10 @@
+-- ============================================================
+-- 001 - Índice de accesos abiertos (vehículos en el patio)
+-- ============================================================
+-- Sirve a la carga del índice del patio y a las escrituras protegidas de
+-- models/acceso.py (WHERE NOT EXISTS ... hora_salida IS NULL) sin recorrer
+-- todo el historial de accesos.
+
+CREATE INDEX IF NOT EXISTS idx_acceso_abierto_vehiculo
+    ON acceso (id_vehiculo)
+    WHERE hora_salida IS NULL;
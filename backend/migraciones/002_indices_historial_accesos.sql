@@ -0,0 +1,21 @@
+-- ============================================================
+-- 002 - Índices del historial de accesos (paginación por cursor)
+-- ============================================================
+-- GET /api/accesos ordena por (fecha_hora, id_acceso) descendente y pagina
+-- con (a.fecha_hora, a.id_acceso) < (cursor); los rangos de fecha son
+-- semiabiertos sobre la columna, sin DATE(...), para usar estos índices.
+
+CREATE INDEX IF NOT EXISTS idx_acceso_fecha_id
+    ON acceso (fecha_hora DESC, id_acceso DESC);
+
+-- Historial de una placa concreta (el JOIN llega por id_vehiculo)
+CREATE INDEX IF NOT EXISTS idx_acceso_vehiculo_fecha_id
+    ON acceso (id_vehiculo, fecha_hora DESC, id_acceso DESC);
+
+-- Búsqueda parcial de placa (ILIKE '%...%')
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_vehiculo_placa_trgm
+    ON vehiculo USING gin (placa gin_trgm_ops);
+
+ANALYZE acceso;
+ANALYZE vehiculo;
@@ -0,0 +1,14 @@
+-- ============================================================
+-- 003 - Índices para la versión de las exportaciones
+-- ============================================================
+-- core/services/trabajos_exportacion.py identifica cada artefacto con
+-- MAX(id_acceso) y MAX(hora_salida), y el CSV incremental necesita
+-- MIN(id_acceso) de los accesos abiertos. Con estos índices las tres
+-- consultas leen solo un extremo del índice.
+
+CREATE INDEX IF NOT EXISTS idx_acceso_hora_salida
+    ON acceso (hora_salida);
+
+CREATE INDEX IF NOT EXISTS idx_acceso_abierto_id
+    ON acceso (id_acceso)
+    WHERE hora_salida IS NULL;
@@ -0,0 +1,49 @@
+-- ============================================================
+-- 004 - Auditoría: datos en JSONB e índices para el historial paginado
+-- ============================================================
+-- models/auditoria.obtener_auditoria_paginada filtra por entidad, acción,
+-- usuario, id de entidad y rango de fechas, y busca clave/valor dentro de
+-- datos_previos / datos_nuevos con el operador @> (contención jsonb).
+--
+-- Los escritores siguen enviando el JSON como texto: Postgres lo convierte
+-- al insertar en la columna jsonb.
+
+-- Texto -> jsonb sin abortar la migración por una fila que no sea JSON
+-- válido: esa fila queda guardada como un string JSON.
+CREATE OR REPLACE FUNCTION pg_temp.texto_a_jsonb(valor TEXT) RETURNS JSONB AS $$
+BEGIN
+    IF valor IS NULL OR btrim(valor) = '' THEN
+        RETURN NULL;
+    END IF;
+    RETURN valor::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN to_jsonb(valor);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+ALTER TABLE auditoria
+    ALTER COLUMN datos_previos TYPE JSONB USING pg_temp.texto_a_jsonb(datos_previos),
+    ALTER COLUMN datos_nuevos  TYPE JSONB USING pg_temp.texto_a_jsonb(datos_nuevos);
+
+-- Orden de la paginación keyset: (fecha_hora, id_auditoria) DESC
+CREATE INDEX IF NOT EXISTS idx_auditoria_fecha_id
+    ON auditoria (fecha_hora DESC, id_auditoria DESC);
+
+-- Filtros exactos, cada uno seguido de la fecha para conservar el orden
+CREATE INDEX IF NOT EXISTS idx_auditoria_entidad
+    ON auditoria (lower(entidad), id_entidad, fecha_hora DESC);
+
+CREATE INDEX IF NOT EXISTS idx_auditoria_accion
+    ON auditoria (lower(accion), fecha_hora DESC);
+
+CREATE INDEX IF NOT EXISTS idx_auditoria_usuario
+    ON auditoria (id_usuario, fecha_hora DESC);
+
+-- Búsqueda clave/valor (jsonb_path_ops: más chico, solo soporta @>)
+CREATE INDEX IF NOT EXISTS idx_auditoria_datos_previos
+    ON auditoria USING GIN (datos_previos jsonb_path_ops);
+
+CREATE INDEX IF NOT EXISTS idx_auditoria_datos_nuevos
+    ON auditoria USING GIN (datos_nuevos jsonb_path_ops);
+
+ANALYZE auditoria;
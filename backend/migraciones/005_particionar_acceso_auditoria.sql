@@ -0,0 +1,168 @@
+-- ============================================================
+-- 005 - acceso y auditoria particionadas por mes (fecha_hora)
+-- ============================================================
+-- Requiere 001-004. Convierte ambas tablas en tablas particionadas por rango
+-- mensual sobre fecha_hora. Las consultas con rango de fechas (historial,
+-- exportaciones, auditoría) solo leen los meses que tocan; el mantenimiento
+-- (core/services/particiones.py) crea los meses siguientes y archiva los
+-- viejos según la retención configurada.
+--
+-- Cambios de esquema que impone el particionado:
+--   - La clave primaria pasa a ser (id, fecha_hora). id sigue saliendo de la
+--     misma secuencia, así que sigue siendo único.
+--   - Postgres no admite FOREIGN KEY hacia una tabla particionada sin la
+--     columna de partición: las FK de alerta.id_acceso y pago.id_acceso_*
+--     se reemplazan por un trigger que valida al insertar/actualizar.
+--     Archivar un mes no se bloquea por alertas o pagos que lo referencien.
+--   - Cada tabla tiene una partición por defecto (<tabla>_p_defecto) para que
+--     un insert nunca falle si el mantenimiento no corrió; crear_particion_mensual
+--     mueve sus filas al mes correspondiente.
+--
+-- Todo corre en una transacción: si algo falla, las tablas quedan como estaban.
+
+BEGIN;
+
+-- ------------------------------------------------------------
+-- Crea (si falta) la partición del mes de `mes` y le pasa las filas de ese
+-- mes que hubieran caído en la partición por defecto. La usa también el
+-- mantenimiento. Retorna el nombre creado o NULL si ya existía.
+-- ------------------------------------------------------------
+CREATE OR REPLACE FUNCTION crear_particion_mensual(tabla TEXT, mes DATE) RETURNS TEXT AS $$
+DECLARE
+    inicio DATE := date_trunc('month', mes)::date;
+    fin DATE := (date_trunc('month', mes) + INTERVAL '1 month')::date;
+    nombre TEXT := format('%s_p%s', tabla, to_char(mes, 'YYYY_MM'));
+    defecto TEXT := tabla || '_p_defecto';
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nombre, tabla);
+    IF to_regclass(defecto) IS NOT NULL THEN
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM %I WHERE fecha_hora >= %L AND fecha_hora < %L RETURNING *)
+             INSERT INTO %I SELECT * FROM movidas',
+            defecto, inicio, fin, nombre);
+    END IF;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   tabla, nombre, inicio, fin);
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ------------------------------------------------------------
+-- Reemplazo de las FK hacia acceso(id_acceso)
+-- ------------------------------------------------------------
+CREATE OR REPLACE FUNCTION verificar_id_acceso() RETURNS TRIGGER AS $$
+DECLARE
+    columna TEXT;
+    valor INTEGER;
+BEGIN
+    FOREACH columna IN ARRAY TG_ARGV LOOP
+        valor := (to_jsonb(NEW) ->> columna)::INTEGER;
+        IF valor IS NOT NULL AND NOT EXISTS (SELECT 1 FROM acceso WHERE id_acceso = valor) THEN
+            RAISE foreign_key_violation
+                USING MESSAGE = format('%s.%s = %s no existe en acceso', TG_TABLE_NAME, columna, valor);
+        END IF;
+    END LOOP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    fk RECORD;
+BEGIN
+    FOR fk IN
+        SELECT conrelid::regclass AS tabla, conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = 'acceso'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.tabla, fk.conname);
+    END LOOP;
+END;
+$$;
+
+-- ------------------------------------------------------------
+-- acceso
+-- ------------------------------------------------------------
+LOCK TABLE acceso IN ACCESS EXCLUSIVE MODE;
+ALTER TABLE acceso RENAME TO acceso_anterior;
+-- La secuencia sobrevive al DROP de la tabla anterior
+ALTER SEQUENCE acceso_id_acceso_seq OWNED BY NONE;
+
+CREATE TABLE acceso (
+    LIKE acceso_anterior INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    PRIMARY KEY (id_acceso, fecha_hora)
+) PARTITION BY RANGE (fecha_hora);
+CREATE TABLE acceso_p_defecto PARTITION OF acceso DEFAULT;
+
+SELECT crear_particion_mensual('acceso', mes::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(fecha_hora) FROM acceso_anterior), LOCALTIMESTAMP)),
+    date_trunc('month', LOCALTIMESTAMP) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS mes;
+
+INSERT INTO acceso SELECT * FROM acceso_anterior;
+DROP TABLE acceso_anterior;
+ALTER SEQUENCE acceso_id_acceso_seq OWNED BY acceso.id_acceso;
+
+ALTER TABLE acceso
+    ADD FOREIGN KEY (id_vehiculo) REFERENCES vehiculo(id_vehiculo) ON UPDATE CASCADE ON DELETE RESTRICT,
+    ADD FOREIGN KEY (id_punto) REFERENCES punto_de_control(id_punto) ON UPDATE CASCADE ON DELETE RESTRICT,
+    ADD FOREIGN KEY (id_vigilante) REFERENCES vigilante(id_vigilante) ON UPDATE CASCADE ON DELETE RESTRICT;
+
+-- Índices de 001-003 (se crean en cada partición, actual y futura)
+CREATE INDEX idx_acceso_abierto_vehiculo ON acceso (id_vehiculo) WHERE hora_salida IS NULL;
+CREATE INDEX idx_acceso_fecha_id ON acceso (fecha_hora DESC, id_acceso DESC);
+CREATE INDEX idx_acceso_vehiculo_fecha_id ON acceso (id_vehiculo, fecha_hora DESC, id_acceso DESC);
+CREATE INDEX idx_acceso_hora_salida ON acceso (hora_salida);
+CREATE INDEX idx_acceso_abierto_id ON acceso (id_acceso) WHERE hora_salida IS NULL;
+
+CREATE TRIGGER trg_alerta_id_acceso
+    BEFORE INSERT OR UPDATE OF id_acceso ON alerta
+    FOR EACH ROW EXECUTE FUNCTION verificar_id_acceso('id_acceso');
+CREATE TRIGGER trg_pago_id_acceso
+    BEFORE INSERT OR UPDATE OF id_acceso_entrada, id_acceso_salida ON pago
+    FOR EACH ROW EXECUTE FUNCTION verificar_id_acceso('id_acceso_entrada', 'id_acceso_salida');
+
+-- ------------------------------------------------------------
+-- auditoria
+-- ------------------------------------------------------------
+LOCK TABLE auditoria IN ACCESS EXCLUSIVE MODE;
+ALTER TABLE auditoria RENAME TO auditoria_anterior;
+ALTER SEQUENCE auditoria_id_auditoria_seq OWNED BY NONE;
+
+CREATE TABLE auditoria (
+    LIKE auditoria_anterior INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    PRIMARY KEY (id_auditoria, fecha_hora)
+) PARTITION BY RANGE (fecha_hora);
+CREATE TABLE auditoria_p_defecto PARTITION OF auditoria DEFAULT;
+
+SELECT crear_particion_mensual('auditoria', mes::date)
+FROM generate_series(
+    date_trunc('month', COALESCE((SELECT MIN(fecha_hora) FROM auditoria_anterior), LOCALTIMESTAMP)),
+    date_trunc('month', LOCALTIMESTAMP) + INTERVAL '3 months',
+    INTERVAL '1 month'
+) AS mes;
+
+INSERT INTO auditoria SELECT * FROM auditoria_anterior;
+DROP TABLE auditoria_anterior;
+ALTER SEQUENCE auditoria_id_auditoria_seq OWNED BY auditoria.id_auditoria;
+
+ALTER TABLE auditoria
+    ADD FOREIGN KEY (id_usuario) REFERENCES tmusuarios(nu) ON UPDATE CASCADE ON DELETE RESTRICT;
+
+-- Índices de 004
+CREATE INDEX idx_auditoria_fecha_id ON auditoria (fecha_hora DESC, id_auditoria DESC);
+CREATE INDEX idx_auditoria_entidad ON auditoria (lower(entidad), id_entidad, fecha_hora DESC);
+CREATE INDEX idx_auditoria_accion ON auditoria (lower(accion), fecha_hora DESC);
+CREATE INDEX idx_auditoria_usuario ON auditoria (id_usuario, fecha_hora DESC);
+CREATE INDEX idx_auditoria_datos_previos ON auditoria USING GIN (datos_previos jsonb_path_ops);
+CREATE INDEX idx_auditoria_datos_nuevos ON auditoria USING GIN (datos_nuevos jsonb_path_ops);
+
+COMMIT;
+
+ANALYZE acceso;
+ANALYZE auditoria;
@@ -0,0 +1,77 @@
+-- ============================================================
+-- 006 - Notificaciones de cambios para las cachés de cada proceso
+-- ============================================================
+-- Cada worker de gunicorn guarda en memoria el patio, el registro de placas,
+-- el índice de eventos y los contadores del dashboard. Estos triggers avisan
+-- por el canal 'smartcar_cambios' (pg_notify) de cada fila insertada,
+-- editada o borrada en vehiculo, persona, evento, acceso y alerta; el bus de
+-- core/services/bus_cambios.py escucha y ajusta solo lo afectado.
+--
+-- Postgres entrega la notificación al confirmar la transacción (nunca si se
+-- revierte). El payload lleva solo claves, no la fila completa (límite de
+-- 8000 bytes), más el application_name de quien hizo el cambio para que ese
+-- proceso no se aplique dos veces lo que ya aplicó tras su commit.
+--
+-- Requiere 005 (en acceso, particionada, el trigger se crea en cada partición
+-- actual y futura; por eso la tabla lógica va como primer argumento).
+
+CREATE OR REPLACE FUNCTION notificar_cambio() RETURNS TRIGGER AS $$
+DECLARE
+    tabla TEXT := TG_ARGV[0];
+    nueva JSONB;
+    anterior JSONB;
+    claves_nueva JSONB := '{}';
+    claves_anterior JSONB := '{}';
+    columna TEXT;
+BEGIN
+    IF TG_OP <> 'DELETE' THEN
+        nueva := to_jsonb(NEW);
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        anterior := to_jsonb(OLD);
+    END IF;
+    FOR i IN 1 .. TG_NARGS - 1 LOOP
+        columna := TG_ARGV[i];
+        IF nueva IS NOT NULL THEN
+            claves_nueva := claves_nueva || jsonb_build_object(columna, nueva -> columna);
+        END IF;
+        IF anterior IS NOT NULL THEN
+            claves_anterior := claves_anterior || jsonb_build_object(columna, anterior -> columna);
+        END IF;
+    END LOOP;
+
+    PERFORM pg_notify('smartcar_cambios', jsonb_build_object(
+        'tabla', tabla,
+        'op', TG_OP,
+        'origen', current_setting('application_name'),
+        'nueva', CASE WHEN nueva IS NULL THEN NULL ELSE claves_nueva END,
+        'anterior', CASE WHEN anterior IS NULL THEN NULL ELSE claves_anterior END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_notificar_vehiculo ON vehiculo;
+CREATE TRIGGER trg_notificar_vehiculo
+    AFTER INSERT OR UPDATE OR DELETE ON vehiculo
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio('vehiculo', 'id_vehiculo', 'placa', 'id_persona');
+
+DROP TRIGGER IF EXISTS trg_notificar_persona ON persona;
+CREATE TRIGGER trg_notificar_persona
+    AFTER UPDATE OR DELETE ON persona
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio('persona', 'id_persona');
+
+DROP TRIGGER IF EXISTS trg_notificar_evento ON evento;
+CREATE TRIGGER trg_notificar_evento
+    AFTER INSERT OR UPDATE OR DELETE ON evento
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio('evento', 'id_evento');
+
+DROP TRIGGER IF EXISTS trg_notificar_acceso ON acceso;
+CREATE TRIGGER trg_notificar_acceso
+    AFTER INSERT OR UPDATE OR DELETE ON acceso
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio('acceso', 'id_acceso', 'id_vehiculo', 'fecha_hora', 'hora_salida');
+
+DROP TRIGGER IF EXISTS trg_notificar_alerta ON alerta;
+CREATE TRIGGER trg_notificar_alerta
+    AFTER INSERT OR DELETE ON alerta
+    FOR EACH ROW EXECUTE FUNCTION notificar_cambio('alerta', 'id_alerta', 'tipo', 'severidad', 'id_acceso');
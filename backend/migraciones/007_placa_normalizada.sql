@@ -0,0 +1,73 @@
+-- ============================================================
+-- 007 - Placa normalizada (vehiculo.placa_norm)
+-- ============================================================
+-- placa_norm = placa en mayúsculas y sin separadores ('abc-123' -> 'ABC123'),
+-- la misma regla que normalizar_placa en core/services/registro_placas.py.
+--   - Búsquedas exactas (registro de placas, patio, buscar_placa_bd):
+--     v.placa_norm = %s sobre un índice único btree.
+--   - Búsqueda parcial (historial de accesos, exportaciones):
+--     v.placa_norm LIKE '%...%' sobre un índice trigram; reemplaza al
+--     índice trigram sobre placa de la migración 002.
+-- La escriben el modelo Vehiculo y los controladores del CRUD; el trigger la
+-- completa en cualquier otro INSERT/UPDATE (SQL a mano, cargas masivas).
+--
+-- Falla sin cambiar nada si dos placas quedan iguales al normalizarlas
+-- (p. ej. 'ABC-123' y 'ABC123'): hay que unificar esos vehículos antes.
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION normalizar_placa(placa TEXT) RETURNS TEXT AS $$
+    SELECT regexp_replace(upper(placa), '[^A-Z0-9]', '', 'g');
+$$ LANGUAGE sql IMMUTABLE STRICT;
+
+CREATE OR REPLACE FUNCTION completar_placa_norm() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        NEW.placa_norm := COALESCE(NEW.placa_norm, normalizar_placa(NEW.placa));
+    ELSIF NEW.placa IS DISTINCT FROM OLD.placa AND NEW.placa_norm IS NOT DISTINCT FROM OLD.placa_norm THEN
+        -- Cambió la placa sin enviar placa_norm
+        NEW.placa_norm := normalizar_placa(NEW.placa);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE vehiculo ADD COLUMN IF NOT EXISTS placa_norm VARCHAR(10);
+UPDATE vehiculo SET placa_norm = normalizar_placa(placa)
+WHERE placa_norm IS DISTINCT FROM normalizar_placa(placa);
+
+DO $$
+DECLARE
+    repetidas TEXT;
+BEGIN
+    SELECT string_agg(format('%s (%s)', placa_norm, placas), ', ')
+    INTO repetidas
+    FROM (
+        SELECT placa_norm, string_agg(placa, ' / ' ORDER BY placa) AS placas
+        FROM vehiculo
+        GROUP BY placa_norm
+        HAVING COUNT(*) > 1
+    ) r;
+    IF repetidas IS NOT NULL THEN
+        RAISE EXCEPTION 'Placas repetidas al normalizar: %', repetidas;
+    END IF;
+END;
+$$;
+
+ALTER TABLE vehiculo ALTER COLUMN placa_norm SET NOT NULL;
+
+DROP TRIGGER IF EXISTS trg_vehiculo_placa_norm ON vehiculo;
+CREATE TRIGGER trg_vehiculo_placa_norm
+    BEFORE INSERT OR UPDATE ON vehiculo
+    FOR EACH ROW EXECUTE FUNCTION completar_placa_norm();
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vehiculo_placa_norm ON vehiculo (placa_norm);
+CREATE INDEX IF NOT EXISTS idx_vehiculo_placa_norm_trgm
+    ON vehiculo USING gin (placa_norm gin_trgm_ops);
+DROP INDEX IF EXISTS idx_vehiculo_placa_trgm;
+
+COMMIT;
+
+ANALYZE vehiculo;
@@ -0,0 +1,50 @@
+-- ============================================================
+-- 008 - Importación masiva sin un aviso por fila
+-- ============================================================
+-- Requiere 006. La importación masiva (core/importacion_masiva.py) inserta o
+-- actualiza miles de personas y vehículos en una sola transacción. Con un
+-- aviso por fila, cada worker aplicaría miles de deltas y el canal SSE se
+-- desbordaría. La importación hace SET LOCAL smartcar.notificar = 'off' y,
+-- al terminar, envía un solo aviso {"tabla": "importacion"}; con él el bus
+-- de cambios recarga el registro de placas y el patio.
+
+CREATE OR REPLACE FUNCTION notificar_cambio() RETURNS TRIGGER AS $$
+DECLARE
+    tabla TEXT := TG_ARGV[0];
+    nueva JSONB;
+    anterior JSONB;
+    claves_nueva JSONB := '{}';
+    claves_anterior JSONB := '{}';
+    columna TEXT;
+BEGIN
+    -- Variable sin definir: NULL (segundo argumento = no fallar)
+    IF current_setting('smartcar.notificar', true) = 'off' THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP <> 'DELETE' THEN
+        nueva := to_jsonb(NEW);
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        anterior := to_jsonb(OLD);
+    END IF;
+    FOR i IN 1 .. TG_NARGS - 1 LOOP
+        columna := TG_ARGV[i];
+        IF nueva IS NOT NULL THEN
+            claves_nueva := claves_nueva || jsonb_build_object(columna, nueva -> columna);
+        END IF;
+        IF anterior IS NOT NULL THEN
+            claves_anterior := claves_anterior || jsonb_build_object(columna, anterior -> columna);
+        END IF;
+    END LOOP;
+
+    PERFORM pg_notify('smartcar_cambios', jsonb_build_object(
+        'tabla', tabla,
+        'op', TG_OP,
+        'origen', current_setting('application_name'),
+        'nueva', CASE WHEN nueva IS NULL THEN NULL ELSE claves_nueva END,
+        'anterior', CASE WHEN anterior IS NULL THEN NULL ELSE claves_anterior END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
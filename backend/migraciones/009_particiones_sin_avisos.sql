@@ -0,0 +1,53 @@
+-- ============================================================
+-- 009 - Mover filas entre particiones sin avisos por fila
+-- ============================================================
+-- Requiere 005 y 008. crear_particion_mensual pasa las filas del mes que
+-- cayeron en <tabla>_p_defecto a la partición nueva con DELETE ... RETURNING.
+-- El trigger de 006 está también en acceso_p_defecto, así que cada fila
+-- movida llegaba al bus de cambios como un DELETE: los workers la sacaban
+-- del patio y restaban del contador de accesos, aunque el acceso seguía ahí
+-- (en la partición nueva, que todavía no tiene el trigger al insertar).
+--
+-- Ahora el movimiento corre con smartcar.notificar = 'off' (como la
+-- importación masiva de 008) y, si se movió algo, se envía un solo aviso
+-- {"tabla": "particion"}; el bus recarga el patio y reconcilia contadores.
+
+CREATE OR REPLACE FUNCTION crear_particion_mensual(tabla TEXT, mes DATE) RETURNS TEXT AS $$
+DECLARE
+    inicio DATE := date_trunc('month', mes)::date;
+    fin DATE := (date_trunc('month', mes) + INTERVAL '1 month')::date;
+    nombre TEXT := format('%s_p%s', tabla, to_char(mes, 'YYYY_MM'));
+    defecto TEXT := tabla || '_p_defecto';
+    notificar TEXT := current_setting('smartcar.notificar', true);
+    movidas INTEGER := 0;
+BEGIN
+    IF to_regclass(nombre) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+    EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', nombre, tabla);
+    IF to_regclass(defecto) IS NOT NULL THEN
+        -- Solo durante el movimiento (tercer argumento = como SET LOCAL);
+        -- después se deja como estaba para el resto de la transacción
+        PERFORM set_config('smartcar.notificar', 'off', true);
+        EXECUTE format(
+            'WITH movidas AS (DELETE FROM %I WHERE fecha_hora >= %L AND fecha_hora < %L RETURNING *)
+             INSERT INTO %I SELECT * FROM movidas',
+            defecto, inicio, fin, nombre);
+        GET DIAGNOSTICS movidas = ROW_COUNT;
+        PERFORM set_config('smartcar.notificar', COALESCE(notificar, ''), true);
+    END IF;
+    EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   tabla, nombre, inicio, fin);
+
+    IF movidas > 0 THEN
+        PERFORM pg_notify('smartcar_cambios', jsonb_build_object(
+            'tabla', 'particion',
+            'op', 'MOVER',
+            'origen', current_setting('application_name'),
+            'nueva', jsonb_build_object('tabla', tabla, 'particion', nombre, 'filas', movidas),
+            'anterior', NULL
+        )::text);
+    END IF;
+    RETURN nombre;
+END;
+$$ LANGUAGE plpgsql;
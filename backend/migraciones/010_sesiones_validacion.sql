@@ -0,0 +1,31 @@
+-- ============================================================
+-- 010 - Sesiones de validación por ráfaga compartidas entre workers
+-- ============================================================
+-- Las sesiones de consenso (ocr/consenso.py) vivían en la memoria del worker
+-- que las creó; con varios workers de gunicorn en el mismo contenedor los
+-- frames se reparten entre ellos y la mitad recibía 404. Cada sesión es una
+-- fila: el frame toma la fila con SELECT ... FOR UPDATE (una decisión por
+-- sesión aunque lleguen dos frames a la vez a workers distintos) y guarda
+-- lecturas y decisión en la misma transacción que el acceso, así una
+-- decisión que se revierte tampoco queda memorizada.
+--
+-- UNLOGGED: son datos de segundos; tras una caída de Postgres la tabla
+-- queda vacía y la portería abre otra sesión.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS sesion_validacion (
+    id_sesion VARCHAR(32) PRIMARY KEY,
+    tipo_acceso VARCHAR(10),
+    id_vigilante INTEGER,
+    umbral REAL NOT NULL,
+    min_lecturas INTEGER NOT NULL,
+    max_frames INTEGER NOT NULL,
+    frames INTEGER NOT NULL DEFAULT 0,
+    lecturas JSONB NOT NULL DEFAULT '[]',
+    decision JSONB,
+    creada TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    ultima_actividad TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Purga de vencidas (models/sesion_validacion.py, al crear una sesión)
+CREATE INDEX IF NOT EXISTS idx_sesion_validacion_actividad
+    ON sesion_validacion (ultima_actividad);
@@ -1,26 +1,46 @@
 # backend/models/acceso.py
-from core.db.connection import get_connection
+from core.db.sesion import conexion_unidad, al_confirmar
+from core.services.ocupacion_patio import obtener_indice_patio, indice_disponible
+from core.services.registro_placas import buscar_vehiculo_por_placa, normalizar_placa
+from core.services.contadores import contador_sumar
+from core.services.tiempo_real import publicar_evento
+
+
+# Espacio de claves de los advisory locks por vehículo (primer entero de
+# pg_advisory_xact_lock(int, int); el segundo es el id_vehiculo)
+_LOCK_ENTRADA_VEHICULO = 7301191
+
+
+class AccesoDesactualizadoError(Exception):
+    """
+    La escritura no afectó filas: el estado de la placa cambió desde que se
+    consultó (otro proceso registró la entrada o la salida).
+    """
+
 
 def verificar_vehiculo_dentro(placa):
     """
-    Busca si hay un registro de esta placa que tenga fecha de entrada 
+    Busca si hay un registro de esta placa que tenga fecha de entrada
     pero NO tenga fecha de salida (hora_salida IS NULL).
+    Con el índice del patio cargado se responde desde memoria.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Buscamos la última entrada que tenga salida NULL (vacía)
-    sql = """
-        SELECT a.id_acceso 
-        FROM acceso a
-        JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
-        WHERE v.placa = %s AND a.hora_salida IS NULL
-    """
-    cur.execute(sql, (placa,))
-    resultado = cur.fetchone()
-    cur.close()
-    conn.close()
-    
+    if indice_disponible():
+        return obtener_indice_patio().id_acceso_abierto(placa)
+
+    with conexion_unidad() as conn:
+        cur = conn.cursor()
+
+        # Buscamos la última entrada que tenga salida NULL (vacía)
+        sql = """
+            SELECT a.id_acceso
+            FROM acceso a
+            JOIN vehiculo v ON a.id_vehiculo = v.id_vehiculo
+            WHERE v.placa_norm = %s AND a.hora_salida IS NULL
+        """
+        cur.execute(sql, (normalizar_placa(placa),))
+        resultado = cur.fetchone()
+        cur.close()
+
     if resultado:
         return resultado[0] # Retorna el ID del acceso pendiente
     return None
@@ -28,66 +48,104 @@ def verificar_vehiculo_dentro(placa):
 def registrar_salida_db(id_acceso):
     """
     Actualiza el registro existente poniendo la hora actual en hora_salida.
+    Dentro de una unidad de trabajo no confirma: lo hace la petición al final.
+    Lanza AccesoDesactualizadoError si el acceso ya estaba cerrado.
     """
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        # Actualizamos la hora de salida y el resultado
-        sql = """
-            UPDATE acceso 
-            SET hora_salida = CURRENT_TIMESTAMP, 
-                resultado = 'Salida Exitosa'
-            WHERE id_acceso = %s
-        """
-        cur.execute(sql, (id_acceso,))
-        conn.commit()
-        return True
+        with conexion_unidad() as conn:
+            cur = conn.cursor()
+            # Actualizamos la hora de salida y el resultado (solo si sigue abierto)
+            sql = """
+                UPDATE acceso
+                SET hora_salida = CURRENT_TIMESTAMP,
+                    resultado = 'Salida Exitosa'
+                WHERE id_acceso = %s AND hora_salida IS NULL
+                RETURNING hora_salida,
+                          (SELECT v.placa FROM vehiculo v WHERE v.id_vehiculo = acceso.id_vehiculo)
+            """
+            cur.execute(sql, (id_acceso,))
+            actualizados = cur.rowcount
+            fila = cur.fetchone()
+            cur.close()
     except Exception as e:
-        conn.rollback()
         print(f"Error registrando salida: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
+
+    if actualizados == 0:
+        raise AccesoDesactualizadoError(f"El acceso {id_acceso} ya tiene salida")
+    al_confirmar(lambda: obtener_indice_patio().marcar_salida(id_acceso))
+    publicar_evento("acceso", {
+        "movimiento": "salida", "id_acceso": id_acceso, "placa": fila[1],
+        "fecha_hora": fila[0], "resultado": "Salida Exitosa"
+    })
+    return True
 
 def registrar_entrada_db(placa, id_vigilante):
     """
     Crea un nuevo registro de acceso.
     CORREGIDO: No inserta id_persona (no existe en tabla acceso).
     CORREGIDO: Inserta id_punto (obligatorio).
+    Lanza AccesoDesactualizadoError si el vehículo ya tiene un acceso abierto.
     """
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        # 1. Obtener ID Vehiculo (validamos que exista)
-        cur.execute("SELECT id_vehiculo FROM vehiculo WHERE placa = %s", (placa,))
-        vehiculo = cur.fetchone()
-        
-        if not vehiculo:
-            return {"status": "error", "mensaje": "Vehículo no registrado"}
-
-        id_vehiculo = vehiculo[0]
-        
-        # DEFINICIÓN DE PUNTO DE CONTROL
-        # Según tu SQL: id_punto 1 = 'Entrada'
-        ID_PUNTO_ENTRADA = 1 
-
-        # 2. Insertar Entrada
-        # Eliminamos 'id_persona' de la lista de columnas
-        # Agregamos 'id_punto'
-        sql = """
-            INSERT INTO acceso (id_vehiculo, id_punto, id_vigilante, fecha_hora, resultado, hora_salida)
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, 'Acceso Concedido - Entrada', NULL)
-        """
-        
-        cur.execute(sql, (id_vehiculo, ID_PUNTO_ENTRADA, id_vigilante))
-        conn.commit()
-        
-        return {"status": "ok", "mensaje": "Entrada registrada"}
+        with conexion_unidad() as conn:
+            cur = conn.cursor()
+            # 1. Obtener ID Vehiculo (validamos que exista) desde el registro de
+            #    placas: las desconocidas se descartan sin consultar la BD
+            vehiculo = buscar_vehiculo_por_placa(placa)
+
+            if not vehiculo:
+                cur.close()
+                return {"status": "error", "mensaje": "Vehículo no registrado"}
+
+            id_vehiculo = vehiculo["id_vehiculo"]
+            tipo, color, propietario = vehiculo["tipo"], vehiculo["color"], vehiculo["propietario"]
+
+            # DEFINICIÓN DE PUNTO DE CONTROL
+            # Según tu SQL: id_punto 1 = 'Entrada'
+            ID_PUNTO_ENTRADA = 1
+
+            # 2. Insertar Entrada, solo si el vehículo no tiene otra abierta.
+            # El NOT EXISTS solo no alcanza en READ COMMITTED: dos entradas
+            # simultáneas (dos porterías, un reintento) no ven la fila de la
+            # otra y ambas insertan. Un índice UNIQUE parcial no sirve en la
+            # tabla particionada (tendría que incluir fecha_hora), así que se
+            # serializan por vehículo con un advisory lock de transacción: la
+            # segunda espera al commit de la primera y su INSERT (que toma
+            # snapshot después) ya ve el acceso abierto.
+            cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (_LOCK_ENTRADA_VEHICULO, vehiculo["id_vehiculo"]))
+            # Eliminamos 'id_persona' de la lista de columnas
+            # Agregamos 'id_punto'
+            sql = """
+                INSERT INTO acceso (id_vehiculo, id_punto, id_vigilante, fecha_hora, resultado, hora_salida)
+                SELECT %s, %s, %s, CURRENT_TIMESTAMP, 'Acceso Concedido - Entrada', NULL
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM acceso WHERE id_vehiculo = %s AND hora_salida IS NULL
+                )
+                RETURNING id_acceso, fecha_hora
+            """
+
+            cur.execute(sql, (id_vehiculo, ID_PUNTO_ENTRADA, id_vigilante, id_vehiculo))
+            fila = cur.fetchone()
+            cur.close()
     except Exception as e:
-        conn.rollback()
         print(f"Error SQL registrar_entrada: {e}")
         return {"status": "error", "mensaje": str(e)}
-    finally:
-        cur.close()
-        conn.close()
+
+    if fila is None:
+        raise AccesoDesactualizadoError(f"La placa {placa} ya tiene una entrada abierta")
+
+    id_acceso, hora_entrada = fila
+    datos_patio = {
+        "placa": placa, "tipo": tipo, "color": color, "propietario": propietario,
+        "hora_entrada": hora_entrada, "id_acceso": id_acceso, "id_vehiculo": id_vehiculo,
+        "ultima_accion": "Entrada"
+    }
+    al_confirmar(lambda: obtener_indice_patio().marcar_entrada(datos_patio))
+    contador_sumar("accesos")
+    publicar_evento("acceso", {
+        "movimiento": "entrada", "id_acceso": id_acceso, "placa": placa, "tipo": tipo,
+        "fecha_hora": hora_entrada, "resultado": "Acceso Concedido - Entrada",
+        "id_vigilante": id_vigilante
+    })
+    return {"status": "ok", "mensaje": "Entrada registrada", "id_acceso": id_acceso}
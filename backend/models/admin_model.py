@@ -1,27 +1,14 @@
 from core.db.connection import get_connection
+from core.services.contadores import obtener_contadores
 
 def obtener_datos_dashboard():
-    """Resumen de datos generales para administrador"""
+    """Resumen de datos generales para administrador (contadores en memoria)"""
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-
-        cur.execute("SELECT COUNT(*) FROM vehiculo;")
-        total_vehiculos = cur.fetchone()[0]
-
-        cur.execute("SELECT COUNT(*) FROM acceso;")
-        total_accesos = cur.fetchone()[0]
-
-        cur.execute("SELECT COUNT(*) FROM alerta;")
-        total_alertas = cur.fetchone()[0]
-
-        cur.close()
-        conn.close()
-
+        contadores = obtener_contadores()
         return {
-            "total_vehiculos": total_vehiculos,
-            "total_accesos": total_accesos,
-            "total_alertas": total_alertas
+            "total_vehiculos": contadores["vehiculos"],
+            "total_accesos": contadores["accesos"],
+            "total_alertas": contadores["alertas"]
         }
 
     except Exception as e:
@@ -1,49 +1,65 @@
 # backend/models/auditoria.py
 import sys
 import os
+import json
 from psycopg2.extras import RealDictCursor
 
 # Asegurar que la ruta 'backend' esté en sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from core.db.connection import get_connection
+from core.db.connection import get_connection, conexion
+from core.controller_accesos import codificar_cursor, decodificar_cursor, limite_rango_fecha
+
+AUDITORIA_LIMITE_DEFECTO = int(os.getenv("AUDITORIA_LIMITE_DEFECTO", "50"))
+AUDITORIA_LIMITE_MAX = int(os.getenv("AUDITORIA_LIMITE_MAX", "500"))
+
+# Columnas comunes; fecha_hora sale tal cual (el formato lo pone quien la muestra)
+_COLUMNAS = """
+    a.id_auditoria,
+    a.fecha_hora,
+    u.nombre AS nombre_vigilante,
+    a.entidad,
+    a.id_entidad,
+    a.accion,
+    a.datos_previos,
+    a.datos_nuevos,
+    a.id_usuario
+"""
+
+
+def _serializar(fila):
+    fila = dict(fila)
+    fila["fecha_hora"] = fila["fecha_hora"].isoformat() if fila["fecha_hora"] else None
+    return fila
+
 
 def obtener_historial_auditoria():
     """
-    Obtiene todos los registros del historial de auditoría.
-    SOLUCIÓN DE HORA: Usamos TO_CHAR para formatear la fecha directamente desde la BD.
+    Obtiene todos los registros del historial de auditoría (formato anterior:
+    lista completa; solo para scripts). /api/admin/auditoria usa
+    obtener_auditoria_paginada.
     """
     conn = None
     try:
         conn = get_connection()
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # --- AQUÍ ESTÁ EL CAMBIO CLAVE (TO_CHAR) ---
-        query = """
-            SELECT 
-                a.id_auditoria,
-                TO_CHAR(a.fecha_hora, 'YYYY-MM-DD HH12:MI:SS AM') as fecha_hora, -- Formato fijo texto
-                u.nombre AS nombre_vigilante,
-                a.entidad,
-                a.id_entidad,
-                a.accion,
-                a.datos_previos,
-                a.datos_nuevos,
-                a.id_usuario
-            FROM 
+
+        query = f"""
+            SELECT {_COLUMNAS}
+            FROM
                 auditoria a
-            LEFT JOIN 
+            LEFT JOIN
                 tmusuarios u ON a.id_usuario = u.nu
-            ORDER BY 
-                a.fecha_hora DESC;
+            ORDER BY
+                a.fecha_hora DESC, a.id_auditoria DESC;
         """
-        
+
         cur.execute(query)
-        historial = cur.fetchall()
-        
+        historial = [_serializar(fila) for fila in cur.fetchall()]
+
         cur.close()
         return historial
-        
+
     except Exception as e:
         print(f"❌ Error en models/auditoria.py: {e}")
         raise e
@@ -51,6 +67,117 @@ def obtener_historial_auditoria():
         if conn:
             conn.close()
 
+
+# ==========================================================
+# HISTORIAL PAGINADO Y FILTRADO
+# ==========================================================
+def _valor_json(valor):
+    """'5' -> 5, 'true' -> True, '"x"' -> 'x'; cualquier otra cosa queda como texto."""
+    try:
+        return json.loads(valor)
+    except (TypeError, ValueError):
+        return valor
+
+
+def _filtros_auditoria(filtros):
+    """WHERE y parámetros; cada condición tiene índice en la migración 004."""
+    condiciones = []
+    params = []
+    # Entidad y acción se guardan con mayúsculas mixtas ('vehiculo', 'EVENTO')
+    if filtros.get("entidad"):
+        condiciones.append("lower(a.entidad) = %s")
+        params.append(filtros["entidad"].lower())
+    if filtros.get("accion"):
+        condiciones.append("lower(a.accion) = %s")
+        params.append(filtros["accion"].lower())
+    for campo in ("id_usuario", "id_entidad"):
+        if filtros.get(campo) not in (None, ""):
+            try:
+                params.append(int(filtros[campo]))
+            except (TypeError, ValueError):
+                raise ValueError(f"{campo} debe ser numérico")
+            condiciones.append(f"a.{campo} = %s")
+    if filtros.get("desde"):
+        condiciones.append("a.fecha_hora >= %s")
+        params.append(limite_rango_fecha(filtros["desde"]))
+    if filtros.get("hasta"):
+        condiciones.append("a.fecha_hora < %s")
+        params.append(limite_rango_fecha(filtros["hasta"], es_hasta=True))
+
+    # Búsqueda clave/valor dentro de los datos (contención jsonb, índice GIN)
+    if filtros.get("clave"):
+        if filtros.get("valor") in (None, ""):
+            raise ValueError("La búsqueda por clave requiere 'valor'")
+        contenido = json.dumps({filtros["clave"]: _valor_json(filtros["valor"])})
+        en = filtros.get("en") or "ambos"
+        if en not in ("previos", "nuevos", "ambos"):
+            raise ValueError("en debe ser 'previos', 'nuevos' o 'ambos'")
+        columnas = ["datos_previos", "datos_nuevos"] if en == "ambos" else [f"datos_{en}"]
+        condiciones.append("(" + " OR ".join(f"a.{c} @> %s::jsonb" for c in columnas) + ")")
+        params.extend([contenido] * len(columnas))
+    return condiciones, params
+
+
+def obtener_auditoria_paginada(filtros=None, limite=None, cursor=None, total=None):
+    """
+    Una página de la auditoría, de la más reciente a la más antigua.
+    Filtros: entidad, accion, id_usuario, id_entidad, desde, hasta y
+    clave/valor (en = previos | nuevos | ambos) sobre los datos JSON.
+    `cursor` es el 'siguiente_cursor' de la página anterior; `total` puede
+    ser 'exacto' o 'estimado' como en el historial de accesos.
+    Lanza ValueError si algún parámetro es inválido.
+    """
+    filtros = filtros or {}
+    try:
+        limite = min(max(int(limite or AUDITORIA_LIMITE_DEFECTO), 1), AUDITORIA_LIMITE_MAX)
+    except ValueError:
+        raise ValueError("limite debe ser numérico")
+    if total not in (None, "", "exacto", "estimado"):
+        raise ValueError("total debe ser 'exacto' o 'estimado'")
+
+    condiciones, params = _filtros_auditoria(filtros)
+    where_filtros = "".join(f" AND {c}" for c in condiciones)
+    where_pagina = where_filtros
+    params_pagina = list(params)
+    if cursor:
+        where_pagina += " AND (a.fecha_hora, a.id_auditoria) < (%s, %s)"
+        params_pagina.extend(decodificar_cursor(cursor))
+
+    with conexion() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT {_COLUMNAS}
+                FROM auditoria a
+                LEFT JOIN tmusuarios u ON a.id_usuario = u.nu
+                WHERE 1=1 {where_pagina}
+                ORDER BY a.fecha_hora DESC, a.id_auditoria DESC
+                LIMIT %s
+            """, tuple(params_pagina) + (limite + 1,))
+            filas = cur.fetchall()
+
+            cantidad = None
+            if total == "exacto":
+                cur.execute(f"SELECT COUNT(*) AS n FROM auditoria a WHERE 1=1 {where_filtros}", tuple(params))
+                cantidad = cur.fetchone()["n"]
+            elif total == "estimado":
+                cur.execute(f"EXPLAIN (FORMAT JSON) SELECT 1 FROM auditoria a WHERE 1=1 {where_filtros}", tuple(params))
+                plan = cur.fetchone()["QUERY PLAN"]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                cantidad = int(plan[0]["Plan"]["Plan Rows"])
+
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+    return {
+        "datos": [_serializar(fila) for fila in filas],
+        "limite": limite,
+        "siguiente_cursor": codificar_cursor(filas[-1]["fecha_hora"], filas[-1]["id_auditoria"]) if hay_mas else None,
+        "hay_mas": hay_mas,
+        "total": cantidad,
+        "total_modo": total or None
+    }
+
+
 if __name__ == "__main__":
     try:
         print("Probando obtener_historial_auditoria...")
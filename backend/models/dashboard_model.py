@@ -1,4 +1,6 @@
 from core.db.connection import get_connection
+from core.services.contadores import obtener_contadores
+from core.services.registro_placas import normalizar_placa
 
 # ✅ 1. Obtener los últimos 7 accesos registrados
 def obtener_ultimos_accesos():
@@ -37,32 +39,18 @@ def obtener_ultimos_accesos():
 # ✅ 2. Contar total de vehículos registrados
 def contar_total_vehiculos():
     try:
-        connection = get_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM vehiculo;")
-            total = cursor.fetchone()[0]
-            return {"total": total}
+        return {"total": obtener_contadores()["vehiculos"]}
     except Exception as ex:
         print(f"❌ Error en contar_total_vehiculos: {ex}")
         return {"total": 0}
-    finally:
-        if connection:
-            connection.close()
 
 # ✅ 3. Contar total de alertas activas
 def contar_alertas_activas():
     try:
-        connection = get_connection()
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) FROM alerta;")
-            total = cursor.fetchone()[0]
-            return {"total": total}
+        return {"total": obtener_contadores()["alertas"]}
     except Exception as ex:
         print(f"❌ Error en contar_alertas_activas: {ex}")
         return {"total": 0}
-    finally:
-        if connection:
-            connection.close()
 
 # ✅ 4. Buscar un vehículo por su placa
 def buscar_placa_bd(placa):
@@ -77,8 +65,8 @@ def buscar_placa_bd(placa):
                     p.nombre AS propietario
                 FROM vehiculo v
                 INNER JOIN persona p ON v.id_persona = p.id_persona
-                WHERE v.placa ILIKE %s;
-            """, (placa,))
+                WHERE v.placa_norm = %s;
+            """, (normalizar_placa(placa),))
             result = cursor.fetchone()
             if result:
                 return {
@@ -0,0 +1,83 @@
+# backend/models/sesion_validacion.py
+# Sesiones de validación por ráfaga en la BD (migración 010), visibles para
+# todos los workers de gunicorn. La votación es ocr/consenso.py.
+
+import json
+
+from psycopg2.extras import Json, RealDictCursor
+
+from core.db.sesion import conexion_unidad
+from ocr.consenso import CONSENSO_TTL_SEGUNDOS, SesionConsenso
+
+
+def _json(valor):
+    return Json(valor, dumps=lambda v: json.dumps(v, default=str))
+
+
+def crear_sesion(tipo_acceso=None, vigilante_id=None):
+    """Crea la sesión (y de paso descarta las vencidas)."""
+    sesion = SesionConsenso(tipo_acceso, vigilante_id)
+    with conexion_unidad() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM sesion_validacion
+                WHERE ultima_actividad < NOW() - make_interval(secs => %s)
+            """, (CONSENSO_TTL_SEGUNDOS,))
+            cur.execute("""
+                INSERT INTO sesion_validacion (id_sesion, tipo_acceso, id_vigilante, umbral, min_lecturas, max_frames)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (sesion.id, sesion.tipo_acceso, sesion.vigilante_id,
+                  sesion.umbral, sesion.min_lecturas, sesion.max_frames))
+    return sesion
+
+
+def obtener_sesion(id_sesion, bloquear=False):
+    """
+    Sesión vigente o None. bloquear=True toma la fila (FOR UPDATE) hasta el
+    fin de la transacción: así dos frames de la misma ráfaga, aunque los
+    atiendan workers distintos, no deciden dos veces.
+    """
+    with conexion_unidad() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(f"""
+                SELECT id_sesion, tipo_acceso, id_vigilante, umbral, min_lecturas, max_frames,
+                       frames, lecturas, decision
+                FROM sesion_validacion
+                WHERE id_sesion = %s
+                  AND ultima_actividad >= NOW() - make_interval(secs => %s)
+                {"FOR UPDATE" if bloquear else ""}
+            """, (id_sesion, CONSENSO_TTL_SEGUNDOS))
+            fila = cur.fetchone()
+    return SesionConsenso.desde_fila(fila) if fila else None
+
+
+def guardar_sesion(sesion):
+    """Lecturas y decisión; se confirman junto con el acceso que se haya registrado."""
+    with conexion_unidad() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE sesion_validacion
+                SET frames = %s, lecturas = %s, decision = %s, ultima_actividad = NOW()
+                WHERE id_sesion = %s
+            """, (sesion.frames, _json(sesion.lecturas),
+                  _json(list(sesion.decision)) if sesion.decision else None, sesion.id))
+
+
+def eliminar_sesion(id_sesion):
+    with conexion_unidad() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM sesion_validacion WHERE id_sesion = %s", (id_sesion,))
+
+
+def estadisticas_consenso():
+    try:
+        with conexion_unidad() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT COUNT(*) FROM sesion_validacion
+                    WHERE ultima_actividad >= NOW() - make_interval(secs => %s)
+                """, (CONSENSO_TTL_SEGUNDOS,))
+                return {"sesiones_activas": cur.fetchone()[0]}
+    except Exception as e:
+        print(f"❌ Error contando sesiones de validación: {e}")
+        return {"sesiones_activas": None}
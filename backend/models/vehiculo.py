@@ -1,13 +1,19 @@
 # backend/models/vehiculo.py
-from core.db.connection import get_connection
+from psycopg2 import errors
+
+from core.db.sesion import conexion_unidad
+from core.services.registro_placas import placa_registrada_agregada, normalizar_placa
+from core.services.contadores import contador_sumar
 
 class Vehiculo:
-    def __init__(self, id_vehiculo, placa, tipo, color, id_persona):
+    def __init__(self, id_vehiculo, placa, tipo, color, id_persona, placa_norm=None):
         """
         Clase que representa un Vehículo.
+        placa_norm se deriva siempre de placa (se acepta para construir desde SELECT *).
         """
         self.id_vehiculo = id_vehiculo
         self.placa = placa.upper()
+        self.placa_norm = normalizar_placa(self.placa)
         self.tipo = tipo          # 'Automovil', 'Motocicleta'
         self.color = color
         self.id_persona = id_persona  # Clave foránea a Persona
@@ -45,23 +51,29 @@ def registrar_vehiculo_invitado_db(placa):
     Registra un vehículo automáticamente asignado a la persona genérica (ID 9999).
     Tipo: 'Invitado', Color: 'Sin especificar'.
     Requiere que hayas ejecutado el SQL para crear la persona 9999.
+    Participa en la unidad de trabajo de la petición si existe.
     """
-    conn = get_connection()
-    cur = conn.cursor()
     try:
-        # ID 9999 es el usuario 'INVITADO EVENTO'
-        sql = """
-            INSERT INTO vehiculo (placa, tipo, color, id_persona)
-            VALUES (%s, 'Invitado', 'Sin especificar', 9999)
-            RETURNING id_vehiculo
-        """
-        cur.execute(sql, (placa.upper(),))
-        conn.commit()
+        with conexion_unidad() as conn:
+            cur = conn.cursor()
+            # ID 9999 es el usuario 'INVITADO EVENTO'
+            sql = """
+                INSERT INTO vehiculo (placa, placa_norm, tipo, color, id_persona)
+                VALUES (%s, %s, 'Invitado', 'Sin especificar', 9999)
+                RETURNING id_vehiculo
+            """
+            cur.execute(sql, (placa.upper(), normalizar_placa(placa)))
+            cur.close()
+        # Ya, no tras el commit: la entrada del invitado se registra en la misma petición
+        placa_registrada_agregada(placa)
+        contador_sumar("vehiculos")
+        return True
+    except errors.UniqueViolation:
+        # Otro worker (u otra petición) la registró entre la consulta y el
+        # INSERT: el savepoint ya deshizo solo este intento y la placa existe
+        print(f"⚠️  La placa {placa} ya estaba registrada; se usa el vehículo existente")
+        placa_registrada_agregada(placa)
         return True
     except Exception as e:
-        conn.rollback()
         print(f"❌ Error registrando vehículo invitado: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
@@ -0,0 +1,226 @@
+# backend/ocr/benchmark.py
+# Banco de pruebas del OCR sobre un corpus etiquetado.
+#
+#   python -m ocr.benchmark [carpeta] [--etiquetas CSV] [--motor tesseract|easyocr]
+#                           [--repeticiones N] [--workers 0,1,2,4] [--salida resultado.json]
+#
+# El corpus es una carpeta de imágenes con un CSV "archivo,placa" (por defecto
+# img_placas/etiquetas.csv). Reporta:
+#   - latencia por etapa (decodificación, localización, preprocesamiento,
+#     OCR y limpieza con regex), medida recorriendo la cascada paso a paso
+#   - precisión exacta y latencia de detectar_placa_detalle de punta a punta
+#   - frames por segundo del pool OCR con distintos números de trabajadores
+# La salida JSON tiene claves estables para poder comparar corridas (p. ej. en CI);
+# solo CPU y Python estándar, sin GPU.
+
+import argparse
+import csv
+import json
+import os
+import platform
+import statistics
+import time
+
+from ocr import detector, motores
+from ocr.localizacion import localizar_placas
+from ocr.preprocesamiento import ORDEN_PASADAS, PASADAS
+
+CARPETA_POR_DEFECTO = os.path.join(os.path.dirname(__file__), "img_placas")
+EXTENSIONES = (".jpg", ".jpeg", ".png")
+
+
+def cargar_corpus(carpeta, ruta_etiquetas=None):
+    """[(nombre, bytes, placa_esperada | None), ...] ordenado por nombre."""
+    ruta_etiquetas = ruta_etiquetas or os.path.join(carpeta, "etiquetas.csv")
+    etiquetas = {}
+    if os.path.exists(ruta_etiquetas):
+        with open(ruta_etiquetas, newline="", encoding="utf-8") as f:
+            for fila in csv.DictReader(f):
+                etiquetas[fila["archivo"].strip()] = fila["placa"].strip().upper()
+
+    corpus = []
+    for nombre in sorted(os.listdir(carpeta)):
+        if nombre.lower().endswith(EXTENSIONES):
+            with open(os.path.join(carpeta, nombre), "rb") as f:
+                corpus.append((nombre, f.read(), etiquetas.get(nombre)))
+    return corpus
+
+
+def _resumen(muestras_ms):
+    if not muestras_ms:
+        return {"n": 0}
+    ordenadas = sorted(muestras_ms)
+    return {
+        "n": len(ordenadas),
+        "media_ms": round(statistics.fmean(ordenadas), 3),
+        "p50_ms": round(ordenadas[len(ordenadas) // 2], 3),
+        "p95_ms": round(ordenadas[min(int(len(ordenadas) * 0.95), len(ordenadas) - 1)], 3),
+        "max_ms": round(ordenadas[-1], 3),
+    }
+
+
+def _cronometrar(etapas, nombre, funcion, *args):
+    inicio = time.perf_counter()
+    resultado = funcion(*args)
+    etapas.setdefault(nombre, []).append((time.perf_counter() - inicio) * 1000)
+    return resultado
+
+
+# ===========================================================
+# 1. Latencia por etapa
+# ===========================================================
+def medir_etapas(corpus, repeticiones):
+    """
+    Repite a mano el camino del detector (localización + cascada) midiendo
+    cada etapa por separado. Se detiene en la primera lectura válida, igual
+    que la cascada, sin presupuesto de tiempo.
+    """
+    motor = motores.obtener_motor()
+    etapas = {}
+    for _ in range(repeticiones):
+        for _, datos, _ in corpus:
+            img = _cronometrar(etapas, "decodificar", detector.decodificar_imagen, datos)
+            candidatos = _cronometrar(etapas, "localizar", localizar_placas, img)
+            regiones = [c["recorte"] for c in candidatos] or [img]
+            for nombre in ORDEN_PASADAS:
+                valida = False
+                for region in regiones:
+                    binaria = _cronometrar(etapas, f"preprocesar.{nombre}", PASADAS[nombre], region)
+                    etapas.setdefault("preprocesar", []).append(etapas[f"preprocesar.{nombre}"][-1])
+                    try:
+                        texto, _ = _cronometrar(etapas, "ocr", motor.leer_texto, binaria)
+                    except Exception as e:
+                        print(f"❌ Error en OCR: {e}")
+                        texto = ""
+                    placas = _cronometrar(
+                        etapas, "limpiar_regex",
+                        lambda t: [detector.limpiar_texto_placa(l) for l in t.splitlines()], texto or ""
+                    )
+                    if any(detector.es_placa_valida(p) for p in placas):
+                        valida = True
+                        break
+                if valida:
+                    break
+    return {nombre: _resumen(muestras) for nombre, muestras in etapas.items()}
+
+
+# ===========================================================
+# 2. Precisión de punta a punta
+# ===========================================================
+def medir_precision(corpus, repeticiones):
+    imagenes = []
+    tiempos = []
+    aciertos = 0
+    etiquetadas = 0
+    for nombre, datos, esperada in corpus:
+        lecturas = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            detalle = detector.detectar_placa_detalle(datos)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            lecturas.append(detalle)
+        detalle = lecturas[-1]
+        correcta = None
+        if esperada is not None:
+            etiquetadas += 1
+            correcta = detalle.get("placa") == esperada
+            aciertos += int(correcta)
+        imagenes.append({
+            "archivo": nombre,
+            "esperada": esperada,
+            "leida": detalle.get("placa"),
+            "correcta": correcta,
+            "pasada": detalle.get("pasada"),
+            "confianza": detalle.get("confianza"),
+            "candidatos": detalle.get("candidatos"),
+            "error": detalle.get("error"),
+        })
+    return {
+        "etiquetadas": etiquetadas,
+        "aciertos": aciertos,
+        "precision_exacta": round(aciertos / etiquetadas, 4) if etiquetadas else None,
+        "latencia": _resumen(tiempos),
+        "imagenes": imagenes,
+    }
+
+
+# ===========================================================
+# 3. Rendimiento del pool con N trabajadores
+# ===========================================================
+def medir_rendimiento(corpus, lista_workers, repeticiones):
+    from ocr.trabajadores import PoolOCR
+
+    trabajos = [datos for _, datos, _ in corpus] * repeticiones
+    resultados = []
+    if not trabajos:
+        return resultados
+    for workers in lista_workers:
+        pool = PoolOCR(workers=workers, cola_max=len(trabajos), timeout=600)
+        try:
+            # Calentamiento: arranque de procesos y carga del motor fuera de la medición
+            pool.esperar_detalle(pool.enviar(trabajos[0]))
+            inicio = time.perf_counter()
+            futuros = [pool.enviar(datos) for datos in trabajos]
+            for futuro in futuros:
+                pool.esperar_detalle(futuro)
+            segundos = time.perf_counter() - inicio
+        finally:
+            pool.cerrar()
+        resultados.append({
+            "workers": workers,
+            "frames": len(trabajos),
+            "segundos": round(segundos, 3),
+            "frames_por_segundo": round(len(trabajos) / segundos, 2) if segundos else None,
+        })
+    return resultados
+
+
+def ejecutar(carpeta, etiquetas=None, repeticiones=3, lista_workers=(0, 1, 2)):
+    corpus = cargar_corpus(carpeta, etiquetas)
+    motor = motores.obtener_motor()
+    return {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "maquina": {"python": platform.python_version(), "plataforma": platform.platform(), "cpus": os.cpu_count()},
+        "motor": motor.nombre,
+        "pasadas": list(ORDEN_PASADAS),
+        "corpus": {"carpeta": carpeta, "imagenes": len(corpus)},
+        "repeticiones": repeticiones,
+        "etapas": medir_etapas(corpus, repeticiones),
+        "precision": medir_precision(corpus, repeticiones),
+        "rendimiento": medir_rendimiento(corpus, lista_workers, repeticiones),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del OCR de placas")
+    parser.add_argument("carpeta", nargs="?", default=CARPETA_POR_DEFECTO)
+    parser.add_argument("--etiquetas", help="CSV archivo,placa (por defecto <carpeta>/etiquetas.csv)")
+    parser.add_argument("--motor", choices=sorted(motores.MOTORES), help="Motor OCR (por defecto OCR_MOTOR)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--workers", default="0,1,2", help="Números de trabajadores a probar, separados por coma")
+    parser.add_argument("--salida", help="Ruta del JSON de resultados")
+    args = parser.parse_args()
+
+    if args.motor:
+        # Los trabajadores (spawn) leen OCR_MOTOR del entorno al importar
+        os.environ["OCR_MOTOR"] = args.motor
+        motores.OCR_MOTOR = args.motor
+
+    lista_workers = [int(w) for w in args.workers.split(",") if w.strip()]
+    resultado = ejecutar(args.carpeta, args.etiquetas, args.repeticiones, lista_workers)
+
+    print(f"\n--- BENCHMARK OCR ({resultado['motor']}, {resultado['corpus']['imagenes']} imágenes) ---")
+    for etapa, datos in resultado["etapas"].items():
+        if datos["n"]:
+            print(f"{etapa:32} media {datos['media_ms']:8.2f} ms | p95 {datos['p95_ms']:8.2f} ms | n={datos['n']}")
+    precision = resultado["precision"]
+    print(f"Precisión exacta: {precision['aciertos']}/{precision['etiquetadas']}")
+    for img in precision["imagenes"]:
+        print(f"  {img['archivo']}: esperada={img['esperada']} leída={img['leida']} pasada={img['pasada']}")
+    for fila in resultado["rendimiento"]:
+        print(f"Workers={fila['workers']}: {fila['frames_por_segundo']} frames/s ({fila['frames']} frames)")
+
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print("Resultados guardados en", args.salida)
@@ -0,0 +1,197 @@
+# backend/ocr/cache.py
+# Caché de resultados OCR por hash perceptual de la placa localizada.
+# Un carro detenido en la talanquera o un doble clic del vigilante reenvían
+# casi el mismo frame; si el hash de su placa está a poca distancia de
+# Hamming de uno reciente, se devuelve la placa ya leída sin pasar por el
+# pool OCR.
+# Un acierto equivocado registra el acceso de otro vehículo, así que solo se
+# acepta un frame casi idéntico: la clave junta el dHash de la escena (debe
+# coincidir a 0-1 bits) y una huella binaria del recorte de la placa
+# (ocr/localizacion) a 96x24, donde cada carácter ocupa unas 16 columnas:
+# cambiar un solo carácter mueve decenas de bits. Un dHash chico de la placa
+# no sirve: a 16x8 'ABC123' y 'ABC128' dan el mismo hash. Si el carro se
+# movió un poco, la huella cambia y se vuelve a leer (un fallo es barato).
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from ocr.localizacion import localizar_placas
+
+OCR_CACHE_ACTIVA = os.getenv("OCR_CACHE_ACTIVA", "1") == "1"
+# Entradas guardadas (LRU)
+OCR_CACHE_TAMANO = int(os.getenv("OCR_CACHE_TAMANO", "128"))
+# Vigencia de una entrada: pasado este tiempo el carro pudo haber cambiado
+OCR_CACHE_TTL_SEGUNDOS = float(os.getenv("OCR_CACHE_TTL_SEGUNDOS", "10"))
+# Bits distintos tolerados en el dHash de la escena (de 64)
+OCR_CACHE_DISTANCIA = int(os.getenv("OCR_CACHE_DISTANCIA", "1"))
+# Bits distintos tolerados en la huella de la placa (de 2304; un carácter
+# distinto cambia más de 30)
+OCR_CACHE_DISTANCIA_PLACA = int(os.getenv("OCR_CACHE_DISTANCIA_PLACA", "4"))
+
+# Tamaño de la huella binaria del recorte (proporción de placa, 4:1)
+ANCHO_HUELLA, ALTO_HUELLA = 96, 24
+
+
+def _dhash(gris, ancho=8, alto=8):
+    muestra = cv2.resize(gris, (ancho + 1, alto), interpolation=cv2.INTER_AREA)
+    # Cada bit: ¿el píxel es más claro que su vecino de la derecha?
+    bits = (muestra[:, 1:] > muestra[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def huella_placa(recorte):
+    """Recorte BGR -> bits de la placa binarizada (Otsu) a ANCHO_HUELLA x ALTO_HUELLA."""
+    gris = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY) if recorte.ndim == 3 else recorte
+    muestra = cv2.resize(gris, (ANCHO_HUELLA, ALTO_HUELLA), interpolation=cv2.INTER_AREA)
+    _, binaria = cv2.threshold(muestra, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return int.from_bytes(np.packbits(binaria.flatten() > 0).tobytes(), "big")
+
+
+def hash_perceptual(datos):
+    """
+    Clave del frame (bytes JPEG/PNG): (dHash de 64 bits de la escena,
+    huella_placa del recorte de la placa mejor puntuada). Decodifica a la
+    mitad de resolución: la localización trabaja a 640 px de ancho de todos
+    modos. Retorna None si los bytes no son una imagen o no se localiza una
+    placa (sin placa no hay nada que reutilizar).
+    """
+    arreglo = np.frombuffer(memoryview(datos), dtype=np.uint8)
+    img = cv2.imdecode(arreglo, cv2.IMREAD_REDUCED_COLOR_2)
+    if img is None:
+        return None
+    candidatos = localizar_placas(img, max_candidatos=1)
+    if not candidatos:
+        return None
+    escena = _dhash(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+    return escena, huella_placa(candidatos[0]["recorte"])
+
+
+class CacheOCR:
+    def __init__(self, tamano=OCR_CACHE_TAMANO, ttl=OCR_CACHE_TTL_SEGUNDOS, distancia=OCR_CACHE_DISTANCIA,
+                 distancia_placa=OCR_CACHE_DISTANCIA_PLACA):
+        self.tamano = max(tamano, 1)
+        self.ttl = ttl
+        self.distancia = distancia
+        self.distancia_placa = distancia_placa
+        self._entradas = OrderedDict()     # (escena, placa) -> (guardado_en, detalle)
+        self._lock = threading.Lock()
+
+        # Métricas
+        self._aciertos = 0
+        self._aciertos_aproximados = 0
+        self._fallos = 0
+
+    def cercanas(self, clave, otra):
+        """¿Las dos claves (escena, placa) son del mismo frame, dentro de las tolerancias?"""
+        return ((clave[0] ^ otra[0]).bit_count() <= self.distancia
+                and (clave[1] ^ otra[1]).bit_count() <= self.distancia_placa)
+
+    def buscar(self, clave):
+        """Detalle guardado para un frame casi idéntico a `clave`, o None."""
+        ahora = time.monotonic()
+        with self._lock:
+            # Coincidencia exacta primero; si no, recorrido lineal (pocas entradas)
+            encontrada = clave if clave in self._entradas else None
+            if encontrada is None:
+                mejor = None
+                for otra in self._entradas:
+                    if not self.cercanas(clave, otra):
+                        continue
+                    bits = (clave[0] ^ otra[0]).bit_count() + (clave[1] ^ otra[1]).bit_count()
+                    if mejor is None or bits < mejor:
+                        encontrada, mejor = otra, bits
+
+            if encontrada is not None:
+                guardado_en, detalle = self._entradas[encontrada]
+                if ahora - guardado_en <= self.ttl:
+                    self._entradas.move_to_end(encontrada)
+                    self._aciertos += 1
+                    if encontrada != clave:
+                        self._aciertos_aproximados += 1
+                    return detalle
+                del self._entradas[encontrada]
+
+            self._fallos += 1
+            return None
+
+    def guardar(self, clave, detalle):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), detalle)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.tamano:
+                self._entradas.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self._aciertos + self._fallos
+            return {
+                "activa": OCR_CACHE_ACTIVA,
+                "entradas": len(self._entradas),
+                "tamano": self.tamano,
+                "ttl_segundos": self.ttl,
+                "distancia_max": self.distancia,
+                "distancia_max_placa": self.distancia_placa,
+                "aciertos": self._aciertos,
+                "aciertos_aproximados": self._aciertos_aproximados,
+                "fallos": self._fallos,
+                "tasa_aciertos": round(self._aciertos / consultas, 3) if consultas else 0.0,
+            }
+
+
+# Caché global del proceso del servidor
+_cache = CacheOCR()
+
+
+def obtener_cache_ocr():
+    return _cache
+
+
+def estadisticas_cache_ocr():
+    return _cache.estadisticas()
+
+
+# ===========================================================
+# Verificación independiente (sin BD ni OCR):
+#   python -m ocr.cache
+# Frames sintéticos con la placa en la misma posición de la misma escena:
+# placas distintas nunca deben compartir clave; el mismo frame sí.
+# ===========================================================
+if __name__ == "__main__":
+    def _frame(placa, ruido=0, semilla=0):
+        rng = np.random.default_rng(semilla)
+        img = np.full((720, 1280, 3), 90, dtype=np.uint8)
+        cv2.rectangle(img, (300, 200), (980, 620), (60, 60, 160), -1)       # carrocería
+        cv2.rectangle(img, (510, 450), (770, 570), (40, 200, 230), -1)      # placa amarilla
+        cv2.rectangle(img, (510, 450), (770, 570), (0, 0, 0), 3)
+        cv2.putText(img, placa, (525, 535), cv2.FONT_HERSHEY_SIMPLEX, 2.0, (0, 0, 0), 6)
+        if ruido:
+            img = np.clip(img.astype(np.int16) + rng.integers(-ruido, ruido + 1, img.shape), 0, 255).astype(np.uint8)
+        return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+    cache = CacheOCR()
+    base = hash_perceptual(_frame("ABC123"))
+    assert base is not None, "no se localizó la placa sintética"
+    cache.guardar(base, {"placa": "ABC123"})
+
+    fallos = []
+    for otra in ("ABC128", "ABD123", "ABC723", "A8C123", "XYZ789"):
+        clave = hash_perceptual(_frame(otra))
+        distancia = (base[1] ^ clave[1]).bit_count()
+        print(f"ABC123 vs {otra}: escena {(base[0] ^ clave[0]).bit_count()} bits, placa {distancia} bits")
+        if cache.buscar(clave) is not None:
+            fallos.append(otra)
+    mismo = cache.buscar(hash_perceptual(_frame("ABC123", ruido=4, semilla=1)))
+    print("ABC123 con ruido de sensor:", "acierto" if mismo else "fallo")
+
+    if fallos or mismo is None:
+        raise SystemExit(f"❌ Colisiones: {fallos or '-'}; acierto del mismo frame: {mismo is not None}")
+    print("✅ Placas distintas en la misma posición no comparten entrada de caché")
@@ -0,0 +1,111 @@
+# backend/ocr/consenso.py
+# Consenso temporal entre varios frames de la misma placa.
+# La portería envía una ráfaga de frames; cada lectura vota carácter por
+# carácter y la sesión se decide en cuanto la confianza supera el umbral,
+# sin esperar a los frames restantes.
+# Aquí solo está la votación; las sesiones se guardan en la BD para que
+# cualquier worker atienda cualquier frame (models/sesion_validacion.py).
+
+import os
+import uuid
+from collections import defaultdict
+
+from ocr.detector import es_placa_valida
+
+# Confianza mínima (acuerdo por posición) para decidir antes de tiempo
+CONSENSO_UMBRAL = float(os.getenv("CONSENSO_UMBRAL", "0.75"))
+# Lecturas con formato válido necesarias antes de poder decidir
+CONSENSO_MIN_LECTURAS = int(os.getenv("CONSENSO_MIN_LECTURAS", "2"))
+# Tras este número de frames se decide con lo que haya
+CONSENSO_MAX_FRAMES = int(os.getenv("CONSENSO_MAX_FRAMES", "8"))
+# Una sesión sin actividad se descarta pasado este tiempo (lo aplica la BD)
+CONSENSO_TTL_SEGUNDOS = float(os.getenv("CONSENSO_TTL_SEGUNDOS", "30"))
+
+# Peso de una lectura sin formato válido (p. ej. 'OMG65' o 'XOMG650')
+PESO_LECTURA_APROXIMADA = 0.4
+
+
+class SesionConsenso:
+    """
+    Acumula lecturas de OCR y vota por posición. No es segura entre hilos ni
+    entre workers por sí sola: quien la carga de la BD bloquea la fila.
+    """
+
+    def __init__(self, tipo_acceso=None, vigilante_id=None,
+                 umbral=CONSENSO_UMBRAL, min_lecturas=CONSENSO_MIN_LECTURAS, max_frames=CONSENSO_MAX_FRAMES):
+        self.id = uuid.uuid4().hex
+        self.tipo_acceso = tipo_acceso
+        self.vigilante_id = vigilante_id
+        self.umbral = umbral
+        self.min_lecturas = min_lecturas
+        self.max_frames = max_frames
+        self.frames = 0
+        self.lecturas = []          # (placa, peso)
+        self.decision = None        # (respuesta, status) final, una vez decidida
+
+    @classmethod
+    def desde_fila(cls, fila):
+        """Reconstruye la sesión guardada (dict con las columnas de sesion_validacion)."""
+        sesion = cls(fila["tipo_acceso"], fila["id_vigilante"],
+                     umbral=fila["umbral"], min_lecturas=fila["min_lecturas"], max_frames=fila["max_frames"])
+        sesion.id = fila["id_sesion"]
+        sesion.frames = fila["frames"]
+        sesion.lecturas = [(placa, peso) for placa, peso in fila["lecturas"]]
+        sesion.decision = tuple(fila["decision"]) if fila["decision"] else None
+        return sesion
+
+    # -------------------------------------------------------
+    def agregar_lectura(self, placa, confianza=None):
+        """Registra la lectura de un frame (placa puede ser None si fue ilegible)."""
+        self.frames += 1
+        if not placa:
+            return
+        peso = 1.0 if es_placa_valida(placa) else PESO_LECTURA_APROXIMADA
+        if confianza is not None:
+            peso *= max(min(float(confianza), 1.0), 0.0)
+        if peso > 0:
+            self.lecturas.append((placa, peso))
+
+    def consenso(self):
+        """
+        Retorna {"placa", "confianza", "lecturas", "validas", "frames"}.
+        La longitud se elige por peso acumulado; luego cada posición se decide
+        por mayoría ponderada. La confianza es el peor acuerdo entre posiciones.
+        """
+        validas = sum(1 for placa, _ in self.lecturas if es_placa_valida(placa))
+        base = {"lecturas": len(self.lecturas), "validas": validas, "frames": self.frames}
+        if not self.lecturas:
+            return {"placa": None, "confianza": 0.0, **base}
+
+        peso_por_longitud = defaultdict(float)
+        for placa, peso in self.lecturas:
+            peso_por_longitud[len(placa)] += peso
+        longitud = max(peso_por_longitud, key=peso_por_longitud.get)
+
+        votos = [defaultdict(float) for _ in range(longitud)]
+        for placa, peso in self.lecturas:
+            if len(placa) != longitud:
+                continue
+            for posicion, caracter in enumerate(placa):
+                votos[posicion][caracter] += peso
+
+        caracteres = []
+        acuerdo_minimo = 1.0
+        for conteo in votos:
+            ganador = max(conteo, key=conteo.get)
+            caracteres.append(ganador)
+            acuerdo_minimo = min(acuerdo_minimo, conteo[ganador] / sum(conteo.values()))
+
+        # Las lecturas de otra longitud también restan confianza
+        peso_total = sum(peso_por_longitud.values())
+        confianza = acuerdo_minimo * peso_por_longitud[longitud] / peso_total
+        return {"placa": "".join(caracteres), "confianza": round(confianza, 3), **base}
+
+    def listo_para_decidir(self, resumen):
+        if self.frames >= self.max_frames:
+            return True
+        return (
+            es_placa_valida(resumen["placa"])
+            and resumen["validas"] >= self.min_lecturas
+            and resumen["confianza"] >= self.umbral
+        )
@@ -3,11 +3,36 @@ import numpy as np
 import base64
 import os
 import re
-import pytesseract
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ocr.localizacion import localizar_placas
+from ocr.motores import obtener_motor
+from ocr.preprocesamiento import OCR_PRESUPUESTO_MS, ejecutar_cascada, pasada_bilateral_otsu, reducir_frame
+
+# Leer los recortes candidatos de una misma pasada en paralelo (hilos;
+# pytesseract corre cada lectura en su propio proceso)
+OCR_CANDIDATOS_PARALELO = os.getenv("OCR_CANDIDATOS_PARALELO", "0") == "1"
+
+# Formato de placa colombiana: carro AAA999, moto AAA99A
+PATRON_PLACA = re.compile(r'([A-Z]{3}[0-9]{3})|([A-Z]{3}[0-9]{2}[A-Z])')
+
+def inicializar_motor():
+    """
+    Deja el motor OCR (OCR_MOTOR) cargado en el proceso actual. Lo llama el
+    pool de trabajadores OCR al arrancar cada proceso.
+    """
+    obtener_motor()
+
+
+def _leer_texto(gray):
+    """(texto, confianza 0-1) del motor OCR configurado."""
+    return obtener_motor().leer_texto(gray)
+
 
 def limpiar_texto_placa(texto_sucio: str) -> str | None:
     texto_limpio = texto_sucio.upper().replace(' ', '').replace('-', '').replace('.', '').replace(':', '')
-    match = re.search(r'([A-Z]{3}[0-9]{3})|([A-Z]{3}[0-9]{2}[A-Z])', texto_limpio)
+    match = PATRON_PLACA.search(texto_limpio)
 
     if match:
         return match.group(0)
@@ -19,41 +44,128 @@ def limpiar_texto_placa(texto_sucio: str) -> str | None:
     return None
 
 
-def detectar_placa(base64_image_data: str) -> str | None:
-    try:
-        if ',' in base64_image_data:
-            base64_image_data = base64_image_data.split(',')[1]
+def es_placa_valida(placa: str | None) -> bool:
+    """True si la placa cumple exactamente AAA999 / AAA99A."""
+    return bool(placa) and PATRON_PLACA.fullmatch(placa) is not None
 
-        img_data = base64.b64decode(base64_image_data)
 
-        np_arr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+def decodificar_base64(base64_image_data: str) -> bytes:
+    """Quita el prefijo data-URL ('data:image/jpeg;base64,') y decodifica."""
+    coma = base64_image_data.find(',')
+    if coma != -1:
+        base64_image_data = base64_image_data[coma + 1:]
+    return base64.b64decode(base64_image_data)
 
-        if img is None:
-            raise ValueError("No se pudo decodificar la imagen.")
 
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.bilateralFilter(gray, 11, 17, 17)
-        gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+def decodificar_imagen(datos) -> np.ndarray:
+    """
+    Decodifica un JPEG/PNG recibido como bytes, bytearray o memoryview.
+    np.frombuffer sobre el memoryview no copia el buffer antes de imdecode.
+    """
+    np_arr = np.frombuffer(memoryview(datos), np.uint8)
+    img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("No se pudo decodificar la imagen.")
+    return img
 
-        ocr_text = pytesseract.image_to_string(gray, config="--psm 7")
-        if not ocr_text:
+
+def _leer_binaria(binaria, confianzas=None) -> str | None:
+    """OCR + limpieza sobre una imagen ya preprocesada."""
+    ocr_text, confianza = _leer_texto(binaria)
+    if not ocr_text:
+        return None
+
+    for texto in ocr_text.splitlines():
+        placa = limpiar_texto_placa(texto)
+        if placa:
+            if confianzas is not None:
+                confianzas[placa] = max(confianza, confianzas.get(placa, 0.0))
+            return placa
+
+    return None
+
+
+def _leer_varias(leer, binarias, limite=None):
+    """
+    Lee varias regiones en hilos (solo con motores que admiten hilos;
+    pytesseract: cada lectura es un proceso aparte). Hay a lo sumo un hilo
+    por CPU: las lecturas que esperan turno no empiezan pasado `limite`
+    (time.perf_counter()) y quedan como None.
+    """
+    def leer_a_tiempo(binaria):
+        if limite is not None and time.perf_counter() >= limite:
             return None
+        return leer(binaria)
 
-        for texto in ocr_text.splitlines():
-            placa = limpiar_texto_placa(texto)
-            if placa:
-                return placa
+    with ThreadPoolExecutor(max_workers=min(len(binarias), os.cpu_count() or 1)) as executor:
+        return list(executor.map(leer_a_tiempo, binarias))
 
-        return None
 
+def detectar_placa_detalle(datos) -> dict:
+    """
+    Detecta la placa en los bytes de un frame y devuelve el detalle:
+        {"placa", "pasada", "intentos", "tiempo_ms", "presupuesto_agotado",
+         "tiempos_pasadas", "candidatos", "motor", "confianza"}
+    "pasada" indica qué variante de la cascada produjo la lectura válida.
+    """
+    try:
+        img = decodificar_imagen(datos)
+
+        # 1. Solo las regiones candidatas (mucho más pequeñas que el frame)
+        inicio = time.perf_counter()
+        recortes = [c["recorte"] for c in localizar_placas(img)]
+        regiones = recortes or [img]
+
+        # 2. Cascada: pasada barata primero, variantes costosas solo si hace falta
+        motor = obtener_motor()
+        confianzas = {}
+
+        def leer(binaria):
+            return _leer_binaria(binaria, confianzas)
+
+        paralelo = OCR_CANDIDATOS_PARALELO and motor.admite_hilos
+        resultado = ejecutar_cascada(
+            regiones, leer, es_placa_valida,
+            leer_varias=(lambda binarias, limite: _leer_varias(leer, binarias, limite)) if paralelo else None,
+            frame_completo=not recortes
+        )
+
+        # 3. Respaldo: el frame completo (reducido) con el pipeline original,
+        #    solo si queda presupuesto
+        restante_ms = OCR_PRESUPUESTO_MS - (time.perf_counter() - inicio) * 1000
+        if resultado["pasada"] is None and recortes and not resultado["presupuesto_agotado"] and restante_ms > 0:
+            placa = leer(pasada_bilateral_otsu(reducir_frame(img)))
+            if es_placa_valida(placa):
+                resultado.update(placa=placa, pasada="frame_completo")
+            elif placa and not resultado["placa"]:
+                resultado["placa"] = placa
+
+        resultado["candidatos"] = len(recortes)
+        resultado["motor"] = motor.nombre
+        resultado["confianza"] = confianzas.get(resultado["placa"])
+        return resultado
+
+    except Exception as e:
+        print(f"Error en OCR: {e}")
+        return {"placa": None, "pasada": None, "error": str(e)}
+
+
+def detectar_placa_bytes(datos) -> str | None:
+    """Igual que detectar_placa, pero recibe los bytes crudos del frame."""
+    return detectar_placa_detalle(datos)["placa"]
+
+
+def detectar_placa(base64_image_data: str) -> str | None:
+    try:
+        img_data = decodificar_base64(base64_image_data)
     except Exception as e:
         print(f"Error en OCR: {e}")
         return None
+    return detectar_placa_bytes(img_data)
 
 
 if __name__ == "__main__":
-    print("\n--- PRUEBA LOCAL DE OCR (TESSERACT) ---")
+    print("\n--- PRUEBA LOCAL DE OCR ---")
 
     script_dir = os.path.dirname(__file__)
     ruta = os.path.join(script_dir, "img_placas/placa_prueba3.jpg")
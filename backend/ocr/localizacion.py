@@ -0,0 +1,236 @@
+# backend/ocr/localizacion.py
+# Localización de la placa dentro del frame de la cámara.
+# Encuentra rectángulos candidatos (color amarillo de las placas colombianas y
+# densidad de bordes verticales), los recorta y los rectifica para que el
+# filtrado y el OCR trabajen solo sobre regiones pequeñas.
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Ancho al que se reduce el frame para buscar candidatos (la búsqueda no
+# necesita la resolución completa; el recorte sí se hace sobre el original)
+ANCHO_LOCALIZACION = int(os.getenv("OCR_ANCHO_LOCALIZACION", "640"))
+MAX_CANDIDATOS = int(os.getenv("OCR_MAX_CANDIDATOS", "3"))
+
+# Geometría aceptada: placa de carro ~ 2:1, de moto ~ 1.6:1; con perspectiva
+# y recortes imprecisos dejamos margen
+RELACION_MIN = 1.3
+RELACION_MAX = 6.0
+AREA_MIN = 0.003   # fracción del frame
+AREA_MAX = 0.95
+
+# Alto del recorte rectificado que se entrega al OCR y de la muestra
+# reducida con la que se puntúa cada candidato
+ALTO_RECORTE = 120
+ALTO_MUESTRA = 48
+
+# Rango HSV del amarillo de las placas (fondo de placa colombiana)
+AMARILLO_BAJO = np.array([15, 80, 80], dtype=np.uint8)
+AMARILLO_ALTO = np.array([40, 255, 255], dtype=np.uint8)
+
+
+def _reducir(img):
+    alto, ancho = img.shape[:2]
+    if ancho <= ANCHO_LOCALIZACION:
+        return img, 1.0
+    escala = ANCHO_LOCALIZACION / ancho
+    reducida = cv2.resize(img, (ANCHO_LOCALIZACION, int(alto * escala)), interpolation=cv2.INTER_AREA)
+    return reducida, escala
+
+
+def _rectangulos_validos(mascara, area_frame):
+    contornos, _ = cv2.findContours(mascara, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    rectangulos = []
+    for contorno in contornos:
+        area = cv2.contourArea(contorno)
+        if area < AREA_MIN * area_frame or area > AREA_MAX * area_frame:
+            continue
+        rect = cv2.minAreaRect(contorno)
+        (_, _), (w, h), _ = rect
+        if w == 0 or h == 0:
+            continue
+        relacion = max(w, h) / min(w, h)
+        if not RELACION_MIN <= relacion <= RELACION_MAX:
+            continue
+        # Qué tan "rectangular" es el contorno (placas ≈ 1, manchas irregulares < 0.6)
+        relleno = area / (w * h)
+        if relleno < 0.45:
+            continue
+        rectangulos.append((rect, relleno))
+    return rectangulos
+
+
+def _candidatos_color(hsv, area_frame):
+    mascara = cv2.inRange(hsv, AMARILLO_BAJO, AMARILLO_ALTO)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 5))
+    mascara = cv2.morphologyEx(mascara, cv2.MORPH_CLOSE, kernel, iterations=2)
+    mascara = cv2.morphologyEx(mascara, cv2.MORPH_OPEN, kernel)
+    return [(rect, relleno, "color") for rect, relleno in _rectangulos_validos(mascara, area_frame)]
+
+
+def _candidatos_bordes(gris, area_frame):
+    # Los caracteres generan muchos bordes verticales juntos; el kernel de
+    # cierre escala con el ancho para unir los caracteres de una misma placa
+    sobel = cv2.Sobel(gris, cv2.CV_8U, 1, 0, ksize=3)
+    _, binaria = cv2.threshold(sobel, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    ancho_kernel = max(gris.shape[1] // 30, 5)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (ancho_kernel, max(ancho_kernel // 4, 3)))
+    binaria = cv2.morphologyEx(binaria, cv2.MORPH_CLOSE, kernel)
+    binaria = cv2.morphologyEx(binaria, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3)))
+    return [(rect, relleno, "bordes") for rect, relleno in _rectangulos_validos(binaria, area_frame)]
+
+
+def _contar_caracteres(recorte):
+    """
+    Cuenta componentes conexas con tamaño de carácter dentro de un recorte
+    rectificado. Una placa tiene 5-7; una camisa amarilla o un reflejo, casi ninguna.
+    """
+    gris = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY)
+    alto = gris.shape[0]
+    total = 0
+    # Caracteres oscuros sobre fondo claro y (placas de otros países) al revés
+    for modo in (cv2.THRESH_BINARY_INV, cv2.THRESH_BINARY):
+        _, binaria = cv2.threshold(gris, 0, 255, modo + cv2.THRESH_OTSU)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binaria)
+        caracteres = sum(
+            1 for _, _, w, h, _ in stats[1:]
+            if 0.25 * alto < h < 0.9 * alto and w < 0.8 * h
+        )
+        total = max(total, caracteres)
+    return total
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def _ordenar_esquinas(puntos):
+    # superior-izquierda, superior-derecha, inferior-derecha, inferior-izquierda
+    suma = puntos.sum(axis=1)
+    resta = np.diff(puntos, axis=1).ravel()
+    return np.array([
+        puntos[np.argmin(suma)],
+        puntos[np.argmin(resta)],
+        puntos[np.argmax(suma)],
+        puntos[np.argmax(resta)],
+    ], dtype=np.float32)
+
+
+def rectificar(img, rect, escala=1.0, alto=ALTO_RECORTE):
+    """
+    Recorta la región `rect` (cv2.minAreaRect en coordenadas reducidas) del
+    frame original y la endereza con una transformación de perspectiva.
+    """
+    esquinas = cv2.boxPoints(rect) / escala
+    esquinas = _ordenar_esquinas(esquinas)
+    ancho_origen = np.linalg.norm(esquinas[1] - esquinas[0])
+    alto_origen = np.linalg.norm(esquinas[3] - esquinas[0])
+    if alto_origen == 0 or ancho_origen == 0:
+        return None
+    ancho_destino = max(int(alto * ancho_origen / alto_origen), 1)
+    alto_destino = alto
+    destino = np.array([[0, 0], [ancho_destino - 1, 0],
+                        [ancho_destino - 1, alto_destino - 1], [0, alto_destino - 1]], dtype=np.float32)
+    matriz = cv2.getPerspectiveTransform(esquinas, destino)
+    return cv2.warpPerspective(img, matriz, (ancho_destino, alto_destino), flags=cv2.INTER_CUBIC)
+
+
+def localizar_placas(img, max_candidatos=MAX_CANDIDATOS):
+    """
+    Devuelve hasta `max_candidatos` regiones candidatas, mejor puntuadas primero:
+        [{"caja": (x, y, w, h), "puntuacion": float, "origen": "color"|"bordes",
+          "recorte": ndarray BGR rectificado}, ...]
+    Las cajas están en coordenadas del frame original.
+    """
+    reducida, escala = _reducir(img)
+    area_frame = reducida.shape[0] * reducida.shape[1]
+    gris = cv2.cvtColor(reducida, cv2.COLOR_BGR2GRAY)
+    hsv = cv2.cvtColor(reducida, cv2.COLOR_BGR2HSV)
+
+    crudos = _candidatos_color(hsv, area_frame) + _candidatos_bordes(gris, area_frame)
+
+    puntuados = []
+    for rect, relleno, origen in crudos:
+        (_, _), (w, h), _ = rect
+        relacion = max(w, h) / min(w, h)
+        # La evidencia principal son los caracteres; luego la forma (≈ 2:1, rectangular)
+        muestra = rectificar(reducida, rect, 1.0, alto=ALTO_MUESTRA)
+        if muestra is None:
+            continue
+        caracteres = _contar_caracteres(muestra)
+        evidencia_texto = min(caracteres, 6) / 6.0
+        cercania_relacion = 1.0 / (1.0 + abs(relacion - 2.0))
+        puntuacion = 2.0 * evidencia_texto + relleno * cercania_relacion + (0.2 if origen == "color" else 0.0)
+        caja = cv2.boundingRect((cv2.boxPoints(rect) / escala).astype(np.int32))
+        puntuados.append((puntuacion, caja, rect, origen))
+
+    puntuados.sort(key=lambda c: c[0], reverse=True)
+
+    candidatos = []
+    for puntuacion, caja, rect, origen in puntuados:
+        # Supresión de no-máximos: el mismo rectángulo suele salir por color y por bordes
+        if any(_iou(caja, c["caja"]) > 0.5 for c in candidatos):
+            continue
+        recorte = rectificar(img, rect, escala)
+        if recorte is None:
+            continue
+        candidatos.append({"caja": caja, "puntuacion": round(puntuacion, 4), "origen": origen, "recorte": recorte})
+        if len(candidatos) >= max_candidatos:
+            break
+    return candidatos
+
+
+# ===========================================================
+# Benchmark independiente:
+#   python -m ocr.localizacion [imagen|carpeta ...] [--repeticiones N] [--guardar DIR]
+# ===========================================================
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    repeticiones = 20
+    carpeta_salida = None
+    if "--repeticiones" in args:
+        i = args.index("--repeticiones")
+        repeticiones = int(args[i + 1])
+        del args[i:i + 2]
+    if "--guardar" in args:
+        i = args.index("--guardar")
+        carpeta_salida = args[i + 1]
+        del args[i:i + 2]
+        os.makedirs(carpeta_salida, exist_ok=True)
+    if not args:
+        args = [os.path.join(os.path.dirname(__file__), "img_placas")]
+
+    rutas = []
+    for ruta in args:
+        if os.path.isdir(ruta):
+            rutas += sorted(os.path.join(ruta, f) for f in os.listdir(ruta)
+                            if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        else:
+            rutas.append(ruta)
+
+    print(f"\n--- BENCHMARK DE LOCALIZACIÓN ({repeticiones} repeticiones) ---")
+    for ruta in rutas:
+        img = cv2.imread(ruta)
+        if img is None:
+            print("No se pudo leer:", ruta)
+            continue
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            candidatos = localizar_placas(img)
+        ms = (time.perf_counter() - inicio) * 1000 / repeticiones
+        resumen = ", ".join(f"{c['origen']}@{c['caja']} p={c['puntuacion']}" for c in candidatos)
+        print(f"{os.path.basename(ruta)} {img.shape[1]}x{img.shape[0]}: {ms:.2f} ms | {resumen or 'sin candidatos'}")
+        if carpeta_salida:
+            base = os.path.splitext(os.path.basename(ruta))[0]
+            for n, c in enumerate(candidatos):
+                cv2.imwrite(os.path.join(carpeta_salida, f"{base}_{n}.png"), c["recorte"])
@@ -0,0 +1,180 @@
+# backend/ocr/motores.py
+# Capa única de motores OCR. Todos exponen la misma interfaz:
+#   leer_texto(gris)  -> (texto, confianza)   sobre una imagen ya preprocesada
+#   leer(entrada)     -> {"placa", "confianza", "motor", "tiempos"}
+# donde `entrada` puede ser un ndarray, los bytes de un JPEG/PNG o una ruta.
+# El motor se elige con OCR_MOTOR y se carga una sola vez por proceso.
+
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# tesseract | easyocr
+OCR_MOTOR = os.getenv("OCR_MOTOR", "tesseract").strip().lower()
+# EasyOCR en GPU solo si se pide explícitamente
+OCR_EASYOCR_GPU = os.getenv("OCR_EASYOCR_GPU", "0") == "1"
+
+CARACTERES_PLACA = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+
+
+def _a_gris(entrada):
+    """ndarray (BGR o gris), bytes de imagen o ruta -> ndarray en gris."""
+    if isinstance(entrada, np.ndarray):
+        img = entrada
+    elif isinstance(entrada, str):
+        img = cv2.imread(entrada, cv2.IMREAD_GRAYSCALE)
+    else:
+        img = cv2.imdecode(np.frombuffer(memoryview(entrada), np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("No se pudo leer la imagen.")
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def _ms(desde):
+    return round((time.perf_counter() - desde) * 1000, 2)
+
+
+class MotorOCR:
+    nombre = "base"
+    # True si varias lecturas pueden correr en hilos del mismo proceso
+    admite_hilos = False
+
+    def __init__(self):
+        self._cargado = False
+        self._lock = threading.Lock()
+
+    def cargar(self):
+        """Carga el modelo (idempotente). Lo llaman los trabajadores OCR al arrancar."""
+        with self._lock:
+            if not self._cargado:
+                self._cargar()
+                self._cargado = True
+        return self
+
+    def _cargar(self):
+        pass
+
+    def leer_texto(self, gris):
+        raise NotImplementedError
+
+    def leer(self, entrada):
+        # Import local: detector importa este módulo
+        from ocr.detector import limpiar_texto_placa
+
+        self.cargar()
+        inicio = time.perf_counter()
+        gris = _a_gris(entrada)
+        tiempos = {"decodificar_ms": _ms(inicio)}
+
+        inicio = time.perf_counter()
+        texto, confianza = self.leer_texto(gris)
+        tiempos["ocr_ms"] = _ms(inicio)
+
+        inicio = time.perf_counter()
+        placa = None
+        for linea in (texto or "").splitlines():
+            placa = limpiar_texto_placa(linea)
+            if placa:
+                break
+        tiempos["limpieza_ms"] = _ms(inicio)
+
+        return {"placa": placa, "confianza": confianza, "motor": self.nombre, "tiempos": tiempos}
+
+
+class MotorTesseract(MotorOCR):
+    """tesserocr residente si está instalado; si no, pytesseract (un proceso por lectura)."""
+    nombre = "tesseract"
+
+    def __init__(self):
+        super().__init__()
+        self._api = None
+
+    def _cargar(self):
+        try:
+            import tesserocr
+            self._api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.SINGLE_LINE)
+            self.admite_hilos = False
+        except Exception:
+            self._api = None
+            self.admite_hilos = True
+
+    def leer_texto(self, gris):
+        self.cargar()
+        if self._api is not None:
+            from PIL import Image
+            # PyTessBaseAPI no es reentrante
+            with self._lock:
+                self._api.SetImage(Image.fromarray(gris))
+                return self._api.GetUTF8Text(), self._api.MeanTextConf() / 100.0
+
+        import pytesseract
+        datos = pytesseract.image_to_data(gris, config="--psm 7", output_type=pytesseract.Output.DICT)
+        palabras = [(t, float(c)) for t, c in zip(datos["text"], datos["conf"]) if t.strip()]
+        if not palabras:
+            return "", 0.0
+        texto = " ".join(t for t, _ in palabras)
+        confianza = min(max(c, 0.0) for _, c in palabras) / 100.0
+        return texto, confianza
+
+
+class MotorEasyOCR(MotorOCR):
+    """EasyOCR (PyTorch). Dependencia opcional: pip install easyocr."""
+    nombre = "easyocr"
+
+    def __init__(self):
+        super().__init__()
+        self._lector = None
+
+    def _cargar(self):
+        import easyocr
+        self._lector = easyocr.Reader(["en"], gpu=OCR_EASYOCR_GPU, verbose=False)
+
+    def leer_texto(self, gris):
+        self.cargar()
+        resultados = self._lector.readtext(gris, allowlist=CARACTERES_PLACA, detail=1, paragraph=False)
+        if not resultados:
+            return "", 0.0
+        # De izquierda a derecha, en una sola línea como la placa
+        resultados.sort(key=lambda r: min(p[0] for p in r[0]))
+        texto = " ".join(r[1] for r in resultados)
+        confianza = min(float(r[2]) for r in resultados)
+        return texto, confianza
+
+
+MOTORES = {
+    MotorTesseract.nombre: MotorTesseract,
+    MotorEasyOCR.nombre: MotorEasyOCR,
+}
+
+
+# ===========================================================
+# Motor del proceso
+# ===========================================================
+_motores = {}
+_motores_lock = threading.Lock()
+
+
+def obtener_motor(nombre=None):
+    """
+    Instancia única por proceso y nombre (OCR_MOTOR por defecto). Si el
+    motor pedido no se puede cargar, se usa tesseract.
+    """
+    nombre = (nombre or OCR_MOTOR).lower()
+    if nombre not in MOTORES:
+        print(f"❌ Motor OCR desconocido '{nombre}', se usa tesseract")
+        nombre = MotorTesseract.nombre
+
+    with _motores_lock:
+        motor = _motores.get(nombre)
+        if motor is None:
+            motor = MOTORES[nombre]()
+            try:
+                motor.cargar()
+            except Exception as e:
+                print(f"❌ Error cargando motor OCR '{nombre}': {e}")
+                motor = _motores.setdefault(MotorTesseract.nombre, MotorTesseract().cargar())
+            _motores[nombre] = motor
+        return motor
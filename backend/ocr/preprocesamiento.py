@@ -0,0 +1,212 @@
+# backend/ocr/preprocesamiento.py
+# Cascada adaptativa de preprocesamiento para el OCR de placas.
+# Primero una pasada barata sobre el recorte reducido; solo si no sale una
+# placa con formato válido se escala a variantes más costosas, dentro de un
+# presupuesto de tiempo por frame.
+
+import os
+import threading
+import time
+
+import cv2
+
+# Presupuesto total por frame (todas las pasadas y regiones)
+OCR_PRESUPUESTO_MS = float(os.getenv("OCR_PRESUPUESTO_MS", "1500"))
+
+# Alto (px) al que se reduce el recorte en la pasada rápida
+ALTO_PASADA_RAPIDA = 48
+
+# Sin recortes candidatos la cascada corre sobre el frame entero: se reduce a
+# este ancho (el bilateral sobre 1920 px cuesta más que todo el presupuesto)
+# y no se hacen las pasadas que agrandan la imagen
+ANCHO_FRAME_COMPLETO = int(os.getenv("OCR_ANCHO_FRAME_COMPLETO", "1280"))
+PASADAS_SOLO_RECORTE = {"alta_resolucion"}
+
+
+# ===========================================================
+# Variantes de preprocesamiento (BGR -> binaria en gris)
+# ===========================================================
+def _gris(img):
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+def pasada_rapida(img):
+    gray = _gris(img)
+    alto = gray.shape[0]
+    if alto > ALTO_PASADA_RAPIDA:
+        escala = ALTO_PASADA_RAPIDA / alto
+        gray = cv2.resize(gray, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def pasada_bilateral_otsu(img):
+    # El pipeline original del detector
+    gray = cv2.bilateralFilter(_gris(img), 11, 17, 17)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def pasada_clahe_adaptativo(img):
+    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    gray = clahe.apply(_gris(img))
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+
+def pasada_morfologica(img):
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    gray = clahe.apply(_gris(img))
+    binaria = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    # Quita puntos sueltos (tornillos, suciedad) y cierra trazos partidos
+    binaria = cv2.morphologyEx(binaria, cv2.MORPH_OPEN, kernel)
+    return cv2.morphologyEx(binaria, cv2.MORPH_CLOSE, kernel)
+
+
+def pasada_alta_resolucion(img):
+    gray = cv2.resize(_gris(img), None, fx=2.0, fy=2.0, interpolation=cv2.INTER_CUBIC)
+    gray = cv2.bilateralFilter(gray, 11, 17, 17)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+
+
+def reducir_frame(img, ancho=ANCHO_FRAME_COMPLETO):
+    """El frame a `ancho` px como máximo (las variantes costosas escalan con el área)."""
+    if img.shape[1] <= ancho:
+        return img
+    escala = ancho / img.shape[1]
+    return cv2.resize(img, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+
+
+# Orden por defecto: de la más barata a la más costosa
+PASADAS = {
+    "rapida": pasada_rapida,
+    "bilateral_otsu": pasada_bilateral_otsu,
+    "clahe_adaptativo": pasada_clahe_adaptativo,
+    "morfologica": pasada_morfologica,
+    "alta_resolucion": pasada_alta_resolucion,
+}
+# Se puede reordenar o recortar sin tocar código: OCR_PASADAS=rapida,clahe_adaptativo
+ORDEN_PASADAS = [
+    nombre.strip() for nombre in os.getenv("OCR_PASADAS", ",".join(PASADAS)).split(",")
+    if nombre.strip() in PASADAS
+]
+
+
+def ejecutar_cascada(regiones, leer, es_valida, presupuesto_ms=OCR_PRESUPUESTO_MS, leer_varias=None,
+                     frame_completo=False):
+    """
+    Recorre las pasadas en orden; en cada una lee todas las regiones
+    (recortes candidatos). Se detiene en la primera lectura con formato válido
+    o cuando se agota el presupuesto, que se revisa antes de cada pasada, de
+    cada región (preprocesarla también cuesta) y de cada lectura.
+
+    `leer(binaria) -> str | None` hace OCR + limpieza de una imagen ya procesada.
+    `leer_varias(lista, limite) -> list`, si se pasa, lee varias regiones a la
+    vez y no empieza lecturas después de `limite` (time.perf_counter()).
+    `frame_completo`: la única región es el frame entero (no hubo recortes):
+    se reduce con reducir_frame y se saltan PASADAS_SOLO_RECORTE.
+
+    Retorna {"placa", "pasada", "intentos", "tiempo_ms", "presupuesto_agotado",
+             "tiempos_pasadas": {nombre: ms}}. Si nada cumple el formato,
+    "placa" es la primera lectura aproximada (o None) y "pasada" es None.
+    """
+    inicio = time.perf_counter()
+    limite = inicio + presupuesto_ms / 1000.0
+    aproximada = None
+    intentos = 0
+    tiempos = {}
+    agotado = False
+    if frame_completo:
+        regiones = [reducir_frame(region) for region in regiones]
+
+    def sin_tiempo():
+        # La primera lectura del frame se hace siempre
+        return intentos > 0 and time.perf_counter() >= limite
+
+    for nombre in ORDEN_PASADAS:
+        if frame_completo and nombre in PASADAS_SOLO_RECORTE:
+            continue
+        if sin_tiempo():
+            agotado = True
+            break
+        inicio_pasada = time.perf_counter()
+        lecturas = []
+        if leer_varias is not None and len(regiones) > 1:
+            procesadas = []
+            for region in regiones:
+                if procesadas and time.perf_counter() >= limite:
+                    agotado = True
+                    break
+                procesadas.append(PASADAS[nombre](region))
+            lecturas = leer_varias(procesadas, limite)
+            intentos += len(procesadas)
+            agotado = agotado or time.perf_counter() >= limite
+        else:
+            for region in regiones:
+                if sin_tiempo():
+                    agotado = True
+                    break
+                lecturas.append(leer(PASADAS[nombre](region)))
+                intentos += 1
+                if es_valida(lecturas[-1]):
+                    break
+        tiempos[nombre] = round((time.perf_counter() - inicio_pasada) * 1000, 2)
+
+        for placa in lecturas:
+            if es_valida(placa):
+                return {
+                    "placa": placa,
+                    "pasada": nombre,
+                    "intentos": intentos,
+                    "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 2),
+                    "presupuesto_agotado": False,
+                    "tiempos_pasadas": tiempos,
+                }
+            if placa and aproximada is None:
+                aproximada = placa
+        if agotado:
+            break
+
+    return {
+        "placa": aproximada,
+        "pasada": None,
+        "intentos": intentos,
+        "tiempo_ms": round((time.perf_counter() - inicio) * 1000, 2),
+        "presupuesto_agotado": agotado,
+        "tiempos_pasadas": tiempos,
+    }
+
+
+# ===========================================================
+# Métricas: qué pasada resolvió cada frame
+# ===========================================================
+# Se registran en el proceso del servidor (los trabajadores OCR devuelven el
+# nombre de la pasada con el resultado), así las ve /api/admin/metricas.
+_metricas_lock = threading.Lock()
+_exitos_por_pasada = {nombre: 0 for nombre in PASADAS}
+_sin_formato_valido = 0
+_presupuesto_agotado = 0
+_frames = 0
+
+
+def registrar_resultado(pasada, presupuesto_agotado=False):
+    global _sin_formato_valido, _presupuesto_agotado, _frames
+    with _metricas_lock:
+        _frames += 1
+        if pasada:
+            _exitos_por_pasada[pasada] = _exitos_por_pasada.get(pasada, 0) + 1
+        else:
+            _sin_formato_valido += 1
+        if presupuesto_agotado:
+            _presupuesto_agotado += 1
+
+
+def estadisticas_cascada():
+    with _metricas_lock:
+        return {
+            "orden": list(ORDEN_PASADAS),
+            "presupuesto_ms": OCR_PRESUPUESTO_MS,
+            "frames": _frames,
+            "exitos_por_pasada": dict(_exitos_por_pasada),
+            "sin_formato_valido": _sin_formato_valido,
+            "presupuesto_agotado": _presupuesto_agotado,
+        }
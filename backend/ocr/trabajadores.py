@@ -0,0 +1,259 @@
+# backend/ocr/trabajadores.py
+# Pool de procesos dedicado al OCR: saca la decodificación, el filtrado de
+# OpenCV y tesseract del hilo de la petición Flask.
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FuturoTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from ocr import detector
+from ocr.motores import OCR_MOTOR
+from ocr.cache import OCR_CACHE_ACTIVA, hash_perceptual, obtener_cache_ocr
+from ocr.preprocesamiento import registrar_resultado
+
+# ===========================================================
+# Configuración (variables de entorno)
+# ===========================================================
+# 0 = ejecutar el OCR en el mismo proceso (útil en desarrollo)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+# Trabajos admitidos a la vez (en ejecución + en espera); el resto se rechaza
+OCR_COLA_MAX = int(os.getenv("OCR_COLA_MAX", "16"))
+# Plazo por trabajo, desde que se envía hasta que hay resultado
+OCR_TIMEOUT_SEGUNDOS = float(os.getenv("OCR_TIMEOUT_SEGUNDOS", "8"))
+
+
+class ColaOCRLlenaError(Exception):
+    """La cola de OCR está llena; el llamador debe reintentar más tarde."""
+
+
+class TiempoOCRAgotadoError(Exception):
+    """El trabajo de OCR no terminó dentro de su plazo."""
+
+
+# ===========================================================
+# Código que corre dentro de cada proceso trabajador
+# ===========================================================
+def _inicializar_trabajador():
+    detector.inicializar_motor()
+
+
+def _ejecutar_trabajo(imagen, fecha_limite):
+    # Si el trabajo esperó en la cola más que su plazo, nadie espera ya la respuesta
+    if time.time() > fecha_limite:
+        return {"vencido": True, "placa": None}
+    try:
+        datos = detector.decodificar_base64(imagen) if isinstance(imagen, str) else imagen
+    except Exception as e:
+        print(f"Error en OCR: {e}")
+        return {"vencido": False, "placa": None, "pasada": None}
+    resultado = detector.detectar_placa_detalle(datos)
+    resultado["vencido"] = False
+    return resultado
+
+
+# ===========================================================
+# Pool (lado del servidor)
+# ===========================================================
+class PoolOCR:
+    def __init__(self, workers=OCR_WORKERS, cola_max=OCR_COLA_MAX, timeout=OCR_TIMEOUT_SEGUNDOS):
+        self.workers = workers
+        self.cola_max = max(cola_max, 1)
+        self.timeout = timeout
+        self._cupos = threading.BoundedSemaphore(self.cola_max)
+        self._lock = threading.Lock()
+        self._executor = None
+
+        # Métricas
+        self._enviados = 0
+        self._completados = 0
+        self._rechazados = 0
+        self._vencidos = 0
+        self._errores = 0
+        self._latencia_total = 0.0
+        self._latencia_max = 0.0
+
+    def _obtener_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_inicializar_trabajador,
+                )
+            return self._executor
+
+    def _reiniciar_executor(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def enviar(self, imagen, timeout=None):
+        """
+        Encola un trabajo y devuelve un Future con el dict
+        {"vencido": bool, "placa": str | None, "pasada": ..., ...}
+        (ver detector.detectar_placa_detalle).
+        `imagen` es el base64 del cliente o los bytes crudos del frame.
+        Lanza ColaOCRLlenaError si no hay cupo.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        if not self._cupos.acquire(blocking=False):
+            with self._lock:
+                self._rechazados += 1
+            raise ColaOCRLlenaError(f"Cola OCR llena ({self.cola_max} trabajos)")
+
+        enviado_en = time.monotonic()
+        fecha_limite = time.time() + timeout
+        try:
+            if self.workers <= 0:
+                futuro = Future()
+                try:
+                    futuro.set_result(_ejecutar_trabajo(imagen, fecha_limite))
+                except Exception as e:
+                    futuro.set_exception(e)
+            else:
+                # Un memoryview no se puede enviar a otro proceso: viaja como bytes
+                if isinstance(imagen, memoryview):
+                    imagen = imagen.tobytes()
+                futuro = self._obtener_executor().submit(_ejecutar_trabajo, imagen, fecha_limite)
+        except Exception:
+            self._cupos.release()
+            raise
+
+        with self._lock:
+            self._enviados += 1
+        futuro.add_done_callback(lambda f: self._al_terminar(f, enviado_en))
+        return futuro
+
+    def _al_terminar(self, futuro, enviado_en):
+        self._cupos.release()
+        latencia = time.monotonic() - enviado_en
+        with self._lock:
+            if futuro.cancelled():
+                self._vencidos += 1
+                return
+            error = futuro.exception()
+            if error is not None:
+                self._errores += 1
+                if isinstance(error, BrokenProcessPool):
+                    # Un trabajador murió (p. ej. OOM): el próximo envío crea un pool nuevo
+                    threading.Thread(target=self._reiniciar_executor, daemon=True).start()
+                return
+            resultado = futuro.result()
+            if resultado.get("vencido"):
+                self._vencidos += 1
+                return
+            registrar_resultado(resultado.get("pasada"), resultado.get("presupuesto_agotado", False))
+            self._completados += 1
+            self._latencia_total += latencia
+            self._latencia_max = max(self._latencia_max, latencia)
+
+    def esperar_detalle(self, futuro, timeout=None):
+        """Espera el resultado de un Future del pool; devuelve el dict completo."""
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            resultado = futuro.result(timeout=timeout)
+        except FuturoTimeoutError:
+            futuro.cancel()
+            raise TiempoOCRAgotadoError(f"OCR sin respuesta tras {timeout:.1f}s")
+        if resultado.get("vencido"):
+            raise TiempoOCRAgotadoError("El trabajo de OCR venció en la cola")
+        return resultado
+
+    def esperar(self, futuro, timeout=None):
+        """Espera el resultado de un Future del pool; devuelve la placa o None."""
+        return self.esperar_detalle(futuro, timeout).get("placa")
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "motor": OCR_MOTOR,
+                "workers": self.workers,
+                "cola_max": self.cola_max,
+                "enviados": self._enviados,
+                "completados": self._completados,
+                "rechazados": self._rechazados,
+                "vencidos": self._vencidos,
+                "errores": self._errores,
+                "latencia_promedio_ms": round(self._latencia_total / self._completados * 1000, 2) if self._completados else 0.0,
+                "latencia_max_ms": round(self._latencia_max * 1000, 2),
+            }
+
+
+# ===========================================================
+# Pool global del proceso
+# ===========================================================
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool_ocr():
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = PoolOCR()
+                _pool_pid = pid
+    return _pool
+
+
+def reconocer_placa(imagen, timeout=None):
+    """
+    Atajo bloqueante: envía la imagen (base64 o bytes) al pool y espera la
+    placa (o None). Lanza ColaOCRLlenaError o TiempoOCRAgotadoError.
+    """
+    return reconocer_detalle(imagen, timeout).get("placa")
+
+
+def reconocer_detalle(imagen, timeout=None, usar_cache=True):
+    """
+    Como reconocer_placa, pero devuelve el detalle (pasada, tiempos...).
+    Antes de ir al pool consulta la caché por hash perceptual de la placa;
+    un acierto lleva "cache": True. usar_cache=False siempre lee con el pool
+    (la ráfaga necesita lecturas independientes para votar).
+    """
+    clave = None
+    if OCR_CACHE_ACTIVA and usar_cache:
+        try:
+            # El base64 se decodifica aquí una sola vez: el hash lo necesita y
+            # el trabajador recibe los bytes ya listos
+            if isinstance(imagen, str):
+                imagen = detector.decodificar_base64(imagen)
+            clave = hash_perceptual(imagen)
+        except Exception as e:
+            print(f"❌ Error calculando hash de la placa: {e}")
+        if clave is not None:
+            guardado = obtener_cache_ocr().buscar(clave)
+            if guardado is not None:
+                return {**guardado, "cache": True}
+
+    pool = obtener_pool_ocr()
+    detalle = pool.esperar_detalle(pool.enviar(imagen, timeout), timeout)
+    # Solo se guardan lecturas con formato válido: un frame ilegible se reintenta
+    if clave is not None and detector.es_placa_valida(detalle.get("placa")):
+        obtener_cache_ocr().guardar(clave, detalle)
+    return detalle
+
+
+def estadisticas_ocr():
+    if _pool is None or _pool_pid != os.getpid():
+        return {"enviados": 0}
+    return _pool.estadisticas()
+
+
+@atexit.register
+def _cerrar_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.cerrar()
@@ -10,13 +10,14 @@ import os
 from datetime import datetime, timedelta
 from functools import wraps
 
-from flask import Flask, jsonify, request, render_template, send_from_directory
+from flask import Flask, jsonify, request, render_template, send_from_directory, Response
 from flask_cors import CORS
 import jwt
 
 # IMPORTS LOCALES
 from core.auditoria_utils import registrar_auditoria_global
-from core.db.connection import get_connection
+from core.db.connection import get_connection, estadisticas_pool
+from core.db.sesion import unidad_de_trabajo, registrar_en_app
 from models.user_model import verificar_usuario
 
 from core.controller_personas import (
@@ -33,7 +34,11 @@ from core.controller_vehiculos import (
 )
 from core.controller_accesos import (
     obtener_historial_accesos,
-    procesar_validacion_acceso
+    procesar_validacion_acceso,
+    procesar_validacion_binaria,
+    iniciar_validacion_rafaga,
+    agregar_frame_rafaga,
+    cerrar_validacion_rafaga
 )
 from core.controller_calendario import (
     obtener_eventos_controller,
@@ -64,14 +69,30 @@ from models.admin_model import (
     obtener_accesos_detalle,
     registrar_vigilante
 )
-from models.auditoria import obtener_historial_auditoria
-
-# Librerías para exportaciones
-from io import BytesIO
-from flask import send_file
-from openpyxl import Workbook
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from models.auditoria import obtener_auditoria_paginada
+from ocr.trabajadores import estadisticas_ocr
+from ocr.preprocesamiento import estadisticas_cascada
+from models.sesion_validacion import estadisticas_consenso
+from ocr.cache import estadisticas_cache_ocr
+from core.services.ocupacion_patio import cargar_indice_patio, estadisticas_patio
+from core.services.registro_placas import cargar_registro_placas, estadisticas_registro_placas
+from core.services.eventos_activos import estadisticas_eventos
+from core.services.auditoria_async import estadisticas_auditoria
+from core.services.particiones import iniciar_mantenimiento_particiones, estadisticas_particiones
+from core.services.contadores import cargar_contadores, obtener_contadores, estadisticas_contadores
+from core.services.tiempo_real import suscribir_eventos, estadisticas_tiempo_real, CanalLlenoError
+from core.services.bus_cambios import iniciar_bus_cambios, estadisticas_bus_cambios
+from core.services.coincidencia_placas import cargar_coincidencias_placas, estadisticas_coincidencias
+from core.importacion_masiva import importar, formato_por_nombre
+
+# Exportaciones (PDF / Excel) por lotes con cursor del lado del servidor
+from core.exportaciones import filtros_exportacion, generar_pdf, generar_excel, excede_exportacion_sincrona
+from core.services.trabajos_exportacion import (
+    FORMATOS,
+    crear_trabajo_exportacion,
+    obtener_trabajo_exportacion,
+    estadisticas_exportaciones
+)
 
 # ===========================================================
 # App config
@@ -84,6 +105,20 @@ CORS(app)
 
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "SmartCar_SeguridadUltra_2025")
 
+# Libera la unidad de trabajo (core/db/sesion.py) si una petición no la cerró
+registrar_en_app(app)
+
+# Vehículos en el patio, placas registradas y totales del dashboard, en memoria (ver core/services/)
+cargar_indice_patio()
+cargar_registro_placas()
+cargar_contadores()
+cargar_coincidencias_placas()
+# Cambios hechos por otros procesos sobre esas cachés (migración 006)
+iniciar_bus_cambios()
+
+# Meses siguientes de acceso/auditoria y archivo de los vencidos (migración 005)
+iniciar_mantenimiento_particiones()
+
 # ===========================================================
 # Decorador: validar token JWT
 def token_requerido(f):
@@ -221,45 +256,71 @@ def api_registrar_vigilante():
 def api_admin_auditoria():
     if request.usuario_actual.get('rol') != 'Administrador':
         return jsonify({"error": "Acceso no autorizado"}), 403
+    # Siempre paginado (sin parámetros: primera página con el límite por defecto)
+    # ?limite=&cursor=&total=exacto|estimado&entidad=&accion=
+    # &id_usuario=&id_entidad=&desde=&hasta=&clave=&valor=&en=
     try:
-        historial = obtener_historial_auditoria()
-        return jsonify(historial), 200
+        pagina = obtener_auditoria_paginada(
+            request.args,
+            limite=request.args.get("limite"),
+            cursor=request.args.get("cursor"),
+            total=request.args.get("total")
+        )
+        return jsonify(pagina), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"❌ Error obteniendo historial de auditoría: {e}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
+@app.route("/api/admin/metricas", methods=["GET"])
+@token_requerido
+def api_admin_metricas():
+    if request.usuario_actual.get('rol') != 'Administrador':
+        return jsonify({"error": "Acceso no autorizado"}), 403
+    return jsonify({
+        "pool_bd": estadisticas_pool(),
+        "ocr": estadisticas_ocr(),
+        "ocr_cascada": estadisticas_cascada(),
+        "ocr_consenso": estadisticas_consenso(),
+        "ocr_cache": estadisticas_cache_ocr(),
+        "patio": estadisticas_patio(),
+        "registro_placas": estadisticas_registro_placas(),
+        "eventos": estadisticas_eventos(),
+        "auditoria": estadisticas_auditoria(),
+        "exportaciones": estadisticas_exportaciones(),
+        "particiones": estadisticas_particiones(),
+        "contadores": estadisticas_contadores(),
+        "tiempo_real": estadisticas_tiempo_real(),
+        "bus_cambios": estadisticas_bus_cambios(),
+        "coincidencia_placas": estadisticas_coincidencias()
+    }), 200
+
+def _respuesta_exportacion(generar, formato, nombre, mimetype):
+    """
+    Valida filtros, genera el documento y lo envía en trozos. Si es grande,
+    crea un trabajo en segundo plano y responde 202 con su estado.
+    """
+    try:
+        filtros = filtros_exportacion(request.args)
+        if excede_exportacion_sincrona(filtros):
+            trabajo = crear_trabajo_exportacion(formato, filtros)
+            return jsonify(_trabajo_publico(trabajo)), 200 if trabajo["estado"] == "listo" else 202
+        contenido = generar(filtros)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(
+        contenido,
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={nombre}"}
+    )
+
+# Filtros opcionales: ?desde=YYYY-MM-DD&hasta=YYYY-MM-DD&placa=ABC
 @app.route("/api/admin/exportar/pdf", methods=["GET"])
 @token_requerido
 def exportar_pdf():
     try:
-        data = obtener_accesos_detalle()
-        buffer = BytesIO()
-        pdf = canvas.Canvas(buffer, pagesize=letter)
-        pdf.setTitle("Reporte de Vehículos - SmartCar")
-        pdf.setFont("Helvetica-Bold", 14)
-        pdf.drawString(200, 750, "REPORTE DE VEHÍCULOS REGISTRADOS")
-        pdf.setFont("Helvetica", 11)
-        y = 720
-        pdf.drawString(40, y, "Placa")
-        pdf.drawString(120, y, "Tipo")
-        pdf.drawString(230, y, "Color")
-        pdf.drawString(340, y, "Propietario")
-        pdf.drawString(500, y, "Resultado")
-        y -= 20
-        for item in data:
-            pdf.drawString(40, y, item.get('placa', ''))
-            pdf.drawString(120, y, item.get('tipo', ''))
-            pdf.drawString(230, y, item.get('color', ''))
-            pdf.drawString(340, y, item.get('propietario', ''))
-            pdf.drawString(500, y, item.get('resultado', ''))
-            y -= 15
-            if y < 50:
-                pdf.showPage()
-                pdf.setFont("Helvetica", 11)
-                y = 750
-        pdf.save()
-        buffer.seek(0)
-        return send_file(buffer, as_attachment=True, download_name="reporte_vehiculos.pdf", mimetype="application/pdf")
+        return _respuesta_exportacion(generar_pdf, "pdf", "reporte_vehiculos.pdf", "application/pdf")
     except Exception as e:
         print("❌ Error generando PDF:", e)
         return jsonify({"error": str(e)}), 500
@@ -268,26 +329,77 @@ def exportar_pdf():
 @token_requerido
 def exportar_excel():
     try:
-        data = obtener_accesos_detalle()
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Vehículos"
-        ws.append(["Placa", "Tipo", "Color", "Propietario", "Resultado"])
-        for d in data:
-            ws.append([d.get("placa", ""), d.get("tipo", ""), d.get("color", ""), d.get("propietario", ""), d.get("resultado", "")])
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-        return send_file(
-            buffer,
-            as_attachment=True,
-            download_name="reporte_vehiculos.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        return _respuesta_exportacion(
+            generar_excel,
+            "excel",
+            "reporte_vehiculos.xlsx",
+            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
     except Exception as e:
         print("❌ Error generando Excel:", e)
         return jsonify({"error": str(e)}), 500
 
+# Exportación en segundo plano: POST crea el trabajo, luego se consulta el
+# estado y se descarga cuando esté "listo". ?completo=1 ignora lo ya generado.
+def _trabajo_publico(trabajo):
+    datos = {k: v for k, v in trabajo.items() if k != "archivo"}
+    datos["url_estado"] = f"/api/admin/exportar/trabajos/{trabajo['id_trabajo']}"
+    if trabajo["estado"] == "listo":
+        datos["url_descarga"] = f"{datos['url_estado']}/descarga"
+    return datos
+
+@app.route("/api/admin/exportar/<formato>", methods=["POST"])
+@token_requerido
+def exportar_en_segundo_plano(formato):
+    if request.usuario_actual.get('rol') != 'Administrador':
+        return jsonify({"error": "Acceso no autorizado"}), 403
+    if formato not in FORMATOS:
+        return jsonify({"error": f"Formato no soportado: {formato}"}), 400
+    parametros = request.get_json(silent=True) or request.args
+    try:
+        trabajo = crear_trabajo_exportacion(
+            formato,
+            filtros_exportacion(parametros),
+            completo=str(parametros.get("completo", "")).lower() in ("1", "true")
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error creando trabajo de exportación: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+    return jsonify(_trabajo_publico(trabajo)), 200 if trabajo["estado"] == "listo" else 202
+
+@app.route("/api/admin/exportar/trabajos/<id_trabajo>", methods=["GET"])
+@token_requerido
+def estado_exportacion(id_trabajo):
+    if request.usuario_actual.get('rol') != 'Administrador':
+        return jsonify({"error": "Acceso no autorizado"}), 403
+    trabajo = obtener_trabajo_exportacion(id_trabajo)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    return jsonify(_trabajo_publico(trabajo)), 200
+
+@app.route("/api/admin/exportar/trabajos/<id_trabajo>/descarga", methods=["GET"])
+@token_requerido
+def descargar_exportacion(id_trabajo):
+    if request.usuario_actual.get('rol') != 'Administrador':
+        return jsonify({"error": "Acceso no autorizado"}), 403
+    trabajo = obtener_trabajo_exportacion(id_trabajo)
+    if trabajo is None:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+    if trabajo["estado"] != "listo":
+        return jsonify({"error": f"El trabajo está en estado '{trabajo['estado']}'"}), 409
+    ruta = trabajo.get("archivo")
+    if not ruta or not os.path.exists(ruta):
+        return jsonify({"error": "El archivo ya no está disponible, vuelva a exportar"}), 410
+    formato = FORMATOS[trabajo["formato"]]
+    return send_from_directory(
+        os.path.dirname(ruta), os.path.basename(ruta),
+        mimetype=formato["mimetype"],
+        as_attachment=True,
+        download_name=f"reporte_vehiculos.{formato['extension']}"
+    )
+
 # ===========================================================
 # CRUD Personas y Vehículos
 @app.route("/api/personas", methods=["GET"])
@@ -386,6 +498,43 @@ def delete_vehiculo(id_vehiculo):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Importación masiva de personas y vehículos (CSV o JSONL): archivo en el
+# campo 'archivo' (multipart) o como cuerpo de la petición. ?simular=1 valida
+# y revierte. Retorna el resumen, los errores por fila y el rendimiento.
+@app.route("/api/admin/importar", methods=["POST"])
+@token_requerido
+def importar_personas_vehiculos():
+    if request.usuario_actual.get('rol') != 'Administrador':
+        return jsonify({"error": "Acceso no autorizado"}), 403
+    archivo = request.files.get('archivo')
+    if archivo:
+        nombre = archivo.filename
+        contenido = archivo.read()
+    else:
+        nombre = None
+        contenido = request.get_data()
+    if not contenido:
+        return jsonify({"error": "No se recibió ningún archivo"}), 400
+    formato = request.args.get("formato")
+    if not formato and not archivo and "json" in (request.content_type or ""):
+        formato = "jsonl"
+    try:
+        reporte = importar(
+            contenido.decode("utf-8"),
+            formato_por_nombre(nombre, formato),
+            request.usuario_actual['id_audit'],
+            simular=request.args.get("simular", "").lower() in ("1", "true"),
+            nombre_archivo=nombre
+        )
+    except UnicodeDecodeError:
+        return jsonify({"error": "El archivo debe estar en UTF-8"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"❌ Error en importación masiva: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+    return jsonify(reporte), 200
+
 # ===========================================================
 # Dashboard vigilante API (resumen)
 @app.route("/api/dashboard_vigilante", methods=["GET"])
@@ -403,21 +552,47 @@ def get_dashboard_data():
             ORDER BY fecha_hora DESC LIMIT 5;
         """)
         historial = cur.fetchall()
-        cur.execute("SELECT COUNT(*) FROM alerta;")
-        alertas = cur.fetchone()[0]
-        cur.execute("SELECT COUNT(*) FROM vehiculo;")
-        total_vehiculos = cur.fetchone()[0]
         cur.close()
         conn.close()
+        # Totales en memoria (core/services/contadores.py)
+        contadores = obtener_contadores()
         return jsonify({
             "historial": historial,
-            "alertas": alertas,
-            "vehiculos": total_vehiculos
+            "alertas": contadores["alertas"],
+            "vehiculos": contadores["vehiculos"]
         })
     except Exception as e:
         print("❌ Error cargando datos dashboard:", e)
         return jsonify({"error": "Error al cargar datos"}), 500
 
+# ===========================================================
+# Eventos en vivo para los dashboards (Server-Sent Events)
+# EventSource no permite cabeceras: el token puede ir en ?token=
+@app.route("/api/eventos", methods=["GET"])
+def stream_eventos():
+    token = request.headers.get('Authorization', '').replace("Bearer ", "") or request.args.get('token')
+    if not token:
+        return jsonify({"error": "Token no proporcionado"}), 401
+    try:
+        usuario = jwt.decode(token, app.config["SECRET_KEY"], algorithms=["HS256"])
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token expirado"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Token inválido"}), 401
+
+    try:
+        flujo = suscribir_eventos(
+            request.headers.get("Last-Event-ID") or request.args.get("ultimo_id"),
+            es_admin=usuario.get('rol') == 'Administrador'
+        )
+    except CanalLlenoError as e:
+        return jsonify({"error": str(e)}), 503
+    return Response(
+        flujo,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ===========================================================
 # Accesos: historial y OCR
 @app.route("/api/accesos", methods=["GET"])
@@ -430,22 +605,81 @@ def get_historial_accesos():
             "desde": request.args.get('desde'),
             "hasta": request.args.get('hasta')
         }
-        historial = obtener_historial_accesos(filtros)
-        return jsonify(historial), 200
+        pagina = obtener_historial_accesos(
+            filtros,
+            limite=request.args.get('limite'),
+            cursor=request.args.get('cursor'),
+            total=request.args.get('total')
+        )
+        return jsonify(pagina), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+# Tipos de contenido que se aceptan como frame binario (sin base64)
+TIPOS_IMAGEN_BINARIA = {"image/jpeg", "image/png", "application/octet-stream"}
+
 @app.route("/api/accesos/validar", methods=["POST"])
+@unidad_de_trabajo
 def validar_acceso_ocr():
+    """
+    Negociación por Content-Type:
+      - application/json: {"image_base64": ..., "tipo_acceso": ...} (clientes antiguos)
+      - image/jpeg | image/png | application/octet-stream: bytes del frame;
+        tipo_acceso en la query (?tipo_acceso=salida) o en la cabecera X-Tipo-Acceso
+      - multipart/form-data: archivo 'imagen' y campo 'tipo_acceso'
+    """
     try:
-        respuesta, status = procesar_validacion_acceso(
-            request.data,
-            vigilante_id=getattr(request, 'usuario_actual', {}).get('id_audit', 1)
-        )
+        vigilante_id = getattr(request, 'usuario_actual', {}).get('id_audit', 1)
+
+        if request.mimetype in TIPOS_IMAGEN_BINARIA:
+            tipo_acceso = request.args.get('tipo_acceso') or request.headers.get('X-Tipo-Acceso')
+            respuesta, status = procesar_validacion_binaria(
+                request.get_data(cache=False), tipo_acceso, vigilante_id
+            )
+        elif request.mimetype == "multipart/form-data":
+            archivo = request.files.get('imagen')
+            imagen = archivo.read() if archivo else None
+            respuesta, status = procesar_validacion_binaria(
+                imagen, request.form.get('tipo_acceso'), vigilante_id
+            )
+        else:
+            respuesta, status = procesar_validacion_acceso(request.data, vigilante_id=vigilante_id)
         return jsonify(respuesta), status
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _extraer_frame():
+    """Bytes del frame (binario/multipart) o el base64 del cuerpo JSON."""
+    if request.mimetype in TIPOS_IMAGEN_BINARIA:
+        return request.get_data(cache=False)
+    if request.mimetype == "multipart/form-data":
+        archivo = request.files.get('imagen')
+        return archivo.read() if archivo else None
+    data = request.get_json(silent=True) or {}
+    return data.get("image_base64")
+
+# Validación por ráfaga: varios frames, una sola decisión por consenso
+@app.route("/api/accesos/sesiones", methods=["POST"])
+def crear_sesion_validacion():
+    data = request.get_json(silent=True) or {}
+    vigilante_id = getattr(request, 'usuario_actual', {}).get('id_audit', 1)
+    respuesta, status = iniciar_validacion_rafaga(data.get("tipo_acceso"), vigilante_id)
+    return jsonify(respuesta), status
+
+@app.route("/api/accesos/sesiones/<id_sesion>/frames", methods=["POST"])
+@unidad_de_trabajo
+def frame_sesion_validacion(id_sesion):
+    respuesta, status = agregar_frame_rafaga(id_sesion, _extraer_frame())
+    return jsonify(respuesta), status
+
+@app.route("/api/accesos/sesiones/<id_sesion>/cerrar", methods=["POST"])
+@unidad_de_trabajo
+def cerrar_sesion_validacion(id_sesion):
+    respuesta, status = cerrar_validacion_rafaga(id_sesion)
+    return jsonify(respuesta), status
+
 # ===========================================================
 # Alertas, eventos y vigilante
 @app.route("/api/admin/alertas", methods=["GET"])
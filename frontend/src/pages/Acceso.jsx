@@ -30,9 +30,11 @@ export default function Accesos() {
 
   const [historial, setHistorial] = useState([]);
   const [loading, setLoading] = useState(true);
+  // Cursor de la página siguiente (el backend pagina el historial)
+  const [siguienteCursor, setSiguienteCursor] = useState(null);
 
-  // Función para cargar historial con filtros
-  const fetchHistorial = useCallback(async () => {
+  // Función para cargar historial con filtros (cursor = null: primera página)
+  const fetchHistorial = useCallback(async (cursor = null) => {
     try {
       setLoading(true);
       const token = localStorage.getItem('token');
@@ -43,11 +45,14 @@ export default function Accesos() {
       if (vehicleType) params.append('tipo', vehicleType);
       if (dateFrom) params.append('desde', dateFrom);
       if (dateTo) params.append('hasta', dateTo);
+      if (cursor) params.append('cursor', cursor);
 
       const response = await axios.get(`http://127.0.0.1:5000/api/accesos?${params.toString()}`, {
          headers: { Authorization: `Bearer ${token}` }
       });
-      setHistorial(response.data);
+      const { datos, siguiente_cursor } = response.data;
+      setHistorial(prev => (cursor ? [...prev, ...datos] : datos));
+      setSiguienteCursor(siguiente_cursor);
     } catch (error) {
       console.error("Error cargando historial:", error);
     } finally {
@@ -157,7 +162,7 @@ export default function Accesos() {
               </tr>
             </thead>
             <tbody className="divide-y divide-gray-100">
-              {loading ? (
+              {loading && historial.length === 0 ? (
                  <tr><td colSpan="6" className="text-center py-4">Cargando datos...</td></tr>
               ) : historial.length === 0 ? (
                  <tr><td colSpan="6" className="text-center py-4 text-gray-500">No se encontraron registros.</td></tr>
@@ -184,6 +189,17 @@ export default function Accesos() {
             </tbody>
           </table>
         </div>
+        {siguienteCursor && (
+          <div className="p-4 text-center border-t border-gray-100">
+            <button
+              onClick={() => fetchHistorial(siguienteCursor)}
+              disabled={loading}
+              className="px-4 py-2 text-sm font-semibold text-red-700 hover:bg-red-50 rounded-lg transition-colors disabled:opacity-50"
+            >
+              {loading ? 'Cargando...' : 'Cargar más'}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* --- MODAL --- */}
@@ -202,7 +218,7 @@ export default function Accesos() {
               <ValidationComponentInternal 
                 apiUrl="http://127.0.0.1:5000/api/accesos/validar" 
                 onClose={() => setShowModal(false)}
-                onRefresh={fetchHistorial} 
+                onRefresh={() => fetchHistorial()} 
               />
             </div>
           </div>
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useMemo } from 'react';
+import React, { useState, useEffect, useMemo, useCallback } from 'react';
 import axios from 'axios';
 import CustomTable from '../components/CustomTable.jsx';
 
@@ -18,6 +18,11 @@ const formatData = (data) => {
 };
 
 const API_URL = 'http://127.0.0.1:5000/api/admin/auditoria';
+// Registros por página (el backend pagina por cursor)
+const LIMITE = 50;
+
+// Entidades que registran auditoría (el backend compara sin mayúsculas)
+const ENTIDADES = ['acceso', 'alerta', 'evento', 'persona', 'vehiculo', 'importacion', 'sistema'];
 
 const AuditoriaPage = () => {
     const [historial, setHistorial] = useState([]);
@@ -25,67 +30,56 @@ const AuditoriaPage = () => {
     const [error, setError] = useState(null);
     
     // --- ESTADOS DE FILTRO Y PAGINACIÓN ---
-    const [searchTerm, setSearchTerm] = useState('');
+    const [entidad, setEntidad] = useState('');
+    const [accion, setAccion] = useState('');
     const [startDate, setStartDate] = useState('');
     const [endDate, setEndDate] = useState('');
-    const [currentPage, setCurrentPage] = useState(1);
-    const itemsPerPage = 5;
+    // Cursor de la página siguiente y total estimado con los filtros actuales
+    const [siguienteCursor, setSiguienteCursor] = useState(null);
+    const [total, setTotal] = useState(null);
 
     // --- ESTADOS DEL MODAL ---
     const [showModal, setShowModal] = useState(false);
     const [selectedRecord, setSelectedRecord] = useState(null);
 
-    // 1. Cargar Datos
-    const fetchAuditoria = async () => {
+    // 1. Cargar Datos (cursor = null: primera página)
+    const fetchAuditoria = useCallback(async (cursor = null) => {
         try {
+            setLoading(true);
+            setError(null);
             const token = localStorage.getItem('token');
-            const response = await axios.get(API_URL, {
+
+            const params = new URLSearchParams();
+            params.append('limite', LIMITE);
+            if (entidad) params.append('entidad', entidad);
+            if (accion) params.append('accion', accion.trim());
+            if (startDate) params.append('desde', startDate);
+            if (endDate) params.append('hasta', endDate);
+            if (cursor) params.append('cursor', cursor);
+            else params.append('total', 'estimado');
+
+            const response = await axios.get(`${API_URL}?${params.toString()}`, {
                 headers: { Authorization: `Bearer ${token}` }
             });
-            setHistorial(response.data);
+            const { datos, siguiente_cursor } = response.data;
+            setHistorial(prev => (cursor ? [...prev, ...datos] : datos));
+            setSiguienteCursor(siguiente_cursor);
+            if (!cursor) setTotal(response.data.total);
         } catch (err) {
             setError(err.response?.data?.error || 'Error cargando historial');
         } finally {
             setLoading(false);
         }
-    };
+    }, [entidad, accion, startDate, endDate]);
 
+    // Primera página al entrar y al cambiar filtros (con debounce para la acción escrita)
     useEffect(() => {
-        fetchAuditoria();
-    }, []);
-
-    // 2. Lógica de Filtrado (Texto y Fechas)
-    const filteredHistorial = useMemo(() => {
-        return historial.filter(item => {
-            // Filtro de Texto
-            const term = searchTerm.toLowerCase();
-            const matchesText = 
-                item.nombre_vigilante?.toLowerCase().includes(term) ||
-                item.accion?.toLowerCase().includes(term) ||
-                item.entidad?.toLowerCase().includes(term);
-            
-            // Filtro de Fechas
-            let matchesDate = true;
-            const itemDate = new Date(item.fecha_hora);
-            if (startDate) {
-                matchesDate = matchesDate && itemDate >= new Date(startDate);
-            }
-            if (endDate) {
-                // Ajustamos endDate para que incluya todo el día (hasta las 23:59:59)
-                const end = new Date(endDate);
-                end.setHours(23, 59, 59);
-                matchesDate = matchesDate && itemDate <= end;
-            }
-
-            return matchesText && matchesDate;
-        });
-    }, [historial, searchTerm, startDate, endDate]);
+        const delayDebounceFn = setTimeout(() => {
+            fetchAuditoria();
+        }, 500);
 
-    // 3. Lógica de Paginación
-    const indexOfLastItem = currentPage * itemsPerPage;
-    const indexOfFirstItem = indexOfLastItem - itemsPerPage;
-    const currentItems = filteredHistorial.slice(indexOfFirstItem, indexOfLastItem);
-    const totalPages = Math.ceil(filteredHistorial.length / itemsPerPage);
+        return () => clearTimeout(delayDebounceFn);
+    }, [fetchAuditoria]);
 
     // Manejador del Modal
     const handleViewDetails = (record) => {
@@ -154,41 +148,52 @@ const AuditoriaPage = () => {
             <div className="card shadow-sm border-0 mb-4 bg-light">
                 <div className="card-body py-3">
                     <div className="row g-3">
-                        <div className="col-md-4">
-                            <label className="form-label small fw-bold text-secondary">BUSCAR</label>
+                        <div className="col-md-2">
+                            <label className="form-label small fw-bold text-secondary">ENTIDAD</label>
+                            <select
+                                className="form-select"
+                                value={entidad}
+                                onChange={e => setEntidad(e.target.value)}
+                            >
+                                <option value="">Todas</option>
+                                {ENTIDADES.map(e => <option key={e} value={e}>{e.toUpperCase()}</option>)}
+                            </select>
+                        </div>
+                        <div className="col-md-3">
+                            <label className="form-label small fw-bold text-secondary">ACCIÓN</label>
                             <div className="input-group">
                                 <span className="input-group-text bg-white"><i className="fas fa-search text-muted"></i></span>
                                 <input 
                                     type="text" 
                                     className="form-control" 
-                                    placeholder="Usuario, acción o entidad..."
-                                    value={searchTerm}
-                                    onChange={e => { setSearchTerm(e.target.value); setCurrentPage(1); }}
+                                    placeholder="Ej: CREAR, ENTRADA_VEHICULO..."
+                                    value={accion}
+                                    onChange={e => setAccion(e.target.value)}
                                 />
                             </div>
                         </div>
-                        <div className="col-md-3">
+                        <div className="col-md-2">
                             <label className="form-label small fw-bold text-secondary">DESDE</label>
                             <input 
                                 type="date" 
                                 className="form-control" 
                                 value={startDate} 
-                                onChange={e => { setStartDate(e.target.value); setCurrentPage(1); }} 
+                                onChange={e => setStartDate(e.target.value)} 
                             />
                         </div>
-                        <div className="col-md-3">
+                        <div className="col-md-2">
                             <label className="form-label small fw-bold text-secondary">HASTA</label>
                             <input 
                                 type="date" 
                                 className="form-control" 
                                 value={endDate} 
-                                onChange={e => { setEndDate(e.target.value); setCurrentPage(1); }} 
+                                onChange={e => setEndDate(e.target.value)} 
                             />
                         </div>
-                        <div className="col-md-2 d-flex align-items-end">
+                        <div className="col-md-3 d-flex align-items-end">
                             <button 
                                 className="btn btn-outline-secondary w-100"
-                                onClick={() => { setSearchTerm(''); setStartDate(''); setEndDate(''); setCurrentPage(1); }}
+                                onClick={() => { setEntidad(''); setAccion(''); setStartDate(''); setEndDate(''); }}
                             >
                                 Limpiar
                             </button>
@@ -199,7 +204,7 @@ const AuditoriaPage = () => {
 
             {error && <div className="alert alert-danger">{error}</div>}
 
-            {loading ? (
+            {loading && historial.length === 0 ? (
                 <div className="text-center p-5">
                     <div className="spinner-border text-primary" role="status"></div>
                     <p className="mt-2 text-muted">Cargando registros de seguridad...</p>
@@ -207,33 +212,23 @@ const AuditoriaPage = () => {
             ) : (
                 <div className="card shadow-sm border-0">
                     <div className="card-body p-0">
-                        <CustomTable columns={columns} data={currentItems} />
+                        <CustomTable columns={columns} data={historial} />
                     </div>
                     
-                    {/* Footer de Paginación */}
+                    {/* Footer de Paginación (por cursor: "Cargar más" agrega la página siguiente) */}
                     <div className="card-footer bg-white d-flex justify-content-between align-items-center py-3">
                         <span className="text-muted small">
-                            Mostrando {indexOfFirstItem + 1} a {Math.min(indexOfLastItem, filteredHistorial.length)} de {filteredHistorial.length} registros
+                            Mostrando {historial.length} registros{total != null ? ` de ~${total}` : ''}
                         </span>
-                        <nav>
-                            <ul className="pagination pagination-sm mb-0">
-                                <li className={`page-item ${currentPage === 1 ? 'disabled' : ''}`}>
-                                    <button className="page-link" onClick={() => setCurrentPage(p => Math.max(p - 1, 1))}>
-                                        Anterior
-                                    </button>
-                                </li>
-                                <li className="page-item disabled">
-                                    <span className="page-link text-dark">
-                                        Página {currentPage} de {totalPages || 1}
-                                    </span>
-                                </li>
-                                <li className={`page-item ${currentPage === totalPages || totalPages === 0 ? 'disabled' : ''}`}>
-                                    <button className="page-link" onClick={() => setCurrentPage(p => Math.min(p + 1, totalPages))}>
-                                        Siguiente
-                                    </button>
-                                </li>
-                            </ul>
-                        </nav>
+                        {siguienteCursor && (
+                            <button
+                                className="btn btn-sm btn-outline-primary"
+                                onClick={() => fetchAuditoria(siguienteCursor)}
+                                disabled={loading}
+                            >
+                                {loading ? 'Cargando...' : 'Cargar más'}
+                            </button>
+                        )}
                     </div>
                 </div>
             )}
@@ -70,6 +70,33 @@ const DashboardVigilantePage: React.FC = () => {
     }
   }, [cargarUltimosAccesos, cargarTotalVehiculos, cargarAlertasActivas]);
 
+  // Actualizaciones en vivo (SSE): nuevos accesos y totales sin volver a consultar.
+  // EventSource se reconecta solo y envía Last-Event-ID para no perder eventos.
+  useEffect(() => {
+    const token = getToken();
+    if (!token) return;
+    const fuente = new EventSource(`${API_URL}/eventos?token=${encodeURIComponent(token)}`);
+
+    fuente.addEventListener('acceso', (e) => {
+      const d = JSON.parse((e as MessageEvent).data);
+      const nuevo: IAcceso = { fecha_hora: d.fecha_hora, placa: d.placa, resultado: d.resultado, vigilante: '' };
+      setUltimosAccesos((prev) => [nuevo, ...prev].slice(0, 7));
+    });
+    fuente.addEventListener('contadores', (e) => {
+      const { valores } = JSON.parse((e as MessageEvent).data);
+      setTotalVehiculos(valores.vehiculos);
+      setAlertasActivas(`${valores.alertas} alertas activas`);
+    });
+    // El servidor ya no tiene los eventos perdidos: se recarga todo
+    fuente.addEventListener('reinicio', () => {
+      cargarUltimosAccesos(token);
+      cargarTotalVehiculos(token);
+      cargarAlertasActivas(token);
+    });
+
+    return () => fuente.close();
+  }, [cargarUltimosAccesos, cargarTotalVehiculos, cargarAlertasActivas]);
+
 
   // --- Lógica de Búsqueda de Placa ---
   const handleBuscarPlaca = async () => {
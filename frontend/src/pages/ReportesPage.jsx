@@ -8,6 +8,19 @@ const getToken = () => {
 };
 const API_PDF_URL = 'http://127.0.0.1:5000/api/admin/exportar/pdf';
 const API_EXCEL_URL = 'http://127.0.0.1:5000/api/admin/exportar/excel';
+const API_BASE_URL = 'http://127.0.0.1:5000';
+
+// Las exportaciones grandes no llegan como archivo: el servidor responde con
+// un trabajo en segundo plano; se consulta su estado hasta que esté listo.
+const esperarTrabajo = async (trabajo, headers) => {
+    while (trabajo.estado !== 'listo') {
+        if (trabajo.estado === 'error') throw new Error(trabajo.error || 'Error generando el reporte');
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        const estado = await axios.get(`${API_BASE_URL}${trabajo.url_estado}`, { headers });
+        trabajo = estado.data;
+    }
+    return axios.get(`${API_BASE_URL}${trabajo.url_descarga}`, { headers, responseType: 'blob' });
+};
 
 const descargarReporte = async (tipo) => {
     const token = getToken();
@@ -17,10 +30,11 @@ const descargarReporte = async (tipo) => {
     const filename = tipo === 'pdf' ? 'reporte_vehiculos.pdf' : 'reporte_vehiculos.xlsx';
 
     try {
-        const response = await axios.get(url, {
-            headers: { 'Authorization': `Bearer ${token}` },
-            responseType: 'blob',
-        });
+        const headers = { 'Authorization': `Bearer ${token}` };
+        let response = await axios.get(url, { headers, responseType: 'blob' });
+        if (response.data.type === 'application/json') {
+            response = await esperarTrabajo(JSON.parse(await response.data.text()), headers);
+        }
         const fileURL = window.URL.createObjectURL(new Blob([response.data]));
         const link = document.createElement('a');
         link.href = fileURL;